@@ -0,0 +1,333 @@
+"""
+Computer players, deciding with information set Monte Carlo tree search.
+
+A bot sees the game as its seat does: it knows its own role, the whole
+fascist team if it is a fascist (Hitler too in small games), and the
+policies in its hand; nothing else about the roles of others or the order of
+the deck. Each search iteration samples a determinization, ie. hidden roles
+and deck consistent with what the bot knows, then walks a tree shared by all
+samples. Children are picked with UCB among the actions legal in the sample,
+counting how often each one was available (Cowling et al., 2012).
+
+Searches work on snapshot.Snapshot and are plain functions of picklable
+arguments, so that they can run in worker processes:
+
+    action = await loop.run_in_executor(pool, ai.decide, snapshot, seat, config)
+
+Run as a module to pit bots against HeuristicStrategy players:
+
+    python -m hitlair.ai --games 20 --players 7 --time 0.2
+"""
+
+import argparse
+import math
+import random
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from hitlair import game, sim
+from hitlair.game import Policy, Role, Stage
+from hitlair.snapshot import Action, ActionKind, Snapshot, play, seats
+
+# Names of bot players start with it. Not valid in IRC nicks, so that no
+# human can take them.
+BOT_NAME_PREFIX = "*bot"
+
+_LIBERAL = Role.liberal.value
+_HITLER = Role.hitler.value
+_ELECTION = Stage.chancellor_election.value
+_LEGISLATE = Stage.legislate.value
+_ENACT = Stage.enact.value
+
+
+class SearchConfig(NamedTuple):
+    # Seconds of CPU per decision.
+    time_budget: float = 1.0
+    # Iterations per decision, whatever the time left.
+    max_iterations: int = 20000
+    # Moves per iteration, tree and playout together. Games cut short are
+    # scored with evaluate().
+    max_depth: int = 80
+    # UCB exploration constant.
+    exploration: float = 0.7
+
+
+def bot_name(index: int) -> str:
+    return f"{BOT_NAME_PREFIX}{index}"
+
+
+def knows_team(roles: bytes, seat: int) -> bool:
+    role = roles[seat]
+    if role == _LIBERAL:
+        return False
+    # Hitler knows the fascists in small games only.
+    return role != _HITLER or len(roles) <= 6
+
+
+def team(role: int) -> int:
+    """The Policy value role plays for."""
+    return Policy.liberal.value if role == _LIBERAL else Policy.fascist.value
+
+
+def determinize(snapshot: Snapshot, seat: int, rng: random.Random) -> Snapshot:
+    """
+    Samples a snapshot seat can't tell from snapshot: roles it doesn't know
+    are dealt again, policies it didn't see are shuffled with the discard
+    pile.
+    """
+    roles = snapshot.roles
+    if not knows_team(roles, seat):
+        others = [i for i in range(len(roles)) if i != seat]
+        dealt = [roles[i] for i in others]
+        rng.shuffle(dealt)
+        shuffled = bytearray(roles)
+        for i, role in zip(others, dealt):
+            shuffled[i] = role
+        roles = bytes(shuffled)
+
+    deck = snapshot.deck
+    seen = 0
+    if snapshot.stage == _LEGISLATE and seat == snapshot.president:
+        seen = game.PRESIDENT_HAND
+    elif snapshot.stage == _ENACT and seat == snapshot.chancellor:
+        seen = game.CHANCELLOR_HAND
+    hidden = bytearray(deck[: len(deck) - seen])
+    hidden += bytes([Policy.liberal.value]) * snapshot.discarded_liberals
+    hidden += bytes([Policy.fascist.value]) * snapshot.discarded_fascists
+    rng.shuffle(hidden)
+    discarded = hidden[len(deck) - seen :]
+    discarded_liberals = discarded.count(Policy.liberal.value)
+
+    return snapshot._replace(
+        roles=roles,
+        deck=bytes(hidden[: len(deck) - seen]) + deck[len(deck) - seen :],
+        discarded_liberals=discarded_liberals,
+        discarded_fascists=len(discarded) - discarded_liberals,
+    )
+
+
+def evaluate(snapshot: Snapshot, role: int) -> float:
+    """Chances of winning for role, from 0 to 1."""
+    if snapshot.winner:
+        return 1.0 if snapshot.winner == team(role) else 0.0
+    # Cut short: guess from the policy track.
+    lead = (snapshot.liberal_policies / 5 - snapshot.fascist_policies / 6) / 2
+    return 0.5 + lead if role == _LIBERAL else 0.5 - lead
+
+
+def _play(snapshot: Snapshot, seat: int, action: Action, rng) -> Snapshot:
+    if action.kind is ActionKind.vote:
+        return snapshot.cast_vote(seat, action.arg, rng)
+    return snapshot.apply(action, rng)
+
+
+class _Node:
+    __slots__ = ("children", "visits", "score", "available")
+
+    children: Dict[Action, "_Node"]
+    visits: int
+    # Sum of the rewards of the seat who chose the action leading here.
+    score: float
+    # Number of visits of the parent where the action was legal.
+    available: int
+
+    def __init__(self):
+        self.children = {}
+        self.visits = 0
+        self.score = 0.0
+        self.available = 1
+
+    def ucb(self, exploration: float) -> float:
+        return self.score / self.visits + exploration * math.sqrt(
+            math.log(self.available) / self.visits
+        )
+
+
+def _iterate(
+    root: _Node,
+    snapshot: Snapshot,
+    seat: int,
+    config: SearchConfig,
+    rng: random.Random,
+):
+    current = determinize(snapshot, seat, rng)
+    node = root
+    mover = seat
+    # (node, seat who moved there)
+    path = []
+    depth = 0
+
+    # Selection, then expansion of one node.
+    while not current.is_over and depth < config.max_depth:
+        actions = current.legal_actions()
+        if not actions:
+            break
+        children = node.children
+        untried = [action for action in actions if action not in children]
+        if untried:
+            action = rng.choice(untried)
+            child = children[action] = _Node()
+        else:
+            for action in actions:
+                children[action].available += 1
+            action = max(
+                actions, key=lambda action: children[action].ucb(config.exploration)
+            )
+            child = children[action]
+        current = _play(current, mover, action, rng)
+        path.append((child, mover))
+        node = child
+        mover = current.to_move
+        depth += 1
+        if untried:
+            break
+
+    # Random playout.
+    while not current.is_over and depth < config.max_depth:
+        actions = current.legal_actions()
+        if not actions:
+            break
+        current = current.apply(rng.choice(actions), rng)
+        depth += 1
+
+    roles = current.roles
+    for node, mover in path:
+        node.visits += 1
+        node.score += evaluate(current, roles[mover])
+
+
+def search(
+    snapshot: Snapshot,
+    seat: int,
+    config: SearchConfig = SearchConfig(),
+    rng: Optional[random.Random] = None,
+) -> Dict[Action, int]:
+    """Visits of each action seat can play, within config's budget."""
+    rng = rng if rng is not None else random.Random()
+    root = _Node()
+    deadline = time.perf_counter() + config.time_budget
+    for _ in range(config.max_iterations):
+        _iterate(root, snapshot, seat, config, rng)
+        if time.perf_counter() >= deadline:
+            break
+    return {action: child.visits for action, child in root.children.items()}
+
+
+def decide(
+    snapshot: Snapshot,
+    seat: int,
+    config: SearchConfig = SearchConfig(),
+    seed: Optional[int] = None,
+) -> Action:
+    """The decision of seat, which the game must wait for."""
+    if snapshot.stage == _ELECTION:
+        if snapshot.voted >> seat & 1:
+            raise game.IllegalState()
+    elif snapshot.to_move != seat:
+        raise game.IllegalState()
+    actions = snapshot.legal_actions()
+    if not actions:
+        raise game.IllegalState()
+    if len(actions) == 1:
+        return actions[0]
+    visits = search(snapshot, seat, config, random.Random(seed))
+    return max(actions, key=lambda action: visits.get(action, 0))
+
+
+def waiting_seats(state: game.State) -> List[int]:
+    """Seats whose decision the game waits for."""
+    stage = state.stage
+    players = seats(state)
+    if stage is Stage.lobby:
+        return []
+    if stage is Stage.chancellor_election:
+        return [
+            seat
+            for seat, player in enumerate(players)
+            if player in state.alive_players and player not in state.votes
+        ]
+    decider = state.chancellor if stage is Stage.enact else state.president
+    return [players.index(decider)]
+
+
+def run(
+    games: int,
+    player_count: int,
+    bot_count: int,
+    config: SearchConfig,
+    rng: random.Random,
+):
+    """
+    Plays games where the first bot_count players are bots, the others play
+    HeuristicStrategy. Returns the number of games won by each bot, and the
+    number of games that went to the end.
+    """
+    strategy = sim.HeuristicStrategy(rng)
+    wins = [0] * bot_count
+    finished = 0
+    for _ in range(games):
+        state = sim.new_game(player_count, rng)
+        strategy.new_game(state)
+        strategy.observe(state, state.advance(Stage.lobby)[0])
+        bots = state.players[:bot_count]
+        winner = None
+        while state.stage is not Stage.lobby:
+            players = seats(state)
+            waiting = [seat for seat in waiting_seats(state) if players[seat] in bots]
+            if waiting:
+                snapshot = Snapshot.from_state(state)
+                seed = rng.getrandbits(32)
+                try:
+                    action = decide(snapshot, waiting[0], config, seed)
+                except game.IllegalState:
+                    # Stalled game, see sim.decide().
+                    break
+                if not play(state, action, waiting[0]):
+                    continue
+            elif not sim.decide(state, strategy):
+                break
+            events = state.advance()[0]
+            strategy.observe(state, events)
+            for event in events:
+                if isinstance(event, game.LiberalsWin):
+                    winner = Role.liberal
+                elif isinstance(event, game.FascistsWin):
+                    winner = Role.fascist
+        if winner is None:
+            continue
+        finished += 1
+        for i, bot in enumerate(bots):
+            if (bot.role is Role.liberal) == (winner is Role.liberal):
+                wins[i] += 1
+    return wins, finished
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument(
+        "--players",
+        type=int,
+        default=5,
+        choices=sorted(game.PLAYER_COUNT_TO_LIBERAL_COUNT),
+    )
+    parser.add_argument("--bots", type=int, default=1)
+    defaults = SearchConfig()
+    parser.add_argument("--time", type=float, default=defaults.time_budget)
+    parser.add_argument("--depth", type=int, default=defaults.max_depth)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = SearchConfig(time_budget=args.time, max_depth=args.depth)
+    start = time.perf_counter()
+    wins, finished = run(
+        args.games, args.players, args.bots, config, random.Random(args.seed)
+    )
+    print(f"games: {finished}/{args.games}")
+    for i, count in enumerate(wins):
+        print(f"bot {i} wins: {count}")
+    print(f"{time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import itertools
 import random
 from enum import auto
 from typing import (
+    Any,
     List,
     Optional,
     Dict,
@@ -10,10 +11,13 @@ from typing import (
     NamedTuple,
     Tuple,
     Iterable,
-    Generator,
+    Set,
     Callable,
+    Union,
 )
 
+from hitlair.journal import MAX_NAME_SIZE, Journal
+
 # Keys are also the supported numbers of players.
 PLAYER_COUNT_TO_LIBERAL_COUNT = {
     5: 3,
@@ -26,6 +30,7 @@ PLAYER_COUNT_TO_LIBERAL_COUNT = {
 
 FASCIST_POLICY_COUNT = 11
 LIBERAL_POLICY_COUNT = 6
+POLICY_COUNT = FASCIST_POLICY_COUNT + LIBERAL_POLICY_COUNT
 PRESIDENT_HAND = 3
 CHANCELLOR_HAND = PRESIDENT_HAND - 1
 
@@ -75,17 +80,25 @@ class Role(enum.Enum):
 
 
 class Player:
+    """
+    Players are identified by their name. Use State.get_player() to get the
+    instance registered in a game rather than building new ones.
+    """
+
+    __slots__ = ("name", "role")
+
     name: str
-    role: Optional[Role] = None
+    role: Optional[Role]
 
-    def __init__(self, name: str):
+    def __init__(self, name: str, role: Optional[Role] = None):
         self.name = name
+        self.role = role
 
     def __eq__(self, other):
-        return isinstance(other, Player) and (self.name,) == (other.name,)
+        return isinstance(other, Player) and self.name == other.name
 
     def __hash__(self):
-        return hash((self.name,))
+        return hash(self.name)
 
     def __repr__(self):
         return f"<Player {self.name} ({self.role})>"
@@ -96,6 +109,107 @@ class Policy(enum.Enum):
     fascist = auto()
 
 
+_POLICY_BY_VALUE = {policy.value: policy for policy in Policy}
+
+
+class PolicyDeck:
+    """
+    A pile of policies, one byte per policy, the top of the pile last.
+
+    Storage is allocated once for the whole game: drawing, discarding and
+    shuffling work in place and only move the cursor. Reading the deck
+    returns Policy members, slicing returns lists.
+    """
+
+    __slots__ = ("_cards", "_size")
+
+    def __init__(self, policies: Iterable[Policy] = (), capacity: int = POLICY_COUNT):
+        self._cards = bytearray(capacity)
+        self._size = 0
+        self.extend(policies)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self) -> Iterator[Policy]:
+        cards = self._cards
+        for i in range(self._size):
+            yield _POLICY_BY_VALUE[cards[i]]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [
+                _POLICY_BY_VALUE[self._cards[i]]
+                for i in range(*index.indices(self._size))
+            ]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return _POLICY_BY_VALUE[self._cards[index]]
+
+    def __eq__(self, other):
+        if isinstance(other, PolicyDeck):
+            return self.to_bytes() == other.to_bytes()
+        return list(self) == other
+
+    def __repr__(self):
+        return f"<PolicyDeck {[policy.name for policy in self]}>"
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._cards[: self._size])
+
+    def append(self, policy: Policy):
+        self._cards[self._size] = policy.value
+        self._size += 1
+
+    def extend(self, policies: Iterable[Policy]):
+        if isinstance(policies, PolicyDeck):
+            size = self._size + policies._size
+            self._cards[self._size : size] = policies._cards[: policies._size]
+            self._size = size
+            return
+        for policy in policies:
+            self.append(policy)
+
+    def clear(self):
+        self._size = 0
+
+    def draw(self) -> Policy:
+        """Removes and returns the top policy."""
+        if not self._size:
+            raise IndexError("draw from empty deck")
+        self._size -= 1
+        return _POLICY_BY_VALUE[self._cards[self._size]]
+
+    pop = draw
+
+    def peek(self, count: int) -> List[Policy]:
+        """Returns the top count policies, the top one last."""
+        return self[-count:]
+
+    def remove(self, policy: Policy, depth: Optional[int] = None):
+        """
+        Removes the first occurrence of policy, looking only at the top depth
+        policies if given. Policies above it move down, keeping their order.
+        Raises ValueError if there is no such policy.
+        """
+        cards = self._cards
+        start = 0 if depth is None else max(0, self._size - depth)
+        value = policy.value
+        for i in range(start, self._size):
+            if cards[i] == value:
+                break
+        else:
+            raise ValueError(f"{policy} not in deck")
+        cards[i : self._size - 1] = cards[i + 1 : self._size]
+        self._size -= 1
+
+    def shuffle(self, rng: random.Random):
+        with memoryview(self._cards) as cards:
+            rng.shuffle(cards[: self._size])
+
+
 class ExecutiveAction(enum.Enum):
     peek = auto()
     kill = auto()
@@ -135,6 +249,37 @@ class Event:
     pass
 
 
+EventHandler = Callable[[Any, Event], None]
+
+
+class EventDispatcher:
+    """
+    Routes events to the handlers registered for their exact type, then to
+    the subscribers of every event. Handlers are called with the context
+    given to dispatch() (eg. the IRC table the game is played at) and the
+    event. Pass dispatch to State.advance() to stream events as they happen.
+    """
+
+    handlers: Dict[type, List[EventHandler]]
+    subscribers: List[EventHandler]
+
+    def __init__(self):
+        self.handlers = {}
+        self.subscribers = []
+
+    def on(self, event_type: type, handler: EventHandler):
+        self.handlers.setdefault(event_type, []).append(handler)
+
+    def subscribe(self, handler: EventHandler):
+        self.subscribers.append(handler)
+
+    def dispatch(self, context: Any, event: Event):
+        for handler in self.handlers.get(type(event), ()):
+            handler(context, event)
+        for subscriber in self.subscribers:
+            subscriber(context, event)
+
+
 class GameStarts(Event, NamedTuple):
     pass
 
@@ -265,77 +410,205 @@ class StageChanges(Event, NamedTuple):
     stage: Stage
 
 
+# The following events carry hidden information. They are not meant to be
+# shown to players but let State.replay() rebuild the policy deck.
+
+
+class PolicyDeckShuffles(Event, NamedTuple):
+    policies: Tuple[Policy, ...]
+
+
+class PresidentDiscards(Event, NamedTuple):
+    president: Player
+    policy: Policy
+
+
+# Temporary state of a stage, see State.context.
+
+
+class ElectionContext:
+    __slots__ = ("votes", "yes_votes", "no_votes")
+
+    def __init__(self):
+        self.votes: Dict[Player, bool] = {}
+        # Tallies of the above, kept by record().
+        self.yes_votes = 0
+        self.no_votes = 0
+
+    def record(self, player: Player, yes: bool):
+        previous = self.votes.get(player)
+        if previous is not None:
+            if previous:
+                self.yes_votes -= 1
+            else:
+                self.no_votes -= 1
+        if yes:
+            self.yes_votes += 1
+        else:
+            self.no_votes += 1
+        self.votes[player] = yes
+
+    def copy_from(self, old, player: Callable[[Player], Player]):
+        for voter, yes in old.votes.items():
+            self.record(player(voter), yes)
+
+
+class LegislateContext:
+    """The policy the president discarded, journaled once the stage is over."""
+
+    __slots__ = ("discarded",)
+
+    def __init__(self):
+        self.discarded: Optional[Policy] = None
+
+    def copy_from(self, old, player: Callable[[Player], Player]):
+        self.discarded = None if old.discarded is None else Policy[old.discarded.name]
+
+
+class VetoContext:
+    """Shared by enact and confirm_veto, which a denied veto goes back to."""
+
+    __slots__ = ("requested", "accepted", "denied")
+
+    def __init__(self):
+        self.requested = False
+        self.accepted = False
+        # The chancellor cannot veto again after a denial.
+        self.denied = False
+
+    def copy_from(self, old, player: Callable[[Player], Player]):
+        self.requested = old.requested
+        self.accepted = old.accepted
+        self.denied = old.denied
+
+
+class ActionContext:
+    """The player an executive action targets."""
+
+    __slots__ = ("target",)
+
+    def __init__(self):
+        self.target: Optional[Player] = None
+
+    def copy_from(self, old, player: Callable[[Player], Player]):
+        self.target = None if old.target is None else player(old.target)
+
+
+StageContext = Union[ElectionContext, LegislateContext, VetoContext, ActionContext]
+
+_STAGE_CONTEXTS: Dict[Stage, type] = {
+    Stage.chancellor_election: ElectionContext,
+    Stage.legislate: LegislateContext,
+    Stage.enact: VetoContext,
+    Stage.confirm_veto: VetoContext,
+    Stage.action_investigate: ActionContext,
+    Stage.action_kill: ActionContext,
+    Stage.action_special_election: ActionContext,
+}
+
+
 class State:
     """
-    Refactor idea that should make this class slightly better:
-    instead of having so much global state even though many of it is temporary
-    state for particular actions, attach a container to each Stage with the
-    relevant temporary state. Then in exit_foo(), validate foo temporary state
-    and apply it to global state before advancing to next stage.
-
-    Things that should remain global: players, dead_players, policy_deck, etc.
-    Things that can go into temporary context-specific states: votes, veto, etc.
+    A game. Global state (players, policies, governments) lives here, the
+    temporary state of the current stage (eg. votes) lives in context. It is
+    validated and applied in exit_<stage>() and dropped with the stage, so
+    lobbies and stages without decisions carry none.
     """
 
+    # Bump when attributes change, see migrate().
+    SCHEMA_VERSION = 5
+
     stage: Stage
+    # Alive players, in turn order.
     players: List[Player]
-    player_cycle: Iterator[Player]
+    # Last president picked in turn order, ie. not specially elected. The
+    # next one is the player after them in players.
+    cycle_president: Optional[Player]
     dead_players: List[Player]
-    policy_deck: List[Policy]
-    discard_pile: List[Policy]
+    # Indexes of the above, for constant time lookups.
+    players_by_name: Dict[str, Player]
+    alive_players: Set[Player]
+    killed_players: Set[Player]
+    policy_deck: PolicyDeck
+    discard_pile: PolicyDeck
     president: Optional[Player]
     former_president: Optional[Player]
     chancellor: Optional[Player]
     former_chancellor: Optional[Player]
-    votes: Dict[Player, bool]
-    investigated_players: List[Player]
     failed_votes: int
     liberal_policies: int
     fascist_policies: int
-    veto_requested: bool
-    veto_accepted: bool
-    killed_player: Optional[Player]
-    special_election_next_president: Optional[Player]
-
-    def __init__(self):
+    context: Optional[StageContext]
+    rng: random.Random
+    journal: Journal
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        # Each game owns its generator so that games can be replayed from a
+        # seed and don't share the global one.
+        self.rng = rng if rng is not None else random.Random()
         self.reset()
 
     def reset(self):
         self.stage = Stage.lobby
         self.players = []
-        self.player_cycle = []
+        self.cycle_president = None
         self.dead_players = []
-        self.policy_deck = []
-        self.discard_pile = []
+        self.players_by_name = {}
+        self.alive_players = set()
+        self.killed_players = set()
+        self.policy_deck = PolicyDeck()
+        self.discard_pile = PolicyDeck()
         self.president = None
         self.former_president = None
         self.chancellor = None
         self.former_chancellor = None
-        self.votes = {}
-        self.investigated_players = []
         self.failed_votes = 0
         self.liberal_policies = 0
         self.fascist_policies = 0
-        self.veto_requested = False
-        self.veto_accepted = False
-        self.killed_player = None
-        self.special_election_next_president = None
+        self.context = None
+        self.journal = Journal()
 
     # Generic state advance method.
 
-    def advance(self, current_stage=None) -> Tuple[Iterable[Event], Stage]:
+    def advance(
+        self,
+        current_stage=None,
+        sink: Optional[Callable[[Event], None]] = None,
+    ) -> Tuple[Iterable[Event], Stage]:
+        """
+        Exits the current stage. Events are journaled and passed to sink as
+        they are produced; the final StageChanges is passed once the new
+        stage is entered.
+        """
         if current_stage is not None and self.stage is not current_stage:
             raise IllegalState()
 
-        method_name = f"exit_{self.stage.name}"
-        method: Callable[[], Generator[Event]] = getattr(self, method_name)
-        events = list(method())
-
-        *events, stage_event = events
+        if self.stage is Stage.lobby:
+            # A new game starts.
+            self.journal = Journal()
+        events = []
+        append = events.append
+        record = self.journal.append
+        for event in _EXIT_HANDLERS[self.stage](self):
+            record(event)
+            append(event)
+            if sink is not None and type(event) is not StageChanges:
+                sink(event)
+
+        stage_event = events.pop()
         assert isinstance(stage_event, StageChanges)
-        self.stage = stage_event.stage
+        self._enter_stage(stage_event.stage)
+        if sink is not None:
+            sink(stage_event)
         return events, self.stage
 
+    def _enter_stage(self, stage: Stage):
+        self.stage = stage
+        context_type = _STAGE_CONTEXTS.get(stage)
+        # Stages sharing a context type (enact and confirm_veto) keep it.
+        if type(self.context) is not context_type:
+            self.context = context_type() if context_type is not None else None
+
     # Stage: lobby
 
     @property
@@ -343,7 +616,12 @@ class State:
         return self.player_count in PLAYER_COUNT_TO_LIBERAL_COUNT
 
     def is_registered_player(self, player: Player) -> bool:
-        return player in self.players
+        return player in self.alive_players
+
+    def get_player(self, name: str) -> Player:
+        """Returns the player registered under name, or a new Player."""
+        player = self.players_by_name.get(name)
+        return player if player is not None else Player(name)
 
     def add_player(self, player: Player):
         self._ensure_stage(Stage.lobby)
@@ -351,18 +629,26 @@ class State:
         if self.player_count == max(PLAYER_COUNT_TO_LIBERAL_COUNT.keys()):
             raise InvalidAction()
 
-        if player in self.players:
+        if player in self.alive_players:
+            raise InvalidAction()
+
+        if len(player.name.encode()) > MAX_NAME_SIZE:
+            # Could not be journaled.
             raise InvalidAction()
 
         self.players.append(player)
+        self.alive_players.add(player)
+        self.players_by_name[player.name] = player
 
     def remove_player(self, player: Player):
         self._ensure_stage(Stage.lobby)
 
-        if player not in self.players:
+        if player not in self.alive_players:
             raise InvalidAction()
 
         self.players.remove(player)
+        self.alive_players.remove(player)
+        del self.players_by_name[player.name]
 
     # Stage: nominate_chancellor
 
@@ -375,7 +661,7 @@ class State:
             raise IllegalState() from None
 
         # First shuffle to distribute roles.
-        random.shuffle(self.players)
+        self.rng.shuffle(self.players)
         hitler, *not_hitler = self.players
         hitler.role = Role.hitler
         liberals, fascists = (not_hitler[:liberal_count], not_hitler[liberal_count:])
@@ -385,21 +671,25 @@ class State:
             fascist.role = Role.fascist
 
         # Second shuffle for play order.
-        random.shuffle(self.players)
+        self.rng.shuffle(self.players)
         # President is picked at random.
-        self.president = random.choice(self.players)
+        self.president = self.rng.choice(self.players)
         self._build_player_cycle()
 
         self._init_policy_deck()
 
         yield GameStarts()
         yield from [PlayerRoleChanges(player) for player in self.players]
+        yield PolicyDeckShuffles(tuple(self.policy_deck))
         yield PresidentChanges(None, self.president)
         yield StageChanges(Stage.nominate_chancellor)
 
     def nominate_chancellor(self, chancellor: Player):
         self._ensure_stage(Stage.nominate_chancellor)
 
+        if chancellor not in self.alive_players:
+            raise InvalidAction()
+
         # Term limit: cannot nominate former chancellor or former president.
         if (
             chancellor == self.former_chancellor
@@ -426,23 +716,50 @@ class State:
         """Returns True if the election is complete."""
         return len(self.votes) == self.player_count
 
+    @property
+    def votes(self) -> Dict[Player, bool]:
+        if self.stage is not Stage.chancellor_election:
+            return {}
+        return self.context.votes
+
+    @property
+    def yes_votes(self) -> int:
+        return self.context.yes_votes if self.stage is Stage.chancellor_election else 0
+
+    @property
+    def no_votes(self) -> int:
+        return self.context.no_votes if self.stage is Stage.chancellor_election else 0
+
+    @property
+    def is_election_decided(self) -> bool:
+        """
+        Returns True if the outcome cannot change whatever the remaining
+        voters choose, ie. if the yes or the no have a majority already.
+        """
+        # A tie is a failed election.
+        return (
+            2 * self.yes_votes > self.player_count
+            or 2 * self.no_votes >= self.player_count
+        )
+
     def record_vote(self, player: Player, yes: bool):
         self._ensure_stage(Stage.chancellor_election)
 
-        self.votes[player] = yes
+        if player not in self.alive_players:
+            raise InvalidAction()
+
+        self.context.record(player, yes)
 
     def exit_chancellor_election(self):
         self._ensure_stage(Stage.chancellor_election)
 
-        if not self.is_election_complete:
+        # Remaining voters can't change a decided election, don't wait for them.
+        if not self.is_election_decided:
             raise IllegalState()
 
-        yes_count = sum(1 for vote in self.votes.values() if vote)
-        no_count = self.player_count - yes_count
-        # A tie is a failed election, hence strictly greater than.
-        vote_succeeds = yes_count > no_count
-
-        self.votes = {}
+        yes_count = self.yes_votes
+        no_count = self.no_votes
+        vote_succeeds = 2 * yes_count > self.player_count
 
         if not vote_succeeds:
             yield NominateVoteFails(yes_count, no_count)
@@ -459,7 +776,7 @@ class State:
 
         # Successful election resets the election tracker.
         self.failed_votes = 0
-        self._ensure_valid_policy_deck()
+        yield from self._ensure_valid_policy_deck()
         yield NominateVoteSucceeds(yes_count, no_count, self.chancellor)
 
         # Fascists win by electing Hitler chancellor after 3 enacted policies.
@@ -477,7 +794,7 @@ class State:
     @property
     def president_hand(self) -> List[Policy]:
         self._ensure_stage(Stage.legislate)
-        return self.policy_deck[-PRESIDENT_HAND:]
+        return self.policy_deck.peek(PRESIDENT_HAND)
 
     @property
     def deck_without_president_hand(self) -> List[Policy]:
@@ -487,17 +804,25 @@ class State:
     def president_discards(self, discarded_policy: Policy):
         self._ensure_stage(Stage.legislate)
 
-        hand = self.president_hand
-        if discarded_policy not in hand:
+        if self.context.discarded is not None:
             raise InvalidAction()
 
-        hand.remove(discarded_policy)
+        # For convenience, the hand stays at the top of the deck.
+        try:
+            self.policy_deck.remove(discarded_policy, depth=PRESIDENT_HAND)
+        except ValueError:
+            raise InvalidAction() from None
         self.discard_pile.append(discarded_policy)
-        # For convenience, we store the hand to the top of the deck.
-        self.policy_deck = self.deck_without_president_hand + hand
+        self.context.discarded = discarded_policy
 
     def exit_legislate(self):
         self._ensure_stage(Stage.legislate)
+
+        discarded_policy = self.context.discarded
+        if discarded_policy is None:
+            raise IllegalState()
+
+        yield PresidentDiscards(self.president, discarded_policy)
         yield PresidentLegislates(self.president)
         yield StageChanges(Stage.enact)
 
@@ -506,7 +831,7 @@ class State:
     @property
     def chancellor_hand(self) -> List[Policy]:
         self._ensure_stage(Stage.enact)
-        return self.policy_deck[-CHANCELLOR_HAND:]
+        return self.policy_deck.peek(CHANCELLOR_HAND)
 
     @property
     def deck_without_chancellor_hand(self) -> List[Policy]:
@@ -516,44 +841,38 @@ class State:
     def chancellor_discards(self, discarded_policy: Policy):
         self._ensure_stage(Stage.enact)
 
-        if self.veto_requested:
-            raise InvalidAction()
-
-        hand = self.chancellor_hand
-        if discarded_policy not in hand:
+        if self.context.requested:
             raise InvalidAction()
 
-        hand.remove(discarded_policy)
-        assert len(hand) == 1
+        # For convenience, the enacted policy stays at the top of the deck.
+        try:
+            self.policy_deck.remove(discarded_policy, depth=CHANCELLOR_HAND)
+        except ValueError:
+            raise InvalidAction() from None
         self.discard_pile.append(discarded_policy)
-        # For convenience, we put the enacted policy at the top of the deck.
-        enacted_policy = hand[0]
-        self.policy_deck = self.deck_without_chancellor_hand + [enacted_policy]
 
     def chancellor_vetoes(self):
-        self._ensure_stage(Stage.legislate)
+        self._ensure_stage(Stage.enact)
 
         # TODO: no check that c_vetoes() is never called after c_discard(),
         # trusting caller.
-        if self.veto_requested:
+        if self.context.requested or self.context.denied:
             raise InvalidAction()
 
         if not ExecutiveAction.veto_available(self.fascist_policies):
             raise InvalidAction()
 
-        self.veto_requested = True
+        self.context.requested = True
 
     def exit_enact(self):
         self._ensure_stage(Stage.enact)
 
-        if self.veto_requested:
+        if self.context.requested:
             yield ChancellorVetoes(self.president, self.chancellor)
             yield StageChanges(Stage.confirm_veto)
             return
 
-        self.veto_requested = False
-
-        enacted_policy = self.policy_deck.pop(-1)
+        enacted_policy = self.policy_deck.draw()
         yield ChancellorEnacts(self.chancellor, enacted_policy)
         yield from self._enact_outcome(enacted_policy)
 
@@ -561,12 +880,13 @@ class State:
 
     def president_answers_to_veto(self, accept: bool):
         self._ensure_stage(Stage.confirm_veto)
-        self.veto_accepted = accept
+        self.context.accepted = accept
 
     def exit_confirm_veto(self):
         self._ensure_stage(Stage.confirm_veto)
 
-        if not self.veto_accepted:
+        if not self.context.accepted:
+            self._deny_veto()
             yield PresidentDeniesVeto(self.president, self.chancellor)
             # Back to enact.
             yield StageChanges(Stage.enact)
@@ -582,11 +902,15 @@ class State:
 
         yield from self._next_president()
 
+    def _deny_veto(self):
+        self.context.requested = False
+        self.context.denied = True
+
     # Stage: action_peek
 
     def president_peeks(self) -> List[Policy]:
         self._ensure_stage(Stage.action_peek)
-        return self.policy_deck[-PRESIDENT_HAND:]
+        return self.policy_deck.peek(PRESIDENT_HAND)
 
     def exit_action_peek(self):
         self._ensure_stage(Stage.action_peek)
@@ -598,23 +922,28 @@ class State:
     # Stage: action_investigate
 
     def president_investigates(self, investigated_player: Player) -> Role:
+        self._ensure_stage(Stage.action_investigate)
+
         # Nothing in the rules prevents from investigating dead players.
-        if investigated_player not in self.players + self.dead_players:
+        if (
+            investigated_player not in self.alive_players
+            and investigated_player not in self.killed_players
+        ):
             raise InvalidAction()
 
         if investigated_player == self.president:
             raise InvalidAction()
 
-        self.investigated_players.append(investigated_player)
+        self.context.target = investigated_player
         return investigated_player.role
 
     def exit_action_investigate(self):
         self._ensure_stage(Stage.action_investigate)
 
-        # Uses the fact that the last player is the one investigated.
-        # Convenient but I don't like it.
-        # TODO: no check that someone was in fact investigated, trusting caller.
-        yield PresidentInvestigates(self.president, self.investigated_players[-1])
+        if self.context.target is None:
+            raise IllegalState()
+
+        yield PresidentInvestigates(self.president, self.context.target)
         yield from self._next_president()
 
     # Stage: action_kill
@@ -623,45 +952,101 @@ class State:
         self._ensure_stage(Stage.action_kill)
 
         # TODO: no check for multiple kills, trusting caller.
-        if killed_player not in self.players:
+        if killed_player not in self.alive_players:
             raise InvalidAction()
 
         if killed_player == self.president:
             raise InvalidAction()
 
-        self.killed_player = killed_player
+        self.context.target = killed_player
 
     def exit_action_kill(self):
         self._ensure_stage(Stage.action_kill)
 
-        if not self.killed_player:
+        killed_player = self.context.target
+        if killed_player is None:
             raise IllegalState()
 
-        self.dead_players.append(self.killed_player)
-        self.players.remove(self.killed_player)
-        self._build_player_cycle()
+        self._kill(killed_player)
 
-        yield PresidentKills(self.president, self.killed_player)
+        yield PresidentKills(self.president, killed_player)
         yield from self._next_president()
 
     # Stage: action_special_election
 
     def president_chooses_next_president(self, next_president: Player):
+        self._ensure_stage(Stage.action_special_election)
+
+        if next_president not in self.alive_players:
+            raise InvalidAction()
+
         if next_president == self.president:
             raise InvalidAction()
 
-        self.special_election_next_president = next_president
+        self.context.target = next_president
 
     def exit_action_special_election(self):
         self._ensure_stage(Stage.action_special_election)
-        next_president = self.special_election_next_president
-        self.special_election_next_president = None
+
+        next_president = self.context.target
+        if next_president is None:
+            raise IllegalState()
 
         # We purposefully don't advance president.
         yield from self._next_president(specially_elected=next_president)
 
     # Utility functions.
 
+    # Replacements, at any stage of a game.
+
+    def replace_player(self, parting_player: Player, new_player: Player):
+        """
+        Gives the seat of parting_player, role included, to new_player. As it
+        happens outside of advance(), the PlayerReplaces event is journaled
+        here and returned.
+        """
+        if self.stage is Stage.lobby:
+            raise IllegalState()
+        if parting_player not in self.alive_players:
+            raise InvalidAction()
+        if new_player.name in self.players_by_name:
+            raise InvalidAction()
+        if len(new_player.name.encode()) > MAX_NAME_SIZE:
+            raise InvalidAction()
+
+        parting_player = self.get_player(parting_player.name)
+        event = PlayerReplaces(
+            parting_player, Player(new_player.name, parting_player.role)
+        )
+        self._swap_player(event.parting_player, event.new_player)
+        self.journal.append(event)
+        return event
+
+    def _swap_player(self, parting_player: Player, new_player: Player):
+        def player(p):
+            return new_player if p == parting_player else p
+
+        self.players = [player(p) for p in self.players]
+        self.president = player(self.president)
+        self.former_president = player(self.former_president)
+        self.chancellor = player(self.chancellor)
+        self.former_chancellor = player(self.former_chancellor)
+        self.cycle_president = player(self.cycle_president)
+        if self.context is not None:
+            context = type(self.context)()
+            context.copy_from(self.context, player)
+            self.context = context
+        self._index_players()
+
+    @property
+    def rng_state(self) -> tuple:
+        """Snapshot of the generator, to replay the game from this point."""
+        return self.rng.getstate()
+
+    @rng_state.setter
+    def rng_state(self, rng_state: tuple):
+        self.rng.setstate(rng_state)
+
     @property
     def player_count(self):
         """Count of alive players."""
@@ -675,22 +1060,36 @@ class State:
     def _ensure_valid_policy_deck(self):
         """
         If there are less than POLICY_DRAW_COUNT policies in the deck, merge it
-        with discard pile and shuffle. Otherwise, no op.
+        with discard pile, shuffle and yield the new deck. Otherwise, no op.
         """
         if len(self.policy_deck) < PRESIDENT_HAND:
             self.policy_deck.extend(self.discard_pile)
             self.discard_pile.clear()
-            random.shuffle(self.policy_deck)
+            self.policy_deck.shuffle(self.rng)
+            yield PolicyDeckShuffles(tuple(self.policy_deck))
+
+    def _index_players(self):
+        self.alive_players = set(self.players)
+        self.killed_players = set(self.dead_players)
+        self.players_by_name = {
+            player.name: player
+            for player in itertools.chain(self.players, self.dead_players)
+        }
+
+    def _kill(self, player: Player):
+        self.dead_players.append(player)
+        self.players.remove(player)
+        self.alive_players.remove(player)
+        self.killed_players.add(player)
+        self._build_player_cycle()
 
     def _ensure_stage(self, stage):
         if self.stage != stage:
             raise IllegalState(f"This can only be called during stage {stage}.")
 
     def _build_player_cycle(self):
-        self.player_cycle = itertools.cycle(self.players)
-        while True:
-            if next(self.player_cycle) == self.president:
-                break
+        """Restarts the turn order from the president."""
+        self.cycle_president = self.president
 
     # Reusable state progress functions.
 
@@ -705,7 +1104,9 @@ class State:
         if specially_elected is not None:
             self.president = specially_elected
         else:
-            self.president = next(self.player_cycle)
+            players = self.players
+            seat = players.index(self.cycle_president) + 1
+            self.president = self.cycle_president = players[seat % len(players)]
         yield PresidentChanges(self.former_president, self.president)
         yield StageChanges(Stage.nominate_chancellor)
 
@@ -713,23 +1114,28 @@ class State:
         # Chaos resets the election tracker (obviously).
         self.failed_votes = 0
 
-        self._ensure_valid_policy_deck()
-        enacted_policy = self.policy_deck.pop(-1)
+        yield from self._ensure_valid_policy_deck()
+        enacted_policy = self.policy_deck.draw()
         self.discard_pile.append(enacted_policy)
 
         yield ChaosHappens(enacted_policy)
         yield from self._enact_outcome(enacted_policy)
 
-    def _enact_outcome(self, enacted_policy: Policy):
+    def _count_policy(self, enacted_policy: Policy):
         if enacted_policy is Policy.liberal:
             self.liberal_policies += 1
+        else:
+            self.fascist_policies += 1
+
+    def _enact_outcome(self, enacted_policy: Policy):
+        self._count_policy(enacted_policy)
+        if enacted_policy is Policy.liberal:
             if self.liberal_policies == 5:
                 yield LiberalsWin()
                 yield StageChanges(Stage.lobby)
                 return
 
         else:
-            self.fascist_policies += 1
             if self.fascist_policies == 6:
                 yield FascistsWin()
                 yield StageChanges(Stage.lobby)
@@ -763,37 +1169,173 @@ class State:
         yield from self._next_president()
 
     def _init_policy_deck(self):
-        self.policy_deck = list(
+        self.policy_deck.clear()
+        self.policy_deck.extend(
             itertools.chain(
                 (Policy.liberal for _ in range(LIBERAL_POLICY_COUNT)),
                 (Policy.fascist for _ in range(FASCIST_POLICY_COUNT)),
             )
         )
-        random.shuffle(self.policy_deck)
+        self.discard_pile.clear()
+        self.policy_deck.shuffle(self.rng)
+
+    # Migration.
+
+    @classmethod
+    def migrate(cls, old) -> "State":
+        """
+        Returns a State equivalent to old, which may come from a previous load
+        of this module (eg. before a hot reload) and another SCHEMA_VERSION.
+
+        Reloading this module creates new classes and enums, which old still
+        refers to: games are always rebuilt from their journal, a replay of
+        at most a few hundred events. The temporary state of the current
+        stage is copied over only if old has the same schema.
+        """
+        if type(old) is cls:
+            # Not reloaded since old was created.
+            return old
+
+        if old.stage.name == Stage.lobby.name:
+            state = cls(old.rng)
+            for player in old.players:
+                state.add_player(Player(player.name))
+            return state
+
+        state = cls.replay(Journal.from_bytes(old.journal.to_bytes()), old.rng)
+        if getattr(old, "SCHEMA_VERSION", None) == cls.SCHEMA_VERSION:
+            state._copy_temporary_state(old)
+        return state
+
+    def _copy_temporary_state(self, old: "State"):
+        def player(p):
+            return None if p is None else self.get_player(p.name)
+
+        # Discards happen before the stage is exited.
+        self.policy_deck = PolicyDeck(Policy[p.name] for p in old.policy_deck)
+        self.discard_pile = PolicyDeck(Policy[p.name] for p in old.discard_pile)
+        if self.stage is Stage.nominate_chancellor:
+            self.chancellor = player(old.chancellor)
+        if self.context is not None:
+            self.context.copy_from(old.context, player)
+
+    # Replay.
+
+    @classmethod
+    def replay(
+        cls, events: Iterable[Event], rng: Optional[random.Random] = None
+    ) -> "State":
+        """
+        Rebuilds a game from its events, as recorded in State.journal. Only
+        the temporary state of the current stage (eg. votes) is lost. The rng
+        is not used to replay but for the rest of the game.
+        """
+        state = cls(rng)
+        for event in events:
+            handler = _REPLAY_HANDLERS.get(type(event))
+            if handler is not None:
+                handler(state, event)
+            state.journal.append(event)
+        return state
+
+    def _replay_game_starts(self, event: GameStarts):
+        self.reset()
+
+    def _replay_player_role_changes(self, event: PlayerRoleChanges):
+        player = Player(event.player.name, event.player.role)
+        self.players.append(player)
+        self.alive_players.add(player)
+        self.players_by_name[player.name] = player
+
+    def _replay_policy_deck_shuffles(self, event: PolicyDeckShuffles):
+        self.policy_deck.clear()
+        self.policy_deck.extend(event.policies)
+        self.discard_pile.clear()
+
+    def _replay_president_changes(self, event: PresidentChanges):
+        new_president = self.get_player(event.new_president.name)
+        if event.former_president is None:
+            self.president = new_president
+            self._build_player_cycle()
+            return
+
+        if self.stage is Stage.action_special_election:
+            specially_elected = new_president
+        else:
+            specially_elected = None
+        # Drains the generator, which only changes the governments.
+        list(self._next_president(specially_elected))
+        assert self.president == new_president
+
+    def _replay_president_nominates(self, event: PresidentNominates):
+        self.chancellor = self.get_player(event.candidate_chancellor.name)
+
+    def _replay_nominate_vote_succeeds(self, event: NominateVoteSucceeds):
+        self.failed_votes = 0
+
+    def _replay_election_tracker_progresses(self, event: ElectrionTrackerProgresses):
+        self.failed_votes = event.vote_failure_count
+
+    def _replay_chaos_happens(self, event: ChaosHappens):
+        self.failed_votes = 0
+        self.discard_pile.append(self.policy_deck.draw())
+        self._count_policy(event.policy)
+
+    def _replay_president_discards(self, event: PresidentDiscards):
+        self.policy_deck.remove(event.policy, depth=PRESIDENT_HAND)
+        self.discard_pile.append(event.policy)
+
+    def _replay_chancellor_enacts(self, event: ChancellorEnacts):
+        hand = self.policy_deck.peek(CHANCELLOR_HAND)
+        hand.remove(event.policy)
+        discarded_policy, = hand
+        self.policy_deck.remove(discarded_policy, depth=CHANCELLOR_HAND)
+        self.discard_pile.append(discarded_policy)
+        self.policy_deck.draw()
+        self._count_policy(event.policy)
+
+    def _replay_chancellor_vetoes(self, event: ChancellorVetoes):
+        self.context.requested = True
+
+    def _replay_president_denies_veto(self, event: PresidentDeniesVeto):
+        self._deny_veto()
+
+    def _replay_president_kills(self, event: PresidentKills):
+        self._kill(self.get_player(event.killed.name))
+
+    def _replay_player_replaces(self, event: PlayerReplaces):
+        self._swap_player(
+            self.get_player(event.parting_player.name),
+            Player(event.new_player.name, event.new_player.role),
+        )
+
+    def _replay_stage_changes(self, event: StageChanges):
+        self._enter_stage(event.stage)
 
     # Test helpers, should not be used outside of tests.
 
     def _skip_lobby_for_testing(self, players: List[Player], president: Player):
         self.players = players[:]
+        self._index_players()
         self.president = president
         self._build_player_cycle()
         self._init_policy_deck()
-        self.stage = Stage.nominate_chancellor
+        self._enter_stage(Stage.nominate_chancellor)
 
     def _skip_chancellor_election_for_testing(self, chancellor: Player):
         self.former_chancellor = self.chancellor
         self.chancellor = chancellor
-        self.stage = Stage.legislate
+        self._enter_stage(Stage.legislate)
 
     def _force_elect_chancellor_for_testing(self, chancellor: Player):
-        self.stage = Stage.nominate_chancellor
+        self._enter_stage(Stage.nominate_chancellor)
         self.nominate_chancellor(chancellor)
         self.advance()
         for p in self.players:
             self.record_vote(p, True)
 
     def _force_failed_election(self):
-        self.stage = Stage.nominate_chancellor
+        self._enter_stage(Stage.nominate_chancellor)
         # Random player.
         banned = {
             self.former_chancellor,
@@ -826,4 +1368,28 @@ class State:
         # Put enacted policy at the top (convention).
         self.policy_deck.remove(enacted_policy)
         self.policy_deck.append(enacted_policy)
-        self.stage = Stage.enact
+        self._enter_stage(Stage.enact)
+
+
+# exit_<stage>() of each stage, see State.advance().
+_EXIT_HANDLERS: Dict[Stage, Callable[[State], Iterator[Event]]] = {
+    stage: getattr(State, f"exit_{stage.name}") for stage in Stage
+}
+
+_REPLAY_HANDLERS: Dict[type, Callable[[State, Event], None]] = {
+    GameStarts: State._replay_game_starts,
+    PlayerRoleChanges: State._replay_player_role_changes,
+    PlayerReplaces: State._replay_player_replaces,
+    PolicyDeckShuffles: State._replay_policy_deck_shuffles,
+    PresidentChanges: State._replay_president_changes,
+    PresidentNominates: State._replay_president_nominates,
+    NominateVoteSucceeds: State._replay_nominate_vote_succeeds,
+    ElectrionTrackerProgresses: State._replay_election_tracker_progresses,
+    ChaosHappens: State._replay_chaos_happens,
+    PresidentDiscards: State._replay_president_discards,
+    ChancellorEnacts: State._replay_chancellor_enacts,
+    ChancellorVetoes: State._replay_chancellor_vetoes,
+    PresidentDeniesVeto: State._replay_president_denies_veto,
+    PresidentKills: State._replay_president_kills,
+    StageChanges: State._replay_stage_changes,
+}
@@ -1,42 +1,190 @@
 import asyncio
-import enum
+import collections
 import functools
+import importlib
+import logging
 import os
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
 
 import irc3
 from irc3.plugins.command import command
 
-from hitlair import game
-from hitlair.game import Player
-from hitlair.irc_util import encode_modes
-
-SELF_MODULE = "hitler.irc"
-CHANNEL = "##dieses-fn"
+from hitlair import ai, game, sim, snapshot
+from hitlair.irc_util import ModeBatcher, is_netsplit, parse_modes, prefix_modes
+from hitlair.metrics import Metrics, dump, serve
+from hitlair.persistence import SnapshotStore
+from hitlair.registry import Registry, SetupState, Table
+from hitlair.send_queue import SendQueue
+from hitlair.timers import DeadlineScheduler
+from hitlair.workers import Overloaded, WorkerPool
+
+SELF_MODULE = "hitlair.irc"
+# Reloaded before SELF_MODULE by reloadpls, in this order. Live games are
+# migrated to the reloaded classes, see game.State.migrate(). Modules importing
+# names from hitlair.game must follow it, or they would keep the old enums.
+RELOADED_MODULES = (
+    "hitlair.journal",
+    "hitlair.game",
+    "hitlair.snapshot",
+    "hitlair.sim",
+    "hitlair.ai",
+)
+CHANNELS = os.getenv("HITLAIR_CHANNELS", "##dieses-fn").split(",")
+# Lobbies nobody joined for that long are dropped from the registry.
+IDLE_LOBBY_TIMEOUT = 3600
+EVICTION_INTERVAL = 300
+# Seconds to wait for ops after joining before asking for them.
+OP_TIMEOUT = 30
+# Seconds players have to act in each stage before the bot acts for them,
+# see AbsentPlayerStrategy. Stages not listed wait forever.
+STAGE_DEADLINES = {
+    game.Stage.nominate_chancellor: 120,
+    game.Stage.chancellor_election: 120,
+    game.Stage.legislate: 90,
+    game.Stage.enact: 90,
+    game.Stage.confirm_veto: 60,
+    game.Stage.action_peek: 60,
+    game.Stage.action_investigate: 120,
+    game.Stage.action_kill: 120,
+    game.Stage.action_special_election: 120,
+}
+# Seconds the seat of a player who left is held for them. Then the first
+# waiter (see join) takes it over, or the game is aborted.
+REPLACEMENT_GRACE = 120
+# Seconds QUITs, and JOINs of players lost in a netsplit, are gathered to be
+# handled together: netsplits come as bursts of them.
+BURST_WINDOW = 0.5
+# Seconds games wait for the players lost in a netsplit.
+NETSPLIT_GRACE = 600
+# Search budget of computer players, per decision, see hitlair.ai.
+AI_SEARCH = ai.SearchConfig(
+    time_budget=float(os.getenv("HITLAIR_AI_TIME", "2")),
+    max_depth=int(os.getenv("HITLAIR_AI_DEPTH", "80")),
+)
+# Processes searching for computer players, ie. CPUs they may use.
+AI_WORKERS = int(os.getenv("HITLAIR_AI_WORKERS", "2"))
+# Seconds before bots try again when the workers are overloaded.
+AI_RETRY_DELAY = 1
+# Live games are stored there to survive restarts, if set.
+STATE_FILE = os.getenv("HITLAIR_STATE_FILE")
+# Metrics are served at http://127.0.0.1:<port>/metrics, and/or written to the
+# file every METRICS_INTERVAL seconds, if set.
+METRICS_PORT = os.getenv("HITLAIR_METRICS_PORT")
+METRICS_FILE = os.getenv("HITLAIR_METRICS_FILE")
+METRICS_INTERVAL = 15
+
+log = logging.getLogger(__name__)
+
+
+class AbsentPlayerStrategy(sim.RandomStrategy):
+    """Decisions taken for players who let their deadline pass."""
+
+    def vote(self, state, voter):
+        # Silence is not consent.
+        return False
+
+
+class BotMetrics(Metrics):
+    """What the bot records, exported in the Prometheus text format."""
+
+    def __init__(
+        self, registry: Registry, sender: SendQueue, workers: WorkerPool
+    ):
+        super().__init__("hitlair")
+        self.transitions = self.counter(
+            "transitions_total", "Stages entered by games.", ["stage"]
+        )
+        self.events = self.counter("events_total", "Events emitted by games.", ["type"])
+        self.advance_seconds = self.histogram(
+            "advance_seconds",
+            "Time games take to leave a stage, event handlers included.",
+            ["stage"],
+        )
+        self.command_seconds = self.histogram(
+            "command_seconds", "Time taken to handle commands.", ["command"]
+        )
+        self.privmsg_seconds = self.histogram(
+            "privmsg_seconds", "Time taken to hand lines to the connection."
+        )
+        self.gauge(
+            "send_queue_depth",
+            "Messages waiting to be sent.",
+            collect=lambda: sender.depth,
+        )
+        self.gauge(
+            "ai_jobs",
+            "Searches of computer players pending.",
+            collect=lambda: len(workers),
+        )
+        self.gauge(
+            "games",
+            "Games hosted, by stage.",
+            ["stage"],
+            collect=lambda: games_by_stage(registry),
+        )
+
+
+def games_by_stage(registry: Registry) -> Dict[Tuple[str], int]:
+    counts = collections.Counter(table.game.stage.name for table in registry)
+    return {(stage.name,): counts[stage.name] for stage in game.Stage}
+
+
+def policy_name(policy: game.Policy) -> str:
+    return {game.Policy.liberal: "libérale", game.Policy.fascist: "fasciste"}[policy]
 
 
 def ignore_wrong_channel(f):
+    """
+    Resolves the table a command is about and passes it to f. Commands sent
+    to channels without a game, or by nicks not playing (for queries), are
+    ignored.
+    """
+
     @functools.wraps(f)
     def wrapped(self, mask, target, *args, **kwargs):
-        print("omg", self, mask, target)
-        if target != CHANNEL:
+        table = self.table_for(mask, target)
+        if table is None:
             return
-        return f(self, mask, target, *args, **kwargs)
+        self.registry.touch(table)
+        start = time.perf_counter()
+        try:
+            return f(self, table, mask, target, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.command_seconds.observe(elapsed, f.__name__)
 
     return wrapped
 
 
-class State(enum.Enum):
-    pending_setup = enum.auto()
-    ready = enum.auto()
-
-
 @irc3.plugin
 class SecretHitlerPlugin:
     def __init__(self, bot):
         self.bot: irc3.IrcBot = bot
-        self.state = State.pending_setup
-        self.paused = False
-        self.game = game.State()
+        self.registry = Registry()
+        self.timers = DeadlineScheduler(self.bot.loop)
+        self.absent_strategy = AbsentPlayerStrategy()
+        self.workers = WorkerPool(self.bot.loop, AI_WORKERS)
+        self.sender = SendQueue(None, self.bot.loop)
+        self.metrics = BotMetrics(self.registry, self.sender, self.workers)
+        self.sender.send = self.metrics.privmsg_seconds.timed(self.bot.privmsg)
+        self.modes = ModeBatcher(
+            self.bot.mode, self.bot.loop, lambda: self.bot.server_config
+        )
+        self.store = SnapshotStore(STATE_FILE) if STATE_FILE else None
+        self.dispatcher = self.build_dispatcher()
+        # Gathered for handle_quits() and handle_rejoins().
+        self.quits: List[Tuple[irc3.utils.IrcString, Optional[str]]] = []
+        self.rejoins: List[Tuple[Table, str, str]] = []
+        if self.store is not None:
+            self.restore_games()
+        self.timers.schedule("eviction", EVICTION_INTERVAL, self.evict_idle_tables)
+        if METRICS_PORT:
+            self.bot.loop.create_task(serve(self.metrics, int(METRICS_PORT)))
+        if METRICS_FILE:
+            self.timers.schedule("metrics", METRICS_INTERVAL, self.dump_metrics)
 
     requires = [
         "irc3.plugins.core",
@@ -46,180 +194,708 @@ class SecretHitlerPlugin:
 
     @classmethod
     def reload(cls, old):
-        return cls(old.bot)
+        """Takes over the games, store and timers of the old instance."""
+        self = cls.__new__(cls)
+        self.bot = old.bot
+        self.registry = old.registry
+        self.timers = old.timers
+        self.absent_strategy = old.absent_strategy
+        self.workers = old.workers
+        self.sender = old.sender
+        self.metrics = old.metrics
+        self.modes = old.modes
+        self.store = old.store
+        self.dispatcher = self.build_dispatcher()
+        self.quits = old.quits
+        self.rejoins = old.rejoins
+        for table in self.registry:
+            table.game = game.State.migrate(table.game)
+        # Pauses call back tables, which are kept. Ours must be moved.
+        self.move_timer("eviction", self.evict_idle_tables)
+        self.move_timer("metrics", self.dump_metrics)
+        self.move_timer("quits", self.handle_quits)
+        self.move_timer("rejoins", self.handle_rejoins)
+        for table in self.registry:
+            self.move_timer((table, "deadline"), self.stage_deadline, table)
+            self.move_timer((table, "bots"), self.play_bots, table)
+            for nick in table.vacant:
+                self.move_timer((table, "vacant", nick), self.fill_seat, table, nick)
+        return self
+
+    def move_timer(self, key, callback, *args):
+        """Keeps the deadline of key, calling callback(*args) instead."""
+        when = self.timers.when(key)
+        if when is not None:
+            self.timers.schedule_at(key, when, callback, *args)
 
     def after_reload(self):
         # asyncio.create_task(self.ensure_setup())
         pass
 
+    def table_for(self, mask, target) -> Optional[Table]:
+        if target == self.bot.nick:
+            # Query: find the game the sender plays in.
+            return self.registry.for_nick(mask.nick)
+        table = self.registry.get(target)
+        if table is None and target in self.bot.channels:
+            # The lobby was evicted while idle, the channel is still set up.
+            table = self.registry.open(target)
+            table.state = SetupState.ready
+        return table
+
+    def restore_games(self):
+        for channel, state in self.store.load().items():
+            table = self.registry.open(channel)
+            table.game = state
+            table.state = SetupState.restored
+            for player in state.players:
+                if player.name.startswith(ai.BOT_NAME_PREFIX):
+                    table.bots.add(player.name)
+                else:
+                    self.registry.bind(player.name, table)
+            self.schedule_deadline(table)
+            self.play_bots(table)
+
+    def advance(self, table: Table, current_stage=None):
+        """Advances the game of table, streaming its events to self.dispatcher."""
+        stage = table.game.stage
+        start = time.perf_counter()
+        try:
+            return table.game.advance(
+                current_stage, functools.partial(self.dispatcher.dispatch, table)
+            )
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.advance_seconds.observe(elapsed, stage.name)
+
+    def build_dispatcher(self) -> game.EventDispatcher:
+        dispatcher = game.EventDispatcher()
+        dispatcher.on(game.StageChanges, self.after_transition)
+        dispatcher.on(game.GameStarts, self.show_game_starts)
+        dispatcher.on(game.PlayerRoleChanges, self.show_role)
+        dispatcher.on(game.PlayerReplaces, self.show_replacement)
+        dispatcher.on(game.PresidentChanges, self.show_president)
+        dispatcher.on(game.PresidentNominates, self.show_nomination)
+        dispatcher.on(game.NominateVoteSucceeds, self.show_vote)
+        dispatcher.on(game.NominateVoteFails, self.show_vote)
+        dispatcher.on(game.HitlerIsElectedChancellor, self.show_hitler_elected)
+        dispatcher.on(game.ChancellorVetoes, self.show_veto)
+        dispatcher.on(game.ChancellorEnacts, self.show_enacted)
+        dispatcher.on(game.ChaosHappens, self.show_chaos)
+        dispatcher.on(game.PresidentInvestigates, self.show_investigation)
+        dispatcher.on(game.PresidentKills, self.show_kill)
+        dispatcher.on(game.LiberalsWin, self.show_winners)
+        dispatcher.on(game.FascistsWin, self.show_winners)
+        dispatcher.on(game.StageChanges, self.show_stage)
+        dispatcher.subscribe(self.count_event)
+        return dispatcher
+
+    def count_event(self, table: Table, event: game.Event):
+        self.metrics.events.inc(type(event).__name__)
+
+    def after_transition(self, table: Table, event: game.StageChanges):
+        self.metrics.transitions.inc(event.stage.name)
+        self.save(table)
+        if event.stage is game.Stage.lobby:
+            self.release_seats(table)
+        self.schedule_deadline(table)
+        self.play_bots(table)
+
+    def save(self, table: Table):
+        if self.store is not None:
+            if not self.store.save(table.channel, table.game):
+                log.warning("Game in %s too long to be stored", table.channel)
+            self.store.schedule_flush(self.bot.loop)
+
+    def schedule_deadline(self, table: Table):
+        """Gives players STAGE_DEADLINES[stage] to act in the current stage."""
+        delay = STAGE_DEADLINES.get(table.game.stage)
+        if delay is None:
+            self.timers.cancel((table, "deadline"))
+        else:
+            self.timers.schedule((table, "deadline"), delay, self.stage_deadline, table)
+
+    def stage_deadline(self, table: Table):
+        self.send(table, "Trop lent ! Je décide à votre place.")
+        try:
+            if not sim.decide(table.game, self.absent_strategy):
+                raise game.IllegalState()
+            self.advance(table)
+        except game.Error:
+            self.abort_game(
+                table, "Temps écoulé, et je ne trouve rien à jouer à votre place."
+            )
+
+    def play_bots(self, table: Table):
+        """Starts the searches of the bots the game waits for."""
+        if table.paused:
+            return
+        players = snapshot.seats(table.game)
+        for seat in ai.waiting_seats(table.game):
+            name = players[seat].name
+            if name in table.bots and name not in table.thinking:
+                table.thinking.add(name)
+                self.bot.loop.create_task(self.bot_decides(table, seat))
+
+    async def bot_decides(self, table: Table, seat: int):
+        state = table.game
+        name = snapshot.seats(state)[seat].name
+        before = snapshot.Snapshot.from_state(state)
+        try:
+            job = self.workers.submit(table, ai.decide, before, seat, AI_SEARCH)
+            action = await job
+        except Overloaded:
+            self.timers.schedule(
+                (table, "bots"), AI_RETRY_DELAY, self.play_bots, table
+            )
+            return
+        except game.Error:
+            # Eg. nobody can be nominated, unless the game moved on.
+            action = None
+        except BrokenProcessPool:
+            # The worker died: better any decision than none.
+            actions = before.legal_actions()
+            action = self.absent_strategy.rng.choice(actions) if actions else None
+        finally:
+            table.thinking.discard(name)
+        if table.paused:
+            # Searches start over once the game goes on, see thaw().
+            return
+        # The game may have moved on meanwhile, eg. the election was decided
+        # without this vote: the bot may have to decide something else.
+        if (
+            table.game is not state
+            or seat not in ai.waiting_seats(state)
+            or snapshot.Snapshot.from_state(state)._replace(voted=0, yes=0)
+            != before._replace(voted=0, yes=0)
+        ):
+            self.play_bots(table)
+            return
+        if action is None:
+            self.abort_game(table, f"{name} ne trouve rien à jouer.")
+            return
+        try:
+            if snapshot.play(state, action, seat):
+                self.advance(table)
+        except game.Error:
+            self.abort_game(table, f"{name} ne trouve rien à jouer.")
+
+    def evict_idle_tables(self):
+        self.registry.evict_idle(IDLE_LOBBY_TIMEOUT)
+        self.timers.schedule("eviction", EVICTION_INTERVAL, self.evict_idle_tables)
+
+    def dump_metrics(self):
+        dump(self.metrics, METRICS_FILE)
+        self.timers.schedule("metrics", METRICS_INTERVAL, self.dump_metrics)
+
+    # Event rendering, see build_dispatcher().
+
+    def show_game_starts(self, table: Table, event: game.GameStarts):
+        self.send(table, "Et c'est parti pour une game de folie !")
+
+    def show_role(self, table: Table, event: game.PlayerRoleChanges):
+        self.tell_role(table, event.player)
+
+    def show_replacement(self, table: Table, event: game.PlayerReplaces):
+        self.send(
+            table, f"{event.new_player.name} remplace {event.parting_player.name}."
+        )
+        self.tell_role(table, event.new_player)
+
+    def tell_role(self, table: Table, player: game.Player):
+        role = {
+            game.Role.liberal: "un libéral",
+            game.Role.fascist: "un fascho",
+            game.Role.hitler: "un fascho, et surtou tu es LITTÉRALEMENT HITLER",
+        }[player.role]
+        if player.name in table.bots:
+            return
+        self.send_private(player.name, f"FYI tu es {role}")
+
+    def show_president(self, table: Table, event: game.PresidentChanges):
+        if event.former_president is None:
+            self.send(
+                table,
+                f"Le président a été choisi au hasard, c'est {event.new_president.name} !",
+            )
+        else:
+            self.send(table, f"{event.new_president.name} devient président.")
+
+    def show_nomination(self, table: Table, event: game.PresidentNominates):
+        self.send(
+            table,
+            f"Le choix du président se porte sur {event.candidate_chancellor.name} comme chancelier.",
+        )
+
+    def show_vote(self, table: Table, event):
+        counts = f"{event.yes_count} oui, {event.no_count} non"
+        if isinstance(event, game.NominateVoteSucceeds):
+            self.send(
+                table, f"{event.new_chancellor.name} est élu chancelier ({counts})."
+            )
+        else:
+            self.send(table, f"Le chancelier est rejeté ({counts}).")
+
+    def show_hitler_elected(self, table: Table, event: game.HitlerIsElectedChancellor):
+        self.send(
+            table,
+            f"{event.hitler_and_chancellor.name} est chancelier, "
+            "et c'est LITTÉRALEMENT HITLER !",
+        )
+
+    def show_veto(self, table: Table, event: game.ChancellorVetoes):
+        self.send(
+            table,
+            f"{event.chancellor.name} demande un veto, "
+            f"{event.president.name} doit l'accepter ou le refuser.",
+        )
+
+    def show_enacted(self, table: Table, event: game.ChancellorEnacts):
+        self.send(
+            table,
+            f"{event.chancellor.name} adopte une loi {policy_name(event.policy)}.",
+        )
+
+    def show_chaos(self, table: Table, event: game.ChaosHappens):
+        self.send(
+            table,
+            "Trois échecs de suite, c'est le chaos ! La loi du dessus de la "
+            f"pioche est adoptée : {policy_name(event.policy)}.",
+        )
+
+    def show_investigation(self, table: Table, event: game.PresidentInvestigates):
+        president, investigated = event.president.name, event.investigated.name
+        self.send(table, f"{president} a enquêté sur {investigated}.")
+        if president in table.bots:
+            return
+        # Hitler is a fascist too, as far as investigations tell.
+        party = "libéral" if event.investigated.role is game.Role.liberal else "fascho"
+        self.send_private(president, f"{investigated} est un {party}.")
+
+    def show_kill(self, table: Table, event: game.PresidentKills):
+        self.send(table, f"{event.president.name} a exécuté {event.killed.name}.")
+
+    def show_winners(self, table: Table, event):
+        if isinstance(event, game.LiberalsWin):
+            self.send(table, "Les libéraux gagnent !")
+        else:
+            self.send(table, "Les fascistes gagnent !")
+
+    def show_stage(self, table: Table, event: game.StageChanges):
+        if event.stage is game.Stage.nominate_chancellor:
+            self.send(
+                table,
+                f"Le président ({table.game.president.name}) doit choisir un chancelier. Annonces votre choix avec !chancelor <joueur>",
+            )
+        elif event.stage is game.Stage.chancellor_election:
+            self.send(
+                table,
+                f"Approuvez-vous ce choix ? Votez avec /query {self.bot.nick} !oui / !non.",
+            )
+
     def send_private(self, target, message: str):
-        self.bot.privmsg(target, message)
+        self.sender.push(target, message, private=True)
 
-    def send(self, message: str):
-        self.send_private(CHANNEL, message)
+    def send(self, table: Table, message: str):
+        self.sender.push(table.channel, message)
 
-    @property
-    def users(self):
-        return self.bot.channels[CHANNEL]
+    def users(self, table: Table):
+        return self.bot.channels[table.channel]
 
-    def mode(self, *modes):
-        for encoded in encode_modes(CHANNEL, *modes):
-            print(encoded)
-            self.bot.mode(CHANNEL, *encoded)
+    def mode(self, table: Table, *modes):
+        self.modes.push(table.channel, *modes)
 
     @irc3.event(irc3.rfc.JOIN)
     def on_join(self, mask, channel, **kw):
         if mask.nick == self.bot.nick:
-            asyncio.create_task(self.ensure_setup())
+            table = self.registry.open(channel)
+            asyncio.create_task(self.ensure_setup(table))
+            return
+        table = self.registry.get(channel)
+        if table is None:
+            return
+        # Players coming back, maybe under another nick.
+        for nick, host in table.vacant.items():
+            if mask.nick != nick and mask.host != host:
+                continue
+            if nick in table.split:
+                self.rejoins.append((table, nick, mask.nick))
+                if "rejoins" not in self.timers:
+                    self.timers.schedule("rejoins", BURST_WINDOW, self.handle_rejoins)
+                return
+            if self.take_seat(table, nick, mask.nick):
+                return
 
     @irc3.event(irc3.rfc.PART)
     def on_part(self, mask, channel, **kw):
-        # TODO: handle parts better with eg. finding a replacement with timeout.
-        if self.game.stage == game.Stage.lobby:
+        if mask.nick == self.bot.nick:
+            table = self.registry.close(channel)
+            if table is not None:
+                self.timers.cancel((table, "deadline"))
+                self.timers.cancel((table, "bots"))
+                self.workers.cancel(table)
+                self.release_seats(table)
+                if table.opped is not None:
+                    table.opped.cancel()
+            return
+        table = self.registry.get(channel)
+        if table is None:
+            return
+        self.player_leaves(table, mask)
+
+    @irc3.event(irc3.rfc.MODE)
+    def on_mode(self, target, modes, data=None, **kw):
+        table = self.registry.get(target)
+        if table is None or table.opped is None or table.opped.done():
+            return
+        args = data.split() if data else []
+        for added, mode, nick in parse_modes(self.bot.server_config, modes, args):
+            if added and mode == "o" and nick == self.bot.nick:
+                table.opped.set_result(True)
+                return
+
+    @irc3.event(irc3.rfc.RPL_NAMREPLY)
+    def on_names(self, channel, data, **kw):
+        table = self.registry.get(channel)
+        if table is None or table.opped is None or table.opped.done():
+            return
+        modes = prefix_modes(self.bot.server_config)
+        symbols = "".join(modes)
+        for item in data.split():
+            nick = item.lstrip(symbols)
+            if nick != self.bot.nick:
+                continue
+            # Several symbols with multi-prefix, eg. "~@nick".
+            if any(modes[symbol] == "o" for symbol in item[: len(item) - len(nick)]):
+                table.opped.set_result(True)
             return
-        # Abort!
-        self.game.reset()
-        self.send("DAMIT l'autre con qui part en plein milieu")
-        self.send("La partie est finie déso.")
-        self.setup_lobby()
-        self.pause(3, self.unpause)
 
     @irc3.event(irc3.rfc.QUIT)
-    def on_quit(self, mask, **kw):
-        self.on_part(mask, CHANNEL)
+    def on_quit(self, mask, data=None, **kw):
+        self.quits.append((mask, data))
+        if "quits" not in self.timers:
+            self.timers.schedule("quits", BURST_WINDOW, self.handle_quits)
+
+    def handle_quits(self):
+        """Holds the seats of the players who quit, once per table and burst."""
+        quits, self.quits = self.quits, []
+        left: Dict[Table, List[str]] = {}
+        split: Dict[Table, List[str]] = {}
+        for mask, reason in quits:
+            table = self.registry.for_nick(mask.nick)
+            if table is None:
+                continue
+            if is_netsplit(reason):
+                if self.hold_seat(table, mask, NETSPLIT_GRACE):
+                    split.setdefault(table, []).append(mask.nick)
+            elif self.hold_seat(table, mask, REPLACEMENT_GRACE):
+                left.setdefault(table, []).append(mask.nick)
+        for table, nicks in left.items():
+            self.announce_departures(table, nicks)
+        for table, nicks in split.items():
+            self.freeze(table, nicks)
+
+    def player_leaves(self, table: Table, mask):
+        if self.hold_seat(table, mask, REPLACEMENT_GRACE):
+            self.announce_departures(table, [mask.nick])
+
+    def hold_seat(self, table: Table, mask, grace: float) -> bool:
+        """
+        Holds the seat of a player leaving a game for grace seconds, see
+        fill_seat(). False if they were not playing.
+        """
+        nick = mask.nick
+        if nick in table.waiters:
+            table.waiters.remove(nick)
+        state = table.game
+        if state.stage is game.Stage.lobby:
+            return False
+        if state.players_by_name.get(nick) not in state.alive_players:
+            return False
+        table.vacant[nick] = mask.host
+        self.registry.unbind(nick)
+        self.timers.schedule(
+            (table, "vacant", nick), grace, self.fill_seat, table, nick
+        )
+        return True
+
+    def announce_departures(self, table: Table, nicks: List[str]):
+        if len(nicks) == 1:
+            left = f"{nicks[0]} est parti, sa place est gardée"
+        else:
+            left = f"{', '.join(nicks)} sont partis, leurs places sont gardées"
+        self.send(
+            table,
+            f"{left} {REPLACEMENT_GRACE} secondes. "
+            f"Tapez !join pour prendre une place libre.",
+        )
+
+    def freeze(self, table: Table, nicks: List[str]):
+        """Stops the game until the players lost in a netsplit come back."""
+        table.split.update(nicks)
+        table.paused = True
+        self.timers.cancel((table, "pause"))
+        self.timers.cancel((table, "deadline"))
+        self.send(
+            table,
+            f"Netsplit ! La partie reprendra au retour de "
+            f"{', '.join(sorted(table.split))}.",
+        )
+
+    def thaw(self, table: Table):
+        table.paused = False
+        self.send(table, "Tout le monde est là, on reprend !")
+        self.schedule_deadline(table)
+        self.play_bots(table)
+
+    def handle_rejoins(self):
+        """Seats players back after a netsplit, once per table and burst."""
+        rejoins, self.rejoins = self.rejoins, []
+        back: Dict[Table, List[str]] = {}
+        for table, parting_nick, nick in rejoins:
+            if parting_nick in table.vacant and self.take_seat(
+                table, parting_nick, nick, announce=False
+            ):
+                back.setdefault(table, []).append(nick)
+        for table, nicks in back.items():
+            self.send(table, f"De retour : {', '.join(nicks)}.")
+            if not table.split:
+                self.thaw(table)
+
+    def take_seat(
+        self, table: Table, parting_nick: str, nick: str, announce: bool = True
+    ) -> bool:
+        """
+        Gives nick the seat held for parting_nick, who may be nick. Quiet
+        unless announce, handle_rejoins() tells for a whole burst.
+        """
+        if self.registry.for_nick(nick) not in (None, table):
+            return False
+        state = table.game
+        if nick == parting_nick:
+            if announce:
+                self.send(table, f"{nick} est de retour.")
+                self.tell_role(table, state.get_player(nick))
+        else:
+            try:
+                event = state.replace_player(
+                    state.get_player(parting_nick), game.Player(nick)
+                )
+            except game.Error:
+                return False
+            self.dispatcher.dispatch(table, event)
+            self.save(table)
+        self.timers.cancel((table, "vacant", parting_nick))
+        del table.vacant[parting_nick]
+        if nick in table.waiters:
+            table.waiters.remove(nick)
+        self.registry.bind(nick, table)
+        self.mode(table, ("+v", nick))
+        if parting_nick in table.split:
+            table.split.discard(parting_nick)
+            if not table.split and announce:
+                self.thaw(table)
+        return True
+
+    def fill_seat(self, table: Table, nick: str):
+        """Called when the seat held for nick is given up on."""
+        users = self.users(table)
+        while table.waiters:
+            waiter = table.waiters.pop(0)
+            if waiter in users and self.take_seat(table, nick, waiter):
+                return
+        self.abort_game(table, "DAMIT l'autre con qui part en plein milieu")
+
+    def release_seats(self, table: Table):
+        """Forgets seats held and waiters, eg. once the game is over."""
+        for nick in table.vacant:
+            self.timers.cancel((table, "vacant", nick))
+        table.vacant.clear()
+        table.waiters.clear()
+        table.split.clear()
+
+    def abort_game(self, table: Table, reason: str):
+        """Ends the game of table, telling the channel why."""
+        if table.game.stage == game.Stage.lobby:
+            return
+        # Abort!
+        table.game.reset()
+        table.bots.clear()
+        self.release_seats(table)
+        self.timers.cancel((table, "deadline"))
+        self.timers.cancel((table, "bots"))
+        self.workers.cancel(table)
+        self.registry.release(table)
+        if self.store is not None:
+            self.store.discard(table.channel)
+        self.send(table, reason)
+        self.send(table, "La partie est finie déso.")
+        self.setup_lobby(table)
+        self.pause(table, 3)
 
     @command
-    def join(self, mask, target, args):
+    @ignore_wrong_channel
+    def join(self, table: Table, mask, target, args):
         """Join the next game.
 
             %%join
         """
-        if self.paused:
+        if table.paused:
             return
         nick = mask.nick
+        if table.game.stage is not game.Stage.lobby:
+            self.wait_for_seat(table, nick)
+            return
+        try:
+            if self.registry.for_nick(nick) not in (None, table):
+                # Seated at another table.
+                raise game.InvalidAction()
+            table.game.add_player(table.game.get_player(nick))
+            self.registry.bind(nick, table)
+            self.mode(table, ("+v", nick))
+            self.send(table, f"{nick}: HEIL DAS IST GUT")
+        except game.Error:
+            self.send(table, f"{nick}: ASH DAS IST KEINE POßIBL")
+
+    def wait_for_seat(self, table: Table, nick: str):
+        if nick in table.vacant:
+            self.take_seat(table, nick, nick)
+        elif nick in table.waiters or self.registry.for_nick(nick) is not None:
+            self.send(table, f"{nick}: ASH DAS IST KEINE POßIBL")
+        else:
+            table.waiters.append(nick)
+            self.send(table, f"{nick}: tu prendras la prochaine place libre.")
+
+    @command
+    @ignore_wrong_channel
+    def addbot(self, table: Table, mask, target, args):
+        """Add a computer player to the next game.
+
+            %%addbot
+        """
+        if table.paused:
+            return
+        name = ai.bot_name(len(table.bots) + 1)
         try:
-            self.game.add_player(Player(nick))
-            self.mode(("+v", nick))
-            self.send(f"{nick}: HEIL DAS IST GUT")
+            table.game.add_player(game.Player(name))
+            table.bots.add(name)
+            self.send(table, f"{name} se joint à la partie.")
         except game.Error:
-            self.send(f"{nick}: ASH DAS IST KEINE POßIBL")
+            self.send(table, f"{mask.nick}: ASH DAS IST KEINE POßIBL")
 
     @command
-    def part(self, mask, target, args):
+    @ignore_wrong_channel
+    def part(self, table: Table, mask, target, args):
         """Flee from the next game.
 
             %%part
         """
-        if self.paused:
+        if table.paused:
             return
         nick = mask.nick
+        if nick in table.waiters:
+            table.waiters.remove(nick)
+            self.send(table, f"{nick}: NEIN :'(")
+            return
         try:
-            self.game.remove_player(Player(nick))
-            self.mode(("-v", nick))
-            self.send(f"{nick}: NEIN :'(")
+            table.game.remove_player(table.game.get_player(nick))
+            self.registry.unbind(nick)
+            self.mode(table, ("-v", nick))
+            self.send(table, f"{nick}: NEIN :'(")
         except game.Error:
-            self.send(f"{nick}: ASH DAS IST KEINE POßIBL")
+            self.send(table, f"{nick}: ASH DAS IST KEINE POßIBL")
 
     @command
-    def start(self, mask, target, args):
+    @ignore_wrong_channel
+    def start(self, table: Table, mask, target, args):
         """Start a game.
 
             %%start
         """
-        if self.paused:
+        if table.paused:
             return
         nick = mask.nick
         try:
-            events, stage = self.game.advance(game.Stage.lobby)
-            for event in events:
-                if isinstance(event, game.GameStarts):
-                    self.send("Et c'est parti pour une game de folie !")
-                if isinstance(event, game.PlayerRoleChanges):
-                    role = {
-                        game.Role.liberal: "un libéral",
-                        game.Role.fascist: "un fascho",
-                        game.Role.hitler: "un fascho, et surtou tu es LITTÉRALEMENT HITLER",
-                    }[event.player.role]
-                    self.send_private(event.player.name, f"FYI tu es {role}")
-                if isinstance(event, game.PresidentChanges):
-                    self.send(
-                        f"Le président a été choisi au hasard, c'est {event.new_president.name} !"
-                    )
-            if stage is game.Stage.nominate_chancellor:
-                self.send(
-                    f"Le président ({event.new_president.name}) doit choisir un chancelier. Annonces votre choix avec !chancelor <joueur>"
-                )
-            else:
-                raise game.Error("wtf")
+            self.advance(table, game.Stage.lobby)
         except game.Error as e:
-            self.send(f"{nick}: ENSHULDIGONG ES GIBT EIN PRÖBLEM: {type(e)} {e}")
+            self.send(
+                table, f"{nick}: ENSHULDIGONG ES GIBT EIN PRÖBLEM: {type(e)} {e}"
+            )
 
     @command
-    def chancellor(self, mask, target, args):
+    @ignore_wrong_channel
+    def chancellor(self, table: Table, mask, target, args):
         """Choose chancellor.
 
             %%chancellor <player>
         """
-        if self.paused:
+        if table.paused:
             return
         nick = mask.nick
         try:
-            self.game.nominate_chancellor(Player(args["<player>"]))
-            events, stage = self.game.advance()
-            for event in events:
-                if isinstance(event, game.PresidentNominates):
-                    self.send(
-                        f"Le choix du président se porte sur {event.candidate_chancellor.name} comme chancelier."
-                    )
-                else:
-                    raise game.Error("wat")
-            if stage is game.Stage.chancellor_election:
-                self.send(
-                    f"Approuvez-vous ce choix ? Votez avec /query {self.bot.nick} !oui / !non."
-                )
-            else:
-                raise game.Error("wtf")
+            table.game.nominate_chancellor(table.game.get_player(args["<player>"]))
+            self.advance(table)
         except game.Error as e:
-            self.send(f"{nick}: ENSHULDIGONG ES GIBT EIN PRÖBLEM: {type(e)} {e}")
+            self.send(
+                table, f"{nick}: ENSHULDIGONG ES GIBT EIN PRÖBLEM: {type(e)} {e}"
+            )
 
     @command
-    def yes(self, mask, target, args):
+    @ignore_wrong_channel
+    def yes(self, table: Table, mask, target, args):
         """Choose chancellor.
 
             %%yes
         """
-        if self.paused:
+        if table.paused:
             return
         nick = mask.nick
         try:
-            self.game.record_vote(Player(nick), True)
+            table.game.record_vote(table.game.get_player(nick), True)
             self.send_private(nick, "Je note ce OUI.")
+            self.close_election_if_decided(table)
         except game.Error as e:
-            self.send(f"{nick}: ENSHULDIGONG ES GIBT EIN PRÖBLEM: {type(e)} {e}")
+            self.send(
+                table, f"{nick}: ENSHULDIGONG ES GIBT EIN PRÖBLEM: {type(e)} {e}"
+            )
 
     @command
-    def no(self, mask, target, args):
+    @ignore_wrong_channel
+    def no(self, table: Table, mask, target, args):
         """Choose chancellor.
 
             %%no
         """
-        if self.paused:
+        if table.paused:
             return
         nick = mask.nick
         try:
-            self.game.record_vote(Player(nick), False)
+            table.game.record_vote(table.game.get_player(nick), False)
             self.send_private(nick, "Je note ce NOPE.")
+            self.close_election_if_decided(table)
         except game.Error as e:
-            self.send(f"{nick}: ENSHULDIGONG ES GIBT EIN PRÖBLEM: {type(e)} {e}")
+            self.send(
+                table, f"{nick}: ENSHULDIGONG ES GIBT EIN PRÖBLEM: {type(e)} {e}"
+            )
+
+    def close_election_if_decided(self, table: Table):
+        """Closes the election as soon as the remaining votes can't change it."""
+        if not table.game.is_election_decided:
+            return
+        self.advance(table, game.Stage.chancellor_election)
 
     @command
-    def x(self, mask, target, args):
+    @ignore_wrong_channel
+    def x(self, table: Table, mask, target, args):
         """Impersonate someone speaking in public.
 
             %%x <data>...
         """
         data = " ".join(args["<data>"])
-        self.send(repr(eval(data, {"self": self, "game": game, "g": self.game})))
+        self.send(
+            table,
+            repr(eval(data, {"self": self, "game": game, "g": table.game, "t": table})),
+        )
 
     @command
     def reloadpls(self, mask, target, args):
@@ -227,34 +903,42 @@ class SecretHitlerPlugin:
 
             %%reloadpls
         """
+        for module in RELOADED_MODULES:
+            importlib.reload(sys.modules[module])
         self.bot.reload(SELF_MODULE)
 
-    def setup_lobby(self):
-        self.mode("-m", *(("-v", m) for m in self.users.modes["+"]))
-        self.state = State.ready
-        self.send("MY BODY IS READY")
-
-    def unpause(self):
-        self.paused = False
-
-    def pause(self, delay: float, callback):
-        self.paused = True
-        asyncio.get_event_loop().call_later(delay, callback)
-
-    async def ensure_setup(self):
-        self.bot.privmsg(CHANNEL, "WAIT FOR IT…")
-        while True:
-            await asyncio.sleep(1)
-            if self.bot.nick in self.users.modes["@"]:
-                self.setup_lobby()
-                break
+    def setup_lobby(self, table: Table):
+        self.mode(table, "-m", *(("-v", m) for m in self.users(table).modes["+"]))
+        table.state = SetupState.ready
+        self.send(table, "MY BODY IS READY")
+
+    def pause(self, table: Table, delay: float):
+        table.paused = True
+        self.timers.schedule((table, "pause"), delay, table.unpause)
+
+    async def ensure_setup(self, table: Table):
+        """Sets the lobby up as soon as the bot is opped (see on_mode, on_names)."""
+        self.send(table, "WAIT FOR IT…")
+        table.opped = self.bot.loop.create_future()
+        if self.bot.nick in self.users(table).modes["@"]:
+            table.opped.set_result(True)
+        try:
+            await asyncio.wait_for(asyncio.shield(table.opped), OP_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.send(table, "Il me faut les ops pour lancer des parties.")
+            await table.opped
+        if table.state is SetupState.restored:
+            table.state = SetupState.ready
+            self.send(table, "On reprend où on en était !")
+        else:
+            self.setup_lobby(table)
 
 
 def main():
     password = os.getenv("BOTPSWD")
     config = dict(
         nick="hitlair",
-        autojoins=[CHANNEL],
+        autojoins=CHANNELS,
         host="chat.freenode.net",
         port=6697,
         ssl=True,
@@ -1,62 +1,178 @@
-def encode_modes(target, *modes):
-    def key(i):
-        if isinstance(i, str):
-            name = i
-            val = ""
-        else:
-            name, val = i
-
-        return not bool(val), name, val
-
-    m = tuple(sorted(modes, key=key))
-    if not m:
-        return ""
-
-    j = 0
-    while j < len(m):
-        cur_sign = None
-        modenames = ""
-        modevals = []
+import asyncio
+import functools
+import re
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+from hitlair.send_queue import LINE_LIMIT, PREFIX_RESERVE
+
+# Modes per line when the server does not advertise MODES (RFC 2812).
+DEFAULT_MAX_MODES = 3
+
+Mode = Union[str, Tuple[str, str]]
+
+
+def mode_limits(server_config: Mapping) -> Tuple[Optional[int], int]:
+    """
+    Modes per MODE line (None for no limit) and line length, from the server
+    ISUPPORT tokens MODES and LINELEN.
+    """
+    modes = server_config.get("MODES", DEFAULT_MAX_MODES)
+    max_modes = None if modes is True else int(modes)
+    return max_modes, int(server_config.get("LINELEN", LINE_LIMIT))
+
+
+def _mode_key(mode: Mode):
+    name, val = (mode, "") if isinstance(mode, str) else mode
+    return not val, name, val
 
-        i = 0
-        while (
-            len(target + modenames + " ".join(modevals)) < 450 and i < 4 and j < len(m)
-        ):
-            _, name, val = key(m[j])
-            if cur_sign != name[0]:
-                cur_sign = name[0]
-                modenames += name[0]
-            modenames += name[1:]
-            if val:
-                modevals += [val]
-            i += 1
-            j += 1
 
+def encode_modes(
+    target: str,
+    *modes: Mode,
+    max_modes: Optional[int] = DEFAULT_MAX_MODES,
+    line_limit: int = LINE_LIMIT,
+) -> Iterator[List[str]]:
+    """
+    Packs modes, eg. "-m" or ("+v", nick), into as few MODE lines as the
+    limits allow. Yields the arguments of each line.
+    """
+    budget = line_limit - PREFIX_RESERVE - len(f"MODE {target}  \r\n")
+    modenames = ""
+    modevals: List[str] = []
+    count = size = 0
+    sign = None
+
+    for _, name, val in sorted(map(_mode_key, modes)):
+        cost = len(name) - (name[0] == sign) + (len(val) + 1 if val else 0)
+        if count and (count == max_modes or size + cost > budget):
+            yield [modenames] + modevals
+            modenames, modevals, count, size, sign = "", [], 0, 0, None
+            cost = len(name) + (len(val) + 1 if val else 0)
+        if name[0] != sign:
+            sign = name[0]
+            modenames += sign
+        modenames += name[1:]
+        if val:
+            modevals.append(val)
+        count += 1
+        size += cost
+
+    if count:
         yield [modenames] + modevals
 
 
+class ModeBatcher:
+    """
+    Collects the modes set on every channel during one event loop iteration
+    and sends them at its end, packed per channel. Setting the same mode
+    twice in a tick only sends the last one.
+    """
+
+    pending: Dict[str, Dict[Tuple[str, str], Mode]]
+
+    def __init__(
+        self,
+        send: Callable[..., None],
+        loop: asyncio.AbstractEventLoop,
+        server_config: Callable[[], Mapping],
+    ):
+        self.send = send
+        self.loop = loop
+        # ISUPPORT arrives after connection, so it is read at each flush.
+        self.server_config = server_config
+        self.pending = {}
+        self.handle: Optional[asyncio.Handle] = None
+
+    def push(self, target: str, *modes: Mode):
+        pending = self.pending.setdefault(target, {})
+        for mode in modes:
+            _, name, val = _mode_key(mode)
+            for letter in name[1:]:
+                single = name[0] + letter
+                pending[letter, val] = (single, val) if val else single
+        if self.handle is None:
+            self.handle = self.loop.call_soon(self.flush)
+
+    def flush(self):
+        self.handle = None
+        max_modes, line_limit = mode_limits(self.server_config())
+        pending, self.pending = self.pending, {}
+        for target, modes in pending.items():
+            for encoded in encode_modes(
+                target, *modes.values(), max_modes=max_modes, line_limit=line_limit
+            ):
+                self.send(target, *encoded)
+
+
+class ModeParser:
+    """
+    Parses MODE changes for one server configuration.
+
+    CHANMODES lists the modes always taking a parameter (list modes, then
+    setting modes), those taking one only when set, and those never taking
+    one. Modes in PREFIX (eg. o and v) always take a nick.
+    """
+
+    def __init__(self, chanmodes: str, prefix: str = ""):
+        list_modes, param_modes, param_set_modes, *_ = chanmodes.split(",")
+        prefix_modes = prefix[1 : prefix.find(")")] if prefix.startswith("(") else ""
+        always = frozenset(list_modes + param_modes + prefix_modes)
+        # Modes taking a parameter, by sign.
+        self.param_modes = {"+": always | frozenset(param_set_modes), "-": always}
+
+    def parse(
+        self, modestr: str, targets: List[str]
+    ) -> List[Tuple[bool, str, Optional[str]]]:
+        out = []
+        i = 0
+        sign = None
+        param_modes: frozenset = frozenset()
+        for char in modestr:
+            if char in "+-":
+                sign = char
+                param_modes = self.param_modes[char]
+            elif sign is None:
+                raise ValueError("Modes have to begin with + or -")
+            elif char in param_modes:
+                out.append((sign == "+", char, targets[i]))
+                i += 1
+            else:
+                out.append((sign == "+", char, None))
+        return out
+
+
+@functools.lru_cache(maxsize=8)
+def _parser(chanmodes: str, prefix: str) -> ModeParser:
+    return ModeParser(chanmodes, prefix)
+
+
+def mode_parser(server_config: Mapping) -> ModeParser:
+    """The parser for server_config, built once per distinct ISUPPORT."""
+    return _parser(server_config["CHANMODES"], server_config.get("PREFIX", ""))
+
+
 def parse_modes(server_config, modestr, targets):
-    last = None
-    i = 0
-    out = []
-
-    param_modes, list_modes, param_set_modes, *_ = server_config["CHANMODES"].split(",")
-
-    for char in modestr:
-        if char in "+-":
-            last = char
-            continue
-
-        if last is None:
-            raise ValueError("Modes have to begin with + or -")
-
-        param_modes = param_modes | list_modes
-        if last == "+":
-            param_modes |= param_set_modes
-
-        if char in param_modes:
-            out.append((last == "+", char, targets[i]))
-            i += 1
-        else:
-            out.append((last == "+", char, None))
-    return out
+    return mode_parser(server_config).parse(modestr, targets)
+
+
+def prefix_modes(server_config: Mapping) -> Dict[str, str]:
+    """
+    Modes by the symbol prefixing nicks that have them in NAMES replies (eg.
+    "@" for "o"), from PREFIX.
+    """
+    prefix = server_config.get("PREFIX", "")
+    if not prefix.startswith("("):
+        return {}
+    modes, symbols = prefix[1:].split(")", 1)
+    return dict(zip(symbols, modes))
+
+
+# QUIT reason of users lost in a netsplit: the two servers that split, eg.
+# "hub.example.net leaf.example.net", or "*.net *.split" on networks hiding
+# their servers. Servers prefix the reasons users give (eg. "Quit: "), so
+# these can't be faked.
+NETSPLIT_REASON = re.compile(r"^[\w*-]+(\.[\w*-]+)+ [\w*-]+(\.[\w*-]+)+$")
+
+
+def is_netsplit(reason: Optional[str]) -> bool:
+    return reason is not None and NETSPLIT_REASON.match(reason) is not None
@@ -0,0 +1,229 @@
+"""
+Compact, append-only binary log of the events of a game.
+
+Each event is one byte identifying its type followed by one byte per field;
+decks take one byte per policy. Player names are written once, the first
+time a player appears, and referred to by index afterwards. A whole game
+usually fits in a few hundred bytes.
+
+The journal only records what State.replay() needs to rebuild a game,
+including the outcome of every shuffle, so replaying never draws from a
+random generator.
+"""
+
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from hitlair import game
+
+# Byte introducing a player name definition instead of an event.
+_NAME = 0xFF
+# Longest name, in UTF-8 bytes: its size is written in one byte.
+MAX_NAME_SIZE = 0xFF
+# Field kinds.
+_PLAYER, _ENUM, _INT, _POLICIES = range(4)
+
+
+def _event_types():
+    from hitlair import game
+
+    # Codes are positions in this list: only ever append to it.
+    return (
+        game.GameStarts,
+        game.PlayerJoins,
+        game.PlayerParts,
+        game.PlayerQuits,
+        game.PlayerRoleChanges,
+        game.PlayerReplaces,
+        game.PresidentChanges,
+        game.PresidentNominates,
+        game.NominateVoteSucceeds,
+        game.NominateVoteFails,
+        game.ElectrionTrackerProgresses,
+        game.ChaosHappens,
+        game.PresidentLegislates,
+        game.ChancellorEnacts,
+        game.ChancellorVetoes,
+        game.PresidentAcceptsVeto,
+        game.PresidentDeniesVeto,
+        game.PresidentPeeks,
+        game.PresidentInvestigates,
+        game.PresidentKills,
+        game.PresidentShallPeek,
+        game.PresidentShallInvestigate,
+        game.PresidentShallKill,
+        game.PresidentShallSpeciallyElect,
+        game.HitlerIsElectedChancellor,
+        game.HitlerIsKilled,
+        game.LiberalsWin,
+        game.FascistsWin,
+        game.StageChanges,
+        game.PolicyDeckShuffles,
+        game.PresidentDiscards,
+    )
+
+
+def _field_kind(annotation):
+    from hitlair import game
+
+    if annotation in (game.Player, Optional[game.Player]):
+        return _PLAYER, None
+    if annotation is int:
+        return _INT, None
+    if annotation == Tuple[game.Policy, ...]:
+        return _POLICIES, None
+    return _ENUM, {member.value: member for member in annotation}
+
+
+_codecs = None
+
+
+def _get_codecs():
+    """Built on first use, as hitlair.game imports this module."""
+    global _codecs
+    if _codecs is None:
+        by_type = {}
+        by_code = []
+        for code, event_type in enumerate(_event_types()):
+            fields = tuple(
+                _field_kind(annotation)
+                for annotation in event_type.__annotations__.values()
+            )
+            by_type[event_type] = (code, fields)
+            by_code.append((event_type, fields))
+        _codecs = by_type, by_code
+    return _codecs
+
+
+class Journal:
+    _data: bytearray
+    _names: Dict[str, int]
+    _count: int
+
+    def __init__(self):
+        self._data = bytearray()
+        self._names = {}
+        self._count = 0
+
+    def __len__(self):
+        """Number of events."""
+        return self._count
+
+    def __iter__(self) -> Iterator["game.Event"]:
+        return self._decode(self._data, [])
+
+    @property
+    def size(self) -> int:
+        """Size in bytes."""
+        return len(self._data)
+
+    def to_bytes(self, start: int = 0) -> bytes:
+        """Encoded events, from the byte offset start."""
+        return bytes(self._data[start:])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Journal":
+        journal = cls()
+        journal._data = bytearray(data)
+        names = []
+        journal._count = sum(1 for _ in cls._decode(journal._data, names))
+        journal._names = {name: index for index, name in enumerate(names)}
+        return journal
+
+    def extend(self, events: Iterable["game.Event"]):
+        for event in events:
+            self.append(event)
+
+    def append(self, event: "game.Event"):
+        """
+        Encodes event. Values that don't fit in their byte (eg. a count over
+        255) raise ValueError, leaving the journal as it was.
+        """
+        by_type, _ = _get_codecs()
+        code, fields = by_type[type(event)]
+        data = self._data
+        size = len(data)
+        names = self._names
+        name_count = len(names)
+        try:
+            self._encode(event, code, fields)
+        except ValueError:
+            del data[size:]
+            for name in list(names)[name_count:]:
+                del names[name]
+            raise
+        self._count += 1
+
+    def _encode(self, event: "game.Event", code: int, fields):
+        data = self._data
+        for (kind, _), value in zip(fields, event):
+            if kind is _PLAYER and value is not None and value.name not in self._names:
+                encoded = value.name.encode()
+                data.append(_NAME)
+                data.append(len(encoded))
+                data.extend(encoded)
+                self._names[value.name] = len(self._names)
+
+        data.append(code)
+        for (kind, _), value in zip(fields, event):
+            if kind is _PLAYER:
+                if value is None:
+                    data.append(0)
+                    data.append(0)
+                else:
+                    data.append(self._names[value.name] + 1)
+                    data.append(value.role.value if value.role else 0)
+            elif kind is _ENUM:
+                data.append(value.value)
+            elif kind is _INT:
+                data.append(value)
+            else:
+                data.append(len(value))
+                data.extend(policy.value for policy in value)
+
+    @staticmethod
+    def _decode(data: bytearray, names: List[str]) -> Iterator["game.Event"]:
+        from hitlair import game
+
+        _, by_code = _get_codecs()
+        roles = {role.value: role for role in game.Role}
+        players: List["game.Player"] = []
+        policies = {policy.value: policy for policy in game.Policy}
+        i = 0
+        while i < len(data):
+            code = data[i]
+            i += 1
+            if code == _NAME:
+                length = data[i]
+                name = data[i + 1 : i + 1 + length].decode()
+                names.append(name)
+                players.append(game.Player(name))
+                i += 1 + length
+                continue
+
+            event_type, fields = by_code[code]
+            values = []
+            for kind, members in fields:
+                if kind is _PLAYER:
+                    index, role = data[i], data[i + 1]
+                    i += 2
+                    if not index:
+                        values.append(None)
+                        continue
+                    player = players[index - 1]
+                    if role:
+                        player.role = roles[role]
+                    values.append(player)
+                elif kind is _ENUM:
+                    values.append(members[data[i]])
+                    i += 1
+                elif kind is _INT:
+                    values.append(data[i])
+                    i += 1
+                else:
+                    length = data[i]
+                    values.append(
+                        tuple(policies[value] for value in data[i + 1 : i + 1 + length])
+                    )
+                    i += 1 + length
+            yield event_type(*values)
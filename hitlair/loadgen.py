@@ -0,0 +1,321 @@
+"""
+Load generator for the IRC plugin, without a network.
+
+Scripted players play games on concurrent channels against SecretHitlerPlugin
+running in process: their commands are dispatched to the bot as if read from
+the server, and the lines the bot sends are captured instead of written to a
+socket. Reports the latency from each command to the first line sent in
+reply. Run as a module, optionally profiling the games with cProfile:
+
+    python -m hitlair.loadgen --games 200 --channels 50 --profile load.prof
+"""
+
+import argparse
+import asyncio
+import collections
+import cProfile
+import functools
+import math
+import pstats
+import random
+import time
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import irc3
+
+from hitlair import game, sim
+from hitlair.registry import SetupState, Table
+
+NICK = "hitlair"
+SERVER = "irc.example.org"
+HOST = "load.example.org"
+PLUGIN = "hitlair.irc.SecretHitlerPlugin"
+# Seconds to wait for a reply before giving the game up.
+REPLY_TIMEOUT = 5
+# Send rate, in lines per second, standing for no flood control at all.
+UNTHROTTLED = 1e9
+
+
+class LoadBot(irc3.IrcBot):
+    """A bot whose connection is a stand-in: lines sent go to on_line."""
+
+    def __init__(self, on_line: Callable[[str], None], **config):
+        super().__init__(**config)
+        self.on_line = on_line
+
+    def send(self, data: str):
+        self.on_line(data)
+
+
+class Report(NamedTuple):
+    # Seconds from each command to the first line sent in reply, by command.
+    latencies: Dict[str, List[float]]
+    games: int
+    # Games that ended, others stalled or timed out.
+    finished: int
+    timeouts: int
+    elapsed: float
+
+    @property
+    def commands_per_second(self) -> float:
+        count = sum(map(len, self.latencies.values()))
+        return count / self.elapsed if self.elapsed else 0.0
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """The q-th percentile of values, by nearest rank."""
+    ordered = sorted(values)
+    rank = math.ceil(q / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+class LoadGenerator:
+    """
+    Plays games against a bot, each on its own channel. Players decide with
+    strategy; stages nobody can act in on IRC yet are left to their deadline.
+    """
+
+    # Per channel: command (None when not measured), time it was sent, and
+    # future of the reply.
+    replies: Dict[str, tuple]
+    # Players' nick to channel, to match replies sent in query.
+    channel_of: Dict[str, str]
+    latencies: Dict[str, List[float]]
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        player_count: int,
+        strategy: sim.Strategy,
+        rate: Optional[float] = None,
+    ):
+        self.loop = loop
+        self.player_count = player_count
+        self.strategy = strategy
+        self.bot = LoadBot(
+            self.on_line,
+            loop=loop,
+            nick=NICK,
+            asynchronous=False,
+            includes=[
+                "irc3.plugins.core",
+                "irc3.plugins.userlist",
+                "irc3.plugins.command",
+                PLUGIN.rsplit(".", 1)[0],
+            ],
+        )
+        sender = self.plugin.sender
+        if rate is None:
+            sender.rate = sender.burst = sender.tokens = UNTHROTTLED
+        else:
+            sender.rate = rate
+        self.replies = {}
+        self.channel_of = {}
+        self.latencies = collections.defaultdict(list)
+        self.finished = 0
+        self.timeouts = 0
+
+    @property
+    def plugin(self):
+        # A new instance after each reloadpls.
+        return self.bot.get_plugin(PLUGIN)
+
+    def on_line(self, line: str):
+        now = time.perf_counter()
+        kind, target, _ = line.split(" ", 2)
+        if kind != "PRIVMSG":
+            return
+        channel = self.channel_of.get(target, target)
+        waiting = self.replies.pop(channel, None)
+        if waiting is None:
+            return
+        command, sent_at, reply = waiting
+        if command is not None:
+            self.latencies[command].append(now - sent_at)
+        if not reply.done():
+            reply.set_result(line)
+
+    async def act(
+        self, channel: str, command: Optional[str], action: Callable[[], None]
+    ) -> bool:
+        """Calls action, then waits for the bot to reply. False on timeout."""
+        reply = self.loop.create_future()
+        self.replies[channel] = (command, time.perf_counter(), reply)
+        action()
+        try:
+            await asyncio.wait_for(reply, REPLY_TIMEOUT)
+            return True
+        except asyncio.TimeoutError:
+            self.replies.pop(channel, None)
+            self.timeouts += 1
+            return False
+
+    async def say(
+        self, channel: str, nick: str, text: str, query: bool = False
+    ) -> bool:
+        target = NICK if query else channel
+        line = f":{nick}!{nick}@{HOST} PRIVMSG {target} :{text}"
+        command = text.split()[0].lstrip("!")
+        return await self.act(
+            channel, command, functools.partial(self.bot.dispatch, line)
+        )
+
+    async def open_table(self, channel: str, nicks: List[str]) -> Optional[Table]:
+        """Has the bot join channel as an op. Returns the table once set up."""
+
+        def join():
+            self.bot.dispatch(f":{NICK}!{NICK}@{HOST} JOIN {channel}")
+            names = " ".join(nicks)
+            self.bot.dispatch(f":{SERVER} 353 {NICK} = {channel} :@{NICK} {names}")
+
+        if not await self.act(channel, None, join):
+            return None
+        table = self.plugin.registry.get(channel)
+        while table.state is not SetupState.ready:
+            if not await self.act(channel, None, lambda: None):
+                return None
+        return table
+
+    async def step(self, table: Table) -> bool:
+        """Makes the next decision the game waits for."""
+        state = table.game
+        channel = table.channel
+        if state.stage is game.Stage.nominate_chancellor:
+            president = state.president
+            banned = (president, state.former_president, state.former_chancellor)
+            candidates = [p for p in state.players if p not in banned]
+            if not candidates:
+                # Stalled, as in sim.decide().
+                return False
+            chancellor = self.strategy.nominate(state, president, candidates)
+            return await self.say(
+                channel, president.name, f"!chancellor {chancellor.name}"
+            )
+        if state.stage is game.Stage.chancellor_election:
+            voter = next(p for p in state.players if p not in state.votes)
+            vote = "!yes" if self.strategy.vote(state, voter) else "!no"
+            return await self.say(channel, voter.name, vote, query=True)
+        # There are no commands for the other stages yet.
+        deadline = functools.partial(self.plugin.stage_deadline, table)
+        return await self.act(channel, "deadline", deadline)
+
+    async def play_game(self, number: int) -> bool:
+        """Plays a game on a channel of its own. False if it did not end."""
+        channel = f"#load{number}"
+        nicks = [f"g{number}p{i}" for i in range(self.player_count)]
+        for nick in nicks:
+            self.channel_of[nick] = channel
+        try:
+            table = await self.open_table(channel, nicks)
+            if table is None:
+                return False
+            for nick in nicks:
+                if not await self.say(channel, nick, "!join"):
+                    return False
+            if not await self.say(channel, nicks[0], "!start"):
+                return False
+            state = table.game
+            if state.stage is game.Stage.lobby:
+                return False
+            while state.stage is not game.Stage.lobby:
+                if not await self.step(table):
+                    return False
+            return True
+        finally:
+            self.bot.dispatch(f":{NICK}!{NICK}@{HOST} PART {channel}")
+            for nick in nicks:
+                del self.channel_of[nick]
+
+    async def play(self, numbers: Iterator[int]):
+        for number in numbers:
+            if await self.play_game(number):
+                self.finished += 1
+
+
+async def _run(
+    games: int,
+    channels: int,
+    player_count: int,
+    strategy: sim.Strategy,
+    rate: Optional[float],
+    profiler: Optional[cProfile.Profile],
+) -> Report:
+    generator = LoadGenerator(asyncio.get_running_loop(), player_count, strategy, rate)
+    # Shared by the channels: each plays the next game until there are none.
+    numbers = iter(range(games))
+    if profiler is not None:
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(generator.play(numbers) for _ in range(channels)))
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+        generator.plugin.workers.shutdown()
+    return Report(
+        dict(generator.latencies),
+        games,
+        generator.finished,
+        generator.timeouts,
+        elapsed,
+    )
+
+
+def run(
+    games: int,
+    channels: int,
+    player_count: int,
+    rng: Optional[random.Random] = None,
+    rate: Optional[float] = None,
+    profiler: Optional[cProfile.Profile] = None,
+) -> Report:
+    """
+    Plays games, at most channels of them at once. The bot may send rate
+    lines per second, or as many as it wants if None. Only the games are
+    profiled, not the setup of the bot.
+    """
+    strategy = sim.RandomStrategy(rng)
+    return asyncio.run(_run(games, channels, player_count, strategy, rate, profiler))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument(
+        "--players",
+        type=int,
+        default=7,
+        choices=sorted(game.PLAYER_COUNT_TO_LIBERAL_COUNT),
+    )
+    parser.add_argument("--rate", type=float, help="lines per second, unlimited")
+    parser.add_argument("--profile", metavar="PATH", help="cProfile stats output")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.profile else None
+    report = run(
+        args.games,
+        args.channels,
+        args.players,
+        random.Random(args.seed),
+        args.rate,
+        profiler,
+    )
+    print(f"{'command':<12}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}")
+    for command, latencies in sorted(report.latencies.items()):
+        p50 = percentile(latencies, 50) * 1000
+        p99 = percentile(latencies, 99) * 1000
+        print(f"{command:<12}{len(latencies):>8}{p50:>10.3f}{p99:>10.3f}")
+    print(
+        f"{report.finished}/{report.games} games, {report.timeouts} timeouts, "
+        f"{report.commands_per_second:.0f} commands/s ({report.elapsed:.2f}s)"
+    )
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    main()
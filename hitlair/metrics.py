@@ -0,0 +1,277 @@
+"""
+Counters, gauges and histograms, exported in the Prometheus text format.
+
+Recording is a dict lookup and an addition, and nothing is formatted until
+the metrics are exported, so instrumentation can stay on in production.
+Gauges whose value already lives elsewhere (eg. the depth of a queue) are
+read through a callback, only when exported.
+
+Metrics are exported from a local HTTP endpoint, see serve(), or written to
+a file, see dump().
+"""
+
+import asyncio
+import bisect
+import functools
+import os
+import time
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+Labels = Tuple[str, ...]
+# Seconds, from a fast command handler to a slow search.
+DEFAULT_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type: str
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """(name suffix, formatted labels, value) of each sample."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    values: Dict[Labels, float]
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.values = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        values = self.values
+        values[labels] = values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield "", _format_labels(self.label_names, labels), value
+
+
+Collect = Callable[[], Union[float, Mapping[Labels, float]]]
+
+
+class Gauge(_Metric):
+    """
+    A value set with set(), or read from collect() when exported: a number,
+    or numbers by labels.
+    """
+
+    type = "gauge"
+
+    values: Dict[Labels, float]
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Collect] = None,
+    ):
+        super().__init__(name, help, labels)
+        self.values = {}
+        self.collect = collect
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+    def samples(self):
+        values = self.values
+        if self.collect is not None:
+            collected = self.collect()
+            values = collected if isinstance(collected, Mapping) else {(): collected}
+        for labels, value in sorted(values.items()):
+            yield "", _format_labels(self.label_names, labels), value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    # Per labels: count of observations in each bucket (not cumulative, the
+    # last one past the highest bound), and their sum.
+    counts: Dict[Labels, List[int]]
+    sums: Dict[Labels, float]
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.counts = {}
+        self.sums = {}
+
+    def observe(self, value: float, *labels: str):
+        counts = self.counts.get(labels)
+        if counts is None:
+            counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+            self.sums[labels] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    def timed(self, f: Callable, *labels: str) -> Callable:
+        """Wraps f, observing how long each call takes."""
+
+        @functools.wraps(f)
+        def wrapped(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self.observe(time.perf_counter() - start, *labels)
+
+        return wrapped
+
+    def samples(self):
+        names = self.label_names + ("le",)
+        for labels, counts in sorted(self.counts.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                total += count
+                le = _format_value(bound)
+                yield "_bucket", _format_labels(names, labels + (le,)), total
+            formatted = _format_labels(self.label_names, labels)
+            yield "_sum", formatted, self.sums[labels]
+            yield "_count", formatted, total
+
+
+class Metrics:
+    """The metrics of a process, by name."""
+
+    metrics: Dict[str, _Metric]
+
+    def __init__(self, namespace: str = ""):
+        self.namespace = namespace
+        self.metrics = {}
+
+    def _add(self, metric: _Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def _name(self, name: str) -> str:
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self._name(name), help, labels))
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Collect] = None,
+    ) -> Gauge:
+        return self._add(Gauge(self._name(name), help, labels, collect))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(self._name(name), help, labels, buckets))
+
+    def render(self) -> str:
+        """Every metric, in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        lines.append("")
+        return "\n".join(lines)
+
+
+def dump(metrics: Metrics, path: str):
+    """Writes metrics to path, atomically for readers of the file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(metrics.render())
+    os.replace(tmp_path, path)
+
+
+async def serve(
+    metrics: Metrics, port: int, host: str = "127.0.0.1"
+) -> asyncio.AbstractServer:
+    """Serves metrics over HTTP on host:port, at /metrics."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            # Headers are not needed.
+            while (await reader.readline()).strip():
+                pass
+            parts = request.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1] == b"/metrics":
+                status = "200 OK"
+                body = metrics.render().encode()
+            else:
+                status = "404 Not Found"
+                body = b""
+            writer.write(
+                f"HTTP/1.0 {status}\r\n"
+                f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,179 @@
+"""
+Crash-safe storage of live games.
+
+Games are stored as their journal (see hitlair.journal) in a memory-mapped
+file of fixed-size records, one per channel. Saving after a transition only
+copies the journal bytes written since the last save into the map, so it
+never blocks on disk; the map is flushed to disk from an executor. Loading
+replays every stored journal; records that can't be replayed are dropped.
+"""
+
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Optional, Tuple
+
+from hitlair import game
+from hitlair.journal import Journal
+
+RECORD_SIZE = 4096
+MAGIC = b"HLG1"
+# Magic, channel name length, journal length, channel name.
+HEADER = struct.Struct("<4sBxH64s")
+JOURNAL_CAPACITY = RECORD_SIZE - HEADER.size
+MAX_CHANNEL_LENGTH = 64
+INITIAL_RECORDS = 16
+FLUSH_DELAY = 0.5
+
+log = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+    path: str
+    # Slot and (journal, persisted length) of each stored channel.
+    slots: Dict[str, int]
+    written: Dict[str, Tuple[Journal, int]]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.slots = {}
+        self.written = {}
+        self._flush_handle: Optional[asyncio.Handle] = None
+        # Flushes run in an executor, the map must not be swapped meanwhile.
+        self._map_lock = threading.Lock()
+
+        self.file = open(path, "a+b")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < INITIAL_RECORDS * RECORD_SIZE or size % RECORD_SIZE:
+            size = max(INITIAL_RECORDS, -(-size // RECORD_SIZE)) * RECORD_SIZE
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+
+        self.free_slots = []
+        for slot in reversed(range(self.record_count)):
+            channel = self._read_channel(slot)
+            if channel is None:
+                self.free_slots.append(slot)
+            else:
+                self.slots[channel] = slot
+
+    @property
+    def record_count(self) -> int:
+        return len(self.map) // RECORD_SIZE
+
+    def close(self):
+        with self._map_lock:
+            self.map.flush()
+            self.map.close()
+            self.file.close()
+
+    def _read_channel(self, slot: int) -> Optional[str]:
+        magic, name_length, _, name = HEADER.unpack_from(self.map, slot * RECORD_SIZE)
+        if magic != MAGIC:
+            return None
+        try:
+            return name[:name_length].decode()
+        except UnicodeDecodeError:
+            log.error("Dropping record %d: invalid channel name", slot)
+            return None
+
+    def load(self) -> Dict[str, game.State]:
+        """Replays every stored game, keyed by channel."""
+        states = {}
+        for channel, slot in list(self.slots.items()):
+            offset = slot * RECORD_SIZE
+            _, _, length, _ = HEADER.unpack_from(self.map, offset)
+            start = offset + HEADER.size
+            try:
+                if length > JOURNAL_CAPACITY:
+                    raise ValueError(f"journal length {length}")
+                journal = Journal.from_bytes(self.map[start : start + length])
+                state = game.State.replay(journal)
+            except Exception:
+                # Whatever garbage the record holds, the other games are kept.
+                log.exception("Dropping the corrupt record of %s", channel)
+                self.discard(channel)
+                continue
+            states[channel] = state
+            self.written[channel] = (state.journal, length)
+        return states
+
+    def save(self, channel: str, state: game.State) -> bool:
+        """
+        Stores the new events of state. Returns False if the game does not fit
+        in a record anymore, in which case it is no longer stored.
+        """
+        if state.stage is game.Stage.lobby:
+            # Nothing worth recovering.
+            self.discard(channel)
+            return True
+
+        encoded = channel.encode()
+        journal = state.journal
+        size = journal.size
+        if size > JOURNAL_CAPACITY or len(encoded) > MAX_CHANNEL_LENGTH:
+            self.discard(channel)
+            return False
+
+        slot = self.slots.get(channel)
+        if slot is None:
+            slot = self.slots[channel] = self._allocate()
+        offset = slot * RECORD_SIZE
+
+        written_journal, written = self.written.get(channel, (None, 0))
+        if written_journal is not journal:
+            # New game in this channel: rewrite the whole record, invalid
+            # until its header is, so that a crash meanwhile loses the game
+            # rather than mixing it with the previous one.
+            written = 0
+            self._invalidate(slot)
+        start = offset + HEADER.size
+        self.map[start + written : start + size] = journal.to_bytes(written)
+
+        HEADER.pack_into(self.map, offset, MAGIC, len(encoded), size, encoded)
+        self.written[channel] = (journal, size)
+        return True
+
+    def discard(self, channel: str):
+        slot = self.slots.pop(channel, None)
+        self.written.pop(channel, None)
+        if slot is not None:
+            self._invalidate(slot)
+            self.free_slots.append(slot)
+
+    def _invalidate(self, slot: int):
+        offset = slot * RECORD_SIZE
+        self.map[offset : offset + len(MAGIC)] = bytes(len(MAGIC))
+
+    def flush(self):
+        with self._map_lock:
+            if not self.map.closed:
+                self.map.flush()
+
+    def schedule_flush(self, loop: asyncio.AbstractEventLoop):
+        """Flushes to disk soon, off the event loop."""
+        if self._flush_handle is not None:
+            return
+
+        def flush():
+            self._flush_handle = None
+            loop.run_in_executor(None, self.flush)
+
+        self._flush_handle = loop.call_later(FLUSH_DELAY, flush)
+
+    def _allocate(self) -> int:
+        if not self.free_slots:
+            self._grow()
+        return self.free_slots.pop()
+
+    def _grow(self):
+        count = self.record_count
+        with self._map_lock:
+            self.map.flush()
+            self.map.close()
+            self.file.truncate(2 * count * RECORD_SIZE)
+            self.map = mmap.mmap(self.file.fileno(), 2 * count * RECORD_SIZE)
+        self.free_slots = list(reversed(range(count, 2 * count))) + self.free_slots
@@ -0,0 +1,154 @@
+import asyncio
+import enum
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from hitlair import game
+
+
+class SetupState(enum.Enum):
+    pending_setup = enum.auto()
+    # Game restored from before a restart: the channel was set up for it,
+    # the lobby must not be.
+    restored = enum.auto()
+    ready = enum.auto()
+
+
+def channel_key(channel: str) -> str:
+    # IRC channel names are case-insensitive.
+    return channel.lower()
+
+
+class Table:
+    """Everything the bot keeps about one channel: its game and bookkeeping."""
+
+    channel: str
+    game: game.State
+    state: SetupState
+    paused: bool
+    # Resolved once the bot is operator of the channel.
+    opped: Optional[asyncio.Future]
+    nicks: Set[str]
+    # Names of the computer players, and of those searching for a decision.
+    bots: Set[str]
+    thinking: Set[str]
+    # Seats held for players who left, by nick: their user@host, to match
+    # them if they come back under another nick.
+    vacant: Dict[str, str]
+    # Nicks among the above lost in a netsplit. The game is paused until
+    # they are back.
+    split: Set[str]
+    # Nicks who asked to play while the game was running, first come first
+    # served when a seat is vacant.
+    waiters: List[str]
+    last_activity: float
+
+    def __init__(self, channel: str, now: float):
+        self.channel = channel
+        self.game = game.State()
+        self.state = SetupState.pending_setup
+        self.paused = False
+        self.opped = None
+        self.nicks = set()
+        self.bots = set()
+        self.thinking = set()
+        self.vacant = {}
+        self.split = set()
+        self.waiters = []
+        self.last_activity = now
+
+    def unpause(self):
+        self.paused = False
+
+    @property
+    def is_idle_lobby(self) -> bool:
+        return self.game.stage is game.Stage.lobby and not self.game.players
+
+    def __repr__(self):
+        return f"<Table {self.channel} ({self.game.stage.name})>"
+
+
+class Registry:
+    """
+    Games hosted by the bot, keyed by channel.
+
+    Every lookup is a dict access so the cost of routing a message does not
+    depend on how many channels are hosted. Nicks are indexed too, so that
+    private commands (eg. votes sent by query) find their table directly.
+    """
+
+    tables: Dict[str, Table]
+    tables_by_nick: Dict[str, Table]
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.tables = {}
+        self.tables_by_nick = {}
+
+    def __len__(self):
+        return len(self.tables)
+
+    def __iter__(self) -> Iterator[Table]:
+        return iter(self.tables.values())
+
+    def __contains__(self, channel: str) -> bool:
+        return channel_key(channel) in self.tables
+
+    def get(self, channel: str) -> Optional[Table]:
+        return self.tables.get(channel_key(channel))
+
+    def open(self, channel: str) -> Table:
+        """Returns the table for channel, creating it if needed."""
+        key = channel_key(channel)
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = Table(channel, self.clock())
+        return table
+
+    def close(self, channel: str) -> Optional[Table]:
+        table = self.tables.pop(channel_key(channel), None)
+        if table is not None:
+            self.release(table)
+        return table
+
+    def touch(self, table: Table):
+        table.last_activity = self.clock()
+
+    # Nick index.
+
+    def for_nick(self, nick: str) -> Optional[Table]:
+        return self.tables_by_nick.get(nick)
+
+    def bind(self, nick: str, table: Table):
+        """Records that nick plays at table. A nick plays one game at a time."""
+        current = self.tables_by_nick.get(nick)
+        if current is not None and current is not table:
+            raise game.InvalidAction()
+        self.tables_by_nick[nick] = table
+        table.nicks.add(nick)
+
+    def unbind(self, nick: str):
+        table = self.tables_by_nick.pop(nick, None)
+        if table is not None:
+            table.nicks.discard(nick)
+
+    def release(self, table: Table):
+        """Unbinds every nick playing at table."""
+        for nick in table.nicks:
+            if self.tables_by_nick.get(nick) is table:
+                del self.tables_by_nick[nick]
+        table.nicks.clear()
+
+    # Eviction.
+
+    def evict_idle(self, max_idle: float) -> List[Table]:
+        """Drops lobbies nobody joined for max_idle seconds."""
+        deadline = self.clock() - max_idle
+        evicted = [
+            table
+            for table in self.tables.values()
+            if table.is_idle_lobby and table.last_activity < deadline
+        ]
+        for table in evicted:
+            self.close(table.channel)
+        return evicted
@@ -0,0 +1,122 @@
+import asyncio
+import collections
+from typing import Callable, Deque, Dict, Optional
+
+# Maximum length of an IRC line, CRLF included.
+LINE_LIMIT = 512
+# Room left for the ":nick!user@host " prefix servers add when relaying.
+PREFIX_RESERVE = 100
+# Joins consecutive channel messages coalesced into one line.
+SEPARATOR = " | "
+
+
+class _Message:
+    __slots__ = ("target", "text", "size", "queued_at")
+
+    def __init__(self, target: str, text: str, queued_at: float):
+        self.target = target
+        self.text = text
+        self.size = len(text.encode())
+        self.queued_at = queued_at
+
+
+class SendQueue:
+    """
+    Rate-limited PRIVMSG scheduler for one connection.
+
+    Messages leave at most `rate` per second, with bursts of `burst` messages,
+    so that the server never throttles the bot. Private messages (eg. role
+    reveals) jump ahead of channel messages.
+
+    Nothing is sent before the end of the current event loop iteration, so
+    that consecutive messages to the same channel (eg. from one command) are
+    merged into a single line, as long as it fits in LINE_LIMIT. Messages
+    waiting for the bucket to refill are merged the same way.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, str], None],
+        loop: asyncio.AbstractEventLoop,
+        rate: float = 1.0,
+        burst: int = 4,
+    ):
+        self.send = send
+        self.loop = loop
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = loop.time()
+        self.private: Deque[_Message] = collections.deque()
+        self.public: Deque[_Message] = collections.deque()
+        self.timer: Optional[asyncio.Handle] = None
+        # Metrics.
+        self.sent = 0
+        self.coalesced = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self.private) + len(self.public)
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "depth": self.depth,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "latency_mean": self.latency_total / self.sent if self.sent else 0.0,
+            "latency_max": self.latency_max,
+        }
+
+    def push(self, target: str, text: str, private: bool = False):
+        now = self.loop.time()
+        if private:
+            self.private.append(_Message(target, text, now))
+        elif not self._coalesce(target, text):
+            self.public.append(_Message(target, text, now))
+        if self.timer is None:
+            self.timer = self.loop.call_soon(self._wake_up)
+
+    def _coalesce(self, target: str, text: str) -> bool:
+        if not self.public:
+            return False
+        last = self.public[-1]
+        size = last.size + len(SEPARATOR.encode()) + len(text.encode())
+        if last.target != target or size > self._budget(target):
+            return False
+        last.text += SEPARATOR + text
+        last.size = size
+        self.coalesced += 1
+        return True
+
+    @staticmethod
+    def _budget(target: str) -> int:
+        return LINE_LIMIT - PREFIX_RESERVE - len(f"PRIVMSG {target} :\r\n".encode())
+
+    def _refill(self, now: float):
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.refilled_at) * self.rate
+        )
+        self.refilled_at = now
+
+    def drain(self):
+        """Sends what the bucket allows, and schedules the rest."""
+        now = self.loop.time()
+        self._refill(now)
+        while self.tokens >= 1 and (self.private or self.public):
+            message = (self.private or self.public).popleft()
+            self.tokens -= 1
+            latency = now - message.queued_at
+            self.sent += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.send(message.target, message.text)
+
+        if self.depth and self.timer is None:
+            delay = (1 - self.tokens) / self.rate
+            self.timer = self.loop.call_later(delay, self._wake_up)
+
+    def _wake_up(self):
+        self.timer = None
+        self.drain()
@@ -0,0 +1,403 @@
+"""
+Headless simulation of complete games.
+
+Games are played through the real State transitions; a Strategy makes every
+decision players would make on IRC. Run as a module to measure throughput:
+
+    python -m hitlair.sim --games 10000 --players 7 --strategy heuristic
+"""
+
+import argparse
+import collections
+import random
+import time
+from typing import (
+    Callable,
+    Counter,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+)
+
+from hitlair import game
+from hitlair.game import Player, Policy, Role, Stage
+
+
+class GameResult(NamedTuple):
+    player_count: int
+    # Role.liberal or Role.fascist, None if the game could not go on.
+    winner: Optional[Role]
+    hitler_elected: bool
+    chaos_count: int
+    rounds: int
+
+
+class Strategy:
+    """
+    Decides on behalf of every player. The base class decides uniformly at
+    random; subclasses override the decisions they care about.
+    """
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng if rng is not None else random.Random()
+
+    def new_game(self, state: game.State):
+        pass
+
+    def observe(self, state: game.State, events: Iterable[game.Event]):
+        pass
+
+    def nominate(
+        self, state: game.State, president: Player, candidates: Sequence[Player]
+    ) -> Player:
+        return self.rng.choice(candidates)
+
+    def vote(self, state: game.State, voter: Player) -> bool:
+        return self.rng.random() < 0.5
+
+    def president_discard(
+        self, state: game.State, president: Player, hand: Sequence[Policy]
+    ) -> Policy:
+        return self.rng.choice(hand)
+
+    def chancellor_discard(
+        self, state: game.State, chancellor: Player, hand: Sequence[Policy]
+    ) -> Policy:
+        return self.rng.choice(hand)
+
+    def answer_veto(self, state: game.State, president: Player) -> bool:
+        return self.rng.random() < 0.5
+
+    def investigate(
+        self, state: game.State, president: Player, candidates: Sequence[Player]
+    ) -> Player:
+        return self.rng.choice(candidates)
+
+    def kill(
+        self, state: game.State, president: Player, candidates: Sequence[Player]
+    ) -> Player:
+        return self.rng.choice(candidates)
+
+    def special_elect(
+        self, state: game.State, president: Player, candidates: Sequence[Player]
+    ) -> Player:
+        return self.rng.choice(candidates)
+
+
+class RandomStrategy(Strategy):
+    pass
+
+
+class ScriptedStrategy(Strategy):
+    """
+    Replays a fixed script of decisions, one per call, whatever the decision
+    is about. Once the script is exhausted, falls back to random decisions.
+    """
+
+    def __init__(self, script: Iterable, rng: Optional[random.Random] = None):
+        super().__init__(rng)
+        self.script: Iterator = iter(script)
+
+    def _next(self, fallback: Callable, *args):
+        try:
+            return next(self.script)
+        except StopIteration:
+            return fallback(*args)
+
+    def nominate(self, state, president, candidates):
+        return self._next(super().nominate, state, president, candidates)
+
+    def vote(self, state, voter):
+        return self._next(super().vote, state, voter)
+
+    def president_discard(self, state, president, hand):
+        return self._next(super().president_discard, state, president, hand)
+
+    def chancellor_discard(self, state, chancellor, hand):
+        return self._next(super().chancellor_discard, state, chancellor, hand)
+
+    def answer_veto(self, state, president):
+        return self._next(super().answer_veto, state, president)
+
+    def investigate(self, state, president, candidates):
+        return self._next(super().investigate, state, president, candidates)
+
+    def kill(self, state, president, candidates):
+        return self._next(super().kill, state, president, candidates)
+
+    def special_elect(self, state, president, candidates):
+        return self._next(super().special_elect, state, president, candidates)
+
+
+class HeuristicStrategy(Strategy):
+    """
+    Plays along team lines, using only what each player may know: liberals
+    only know themselves and distrust governments that enacted fascist
+    policies, fascists know their team (Hitler too in small games).
+    """
+
+    suspicion: Dict[Player, int]
+    government: Sequence[Player]
+
+    def new_game(self, state):
+        self.suspicion = collections.defaultdict(int)
+        self.government = ()
+
+    def observe(self, state, events):
+        for event in events:
+            if isinstance(event, game.PresidentNominates):
+                self.government = (event.president, event.candidate_chancellor)
+            elif isinstance(event, game.ChancellorEnacts):
+                if event.policy is Policy.fascist:
+                    for player in self.government:
+                        self.suspicion[player] += 1
+
+    @staticmethod
+    def _is_fascist(player: Player) -> bool:
+        return player.role is not Role.liberal
+
+    def _knows_team(self, state: game.State, player: Player) -> bool:
+        if player.role is Role.fascist:
+            return True
+        return player.role is Role.hitler and state.total_player_count <= 6
+
+    def _friends(self, state, player: Player, candidates: Sequence[Player]):
+        if not self._knows_team(state, player):
+            return []
+        friends = [c for c in candidates if self._is_fascist(c)]
+        if state.fascist_policies >= 3:
+            # Electing Hitler now wins the game.
+            hitlers = [c for c in friends if c.role is Role.hitler]
+            return hitlers or friends
+        return friends
+
+    def _least_suspicious(self, candidates: Sequence[Player]) -> Player:
+        lowest = min(self.suspicion[c] for c in candidates)
+        return self.rng.choice([c for c in candidates if self.suspicion[c] == lowest])
+
+    def _most_suspicious(self, candidates: Sequence[Player]) -> Player:
+        highest = max(self.suspicion[c] for c in candidates)
+        return self.rng.choice([c for c in candidates if self.suspicion[c] == highest])
+
+    def nominate(self, state, president, candidates):
+        friends = self._friends(state, president, candidates)
+        if friends:
+            return self.rng.choice(friends)
+        return self._least_suspicious(candidates)
+
+    def vote(self, state, voter):
+        government = (state.president, state.chancellor)
+        if self._knows_team(state, voter):
+            if any(self._is_fascist(p) for p in government):
+                return True
+        if state.failed_votes == 2:
+            # Avoid chaos.
+            return True
+        return all(self.suspicion[p] == 0 for p in government)
+
+    def _discard(self, player: Player, hand: Sequence[Policy]) -> Policy:
+        unwanted = Policy.liberal if self._is_fascist(player) else Policy.fascist
+        return unwanted if unwanted in hand else hand[0]
+
+    def president_discard(self, state, president, hand):
+        return self._discard(president, hand)
+
+    def chancellor_discard(self, state, chancellor, hand):
+        return self._discard(chancellor, hand)
+
+    def answer_veto(self, state, president):
+        return not self._is_fascist(president)
+
+    def investigate(self, state, president, candidates):
+        return self._most_suspicious(candidates)
+
+    def kill(self, state, president, candidates):
+        if self._knows_team(state, president):
+            enemies = [c for c in candidates if not self._is_fascist(c)]
+            if enemies:
+                return self.rng.choice(enemies)
+        return self._most_suspicious(candidates)
+
+    def special_elect(self, state, president, candidates):
+        friends = self._friends(state, president, candidates)
+        if friends:
+            return self.rng.choice(friends)
+        return self._least_suspicious(candidates)
+
+
+STRATEGIES = {
+    "random": RandomStrategy,
+    "heuristic": HeuristicStrategy,
+}
+
+
+def _eligible_chancellors(state: game.State) -> List[Player]:
+    banned = (state.president, state.former_president, state.former_chancellor)
+    return [p for p in state.players if p not in banned]
+
+
+def _others(state: game.State) -> List[Player]:
+    return [p for p in state.players if p != state.president]
+
+
+def decide(state: game.State, strategy: Strategy) -> bool:
+    """
+    Makes the decisions the current stage still needs, eg. the votes of
+    players who did not vote yet. False if there are none.
+    """
+    stage = state.stage
+    president = state.president
+
+    if stage is Stage.nominate_chancellor:
+        candidates = _eligible_chancellors(state)
+        if not candidates:
+            return False
+        state.nominate_chancellor(strategy.nominate(state, president, candidates))
+    elif stage is Stage.chancellor_election:
+        for voter in state.players:
+            if voter not in state.votes:
+                state.record_vote(voter, strategy.vote(state, voter))
+    elif stage is Stage.legislate:
+        hand = state.president_hand
+        state.president_discards(strategy.president_discard(state, president, hand))
+    elif stage is Stage.enact:
+        hand = state.chancellor_hand
+        chancellor = state.chancellor
+        state.chancellor_discards(strategy.chancellor_discard(state, chancellor, hand))
+    elif stage is Stage.confirm_veto:
+        state.president_answers_to_veto(strategy.answer_veto(state, president))
+    elif stage is Stage.action_peek:
+        state.president_peeks()
+    elif stage is Stage.action_investigate:
+        state.president_investigates(
+            strategy.investigate(state, president, _others(state))
+        )
+    elif stage is Stage.action_kill:
+        state.president_kills(strategy.kill(state, president, _others(state)))
+    elif stage is Stage.action_special_election:
+        state.president_chooses_next_president(
+            strategy.special_elect(state, president, _others(state))
+        )
+    return True
+
+
+def new_game(player_count: int, rng: Optional[random.Random] = None) -> game.State:
+    state = game.State(rng)
+    for i in range(player_count):
+        state.add_player(Player(f"p{i}"))
+    return state
+
+
+def play_until(
+    state: game.State, strategy: Strategy, stop: Callable[[game.State], bool]
+) -> Iterator[List[game.Event]]:
+    """
+    Plays state, yielding the events of each transition, until the game is
+    over or stop(state) is true. Games in the lobby are started first, others
+    are resumed.
+    """
+    strategy.new_game(state)
+    if state.stage is Stage.lobby:
+        events = state.advance(Stage.lobby)[0]
+        strategy.observe(state, events)
+        yield events
+    while state.stage is not Stage.lobby:
+        if stop(state) or not decide(state, strategy):
+            return
+        events = state.advance()[0]
+        strategy.observe(state, events)
+        yield events
+
+
+def play_game(
+    player_count: int, strategy: Strategy, rng: Optional[random.Random] = None
+) -> GameResult:
+    state = new_game(player_count, rng)
+    winner = None
+    hitler_elected = False
+    chaos_count = 0
+    rounds = 0
+
+    for events in play_until(state, strategy, lambda state: False):
+        for event in events:
+            event_type = type(event)
+            if event_type is game.PresidentChanges:
+                rounds += 1
+            elif event_type is game.ChaosHappens:
+                chaos_count += 1
+            elif event_type is game.HitlerIsElectedChancellor:
+                hitler_elected = True
+            elif event_type is game.LiberalsWin:
+                winner = Role.liberal
+            elif event_type is game.FascistsWin:
+                winner = Role.fascist
+
+    return GameResult(player_count, winner, hitler_elected, chaos_count, rounds)
+
+
+def tally(results: Iterable[GameResult]) -> Counter[str]:
+    counts = collections.Counter()
+    for result in results:
+        counts["games"] += 1
+        counts["rounds"] += result.rounds
+        counts["chaos"] += result.chaos_count
+        if result.chaos_count:
+            counts["games_with_chaos"] += 1
+        if result.winner is Role.liberal:
+            counts["liberal_wins"] += 1
+        elif result.winner is Role.fascist:
+            counts["fascist_wins"] += 1
+            if result.hitler_elected:
+                counts["hitler_chancellor_wins"] += 1
+        else:
+            counts["stalled"] += 1
+    return counts
+
+
+class Report(NamedTuple):
+    counts: Counter[str]
+    elapsed: float
+
+    @property
+    def games_per_second(self) -> float:
+        return self.counts["games"] / self.elapsed if self.elapsed else 0.0
+
+
+def run(
+    games: int,
+    player_count: int,
+    strategy: Strategy,
+    rng: Optional[random.Random] = None,
+) -> Report:
+    start = time.perf_counter()
+    counts = tally(play_game(player_count, strategy, rng) for _ in range(games))
+    return Report(counts, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument(
+        "--players",
+        type=int,
+        default=5,
+        choices=sorted(game.PLAYER_COUNT_TO_LIBERAL_COUNT),
+    )
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="random")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    strategy = STRATEGIES[args.strategy](rng)
+    report = run(args.games, args.players, strategy, rng)
+    for key, value in sorted(report.counts.items()):
+        print(f"{key}: {value}")
+    print(f"{report.games_per_second:.0f} games/s ({report.elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
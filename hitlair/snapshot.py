@@ -0,0 +1,453 @@
+"""
+Immutable, compact snapshots of games, for search-based players.
+
+A Snapshot packs what a game needs to go on into small ints, bitmasks and
+bytes: it is hashable in constant time (bytes cache their hash) and can key
+transposition tables. Players are seats, ie. indexes in seats(state).
+
+Snapshots are taken at decision points. apply() returns the snapshot after
+an action, following the rules as implemented by hitlair.game.State, with
+one shortcut: an election is closed as soon as it is decided. perform()
+plays an action on the State itself.
+"""
+
+import enum
+import random
+from typing import Dict, List, NamedTuple, Optional
+
+from hitlair import game
+from hitlair.game import ExecutiveAction, Player, Policy, Role, Stage
+
+NO_SEAT = -1
+# Snapshot.veto values.
+NO_VETO, VETO_REQUESTED, VETO_DENIED = range(3)
+
+_LIBERAL = Policy.liberal.value
+_FASCIST = Policy.fascist.value
+_HITLER = Role.hitler.value
+
+_NOMINATE = Stage.nominate_chancellor.value
+_ELECTION = Stage.chancellor_election.value
+_LEGISLATE = Stage.legislate.value
+_ENACT = Stage.enact.value
+_CONFIRM_VETO = Stage.confirm_veto.value
+_PEEK = Stage.action_peek.value
+_INVESTIGATE = Stage.action_investigate.value
+_KILL = Stage.action_kill.value
+_SPECIAL_ELECTION = Stage.action_special_election.value
+_LOBBY = Stage.lobby.value
+
+_ACTION_STAGES = {
+    ExecutiveAction.peek: _PEEK,
+    ExecutiveAction.investigate: _INVESTIGATE,
+    ExecutiveAction.kill: _KILL,
+    ExecutiveAction.special_election: _SPECIAL_ELECTION,
+}
+
+
+class ActionKind(enum.IntEnum):
+    nominate = 0
+    vote = 1
+    president_discard = 2
+    chancellor_discard = 3
+    veto = 4
+    answer_veto = 5
+    peek = 6
+    investigate = 7
+    kill = 8
+    special_elect = 9
+
+
+class Action(NamedTuple):
+    kind: ActionKind
+    # A seat, a Policy value or a boolean, depending on kind.
+    arg: int = 0
+
+
+def seats(state: game.State) -> List[Player]:
+    """Players by seat: alive players in turn order, then dead players."""
+    return state.players + state.dead_players
+
+
+def _popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+class Snapshot(NamedTuple):
+    stage: int
+    # Role value of each seat.
+    roles: bytes
+    # Bitmask of alive seats.
+    alive: int
+    president: int
+    # Last president picked in turn order, ie. not specially elected.
+    cycle_president: int
+    chancellor: int
+    former_president: int
+    former_chancellor: int
+    failed_votes: int
+    liberal_policies: int
+    fascist_policies: int
+    # Policy values, the top of the deck last.
+    deck: bytes
+    discarded_liberals: int
+    discarded_fascists: int
+    # Bitmasks of seats who voted, and voted yes.
+    voted: int
+    yes: int
+    veto: int
+    # Policy value of the winning team, 0 while the game goes on.
+    winner: int
+
+    @classmethod
+    def from_state(cls, state: game.State) -> "Snapshot":
+        players = seats(state)
+        seat_of: Dict[Player, int] = {player: i for i, player in enumerate(players)}
+
+        def seat(player: Optional[Player]) -> int:
+            return NO_SEAT if player is None else seat_of[player]
+
+        voted = yes = 0
+        for voter, vote in state.votes.items():
+            voted |= 1 << seat_of[voter]
+            if vote:
+                yes |= 1 << seat_of[voter]
+        veto = NO_VETO
+        if isinstance(state.context, game.VetoContext):
+            if state.context.requested:
+                veto = VETO_REQUESTED
+            elif state.context.denied:
+                veto = VETO_DENIED
+        discarded_liberals = sum(
+            1 for policy in state.discard_pile if policy is Policy.liberal
+        )
+
+        return cls(
+            stage=state.stage.value,
+            roles=bytes(player.role.value for player in players),
+            alive=(1 << state.player_count) - 1,
+            president=seat(state.president),
+            cycle_president=seat(state.cycle_president),
+            chancellor=seat(state.chancellor),
+            former_president=seat(state.former_president),
+            former_chancellor=seat(state.former_chancellor),
+            failed_votes=state.failed_votes,
+            liberal_policies=state.liberal_policies,
+            fascist_policies=state.fascist_policies,
+            deck=state.policy_deck.to_bytes(),
+            discarded_liberals=discarded_liberals,
+            discarded_fascists=len(state.discard_pile) - discarded_liberals,
+            voted=voted,
+            yes=yes,
+            veto=veto,
+            winner=0,
+        )
+
+    @property
+    def is_over(self) -> bool:
+        return self.stage == _LOBBY
+
+    @property
+    def to_move(self) -> int:
+        """The seat whose decision the snapshot waits for."""
+        if self.stage == _ELECTION:
+            waiting = self.alive & ~self.voted
+            return (waiting & -waiting).bit_length() - 1
+        if self.stage == _ENACT:
+            return self.chancellor
+        if self.stage == _LOBBY:
+            return NO_SEAT
+        return self.president
+
+    def _alive_seats(self, *excluded: int) -> List[int]:
+        alive = self.alive
+        return [
+            seat
+            for seat in range(len(self.roles))
+            if alive >> seat & 1 and seat not in excluded
+        ]
+
+    def legal_actions(self) -> List[Action]:
+        stage = self.stage
+        if stage == _NOMINATE:
+            return [
+                Action(ActionKind.nominate, seat)
+                for seat in self._alive_seats(
+                    self.president, self.former_president, self.former_chancellor
+                )
+            ]
+        if stage == _ELECTION:
+            return [Action(ActionKind.vote, 1), Action(ActionKind.vote, 0)]
+        if stage == _LEGISLATE:
+            return [
+                Action(ActionKind.president_discard, policy)
+                for policy in sorted(set(self.deck[-game.PRESIDENT_HAND :]))
+            ]
+        if stage == _ENACT:
+            actions = [
+                Action(ActionKind.chancellor_discard, policy)
+                for policy in sorted(set(self.deck[-game.CHANCELLOR_HAND :]))
+            ]
+            if self.veto == NO_VETO and ExecutiveAction.veto_available(
+                self.fascist_policies
+            ):
+                actions.append(Action(ActionKind.veto))
+            return actions
+        if stage == _CONFIRM_VETO:
+            return [
+                Action(ActionKind.answer_veto, 1),
+                Action(ActionKind.answer_veto, 0),
+            ]
+        if stage == _PEEK:
+            return [Action(ActionKind.peek)]
+        if stage == _INVESTIGATE:
+            # Dead players can be investigated too.
+            return [
+                Action(ActionKind.investigate, seat)
+                for seat in range(len(self.roles))
+                if seat != self.president
+            ]
+        if stage == _KILL:
+            return [
+                Action(ActionKind.kill, seat)
+                for seat in self._alive_seats(self.president)
+            ]
+        if stage == _SPECIAL_ELECTION:
+            return [
+                Action(ActionKind.special_elect, seat)
+                for seat in self._alive_seats(self.president)
+            ]
+        return []
+
+    def apply(self, action: Action, rng: Optional[random.Random] = None) -> "Snapshot":
+        """
+        Returns the snapshot after action, which must be one of
+        legal_actions(): it is not checked again. rng shuffles the policy
+        deck when it runs out, it defaults to the random module.
+        """
+        fields = self._asdict()
+        _APPLY[action.kind](fields, action.arg, rng or random)
+        return Snapshot(**fields)
+
+    def cast_vote(
+        self, seat: int, yes: bool, rng: Optional[random.Random] = None
+    ) -> "Snapshot":
+        """Like apply() for a vote, cast by seat rather than to_move."""
+        fields = self._asdict()
+        _record_vote(fields, 1 << seat, yes, rng or random)
+        return Snapshot(**fields)
+
+
+# Transitions, working on the fields of a snapshot.
+
+
+def _next_president(s: dict, specially_elected: int = NO_SEAT):
+    s["former_chancellor"] = s["chancellor"]
+    s["chancellor"] = NO_SEAT
+    s["former_president"] = s["president"]
+    if specially_elected != NO_SEAT:
+        s["president"] = specially_elected
+    else:
+        count = len(s["roles"])
+        seat = s["cycle_president"]
+        while True:
+            seat = (seat + 1) % count
+            if s["alive"] >> seat & 1:
+                break
+        s["president"] = s["cycle_president"] = seat
+    s["stage"] = _NOMINATE
+
+
+def _ensure_valid_policy_deck(s: dict, rng):
+    if len(s["deck"]) < game.PRESIDENT_HAND:
+        deck = bytearray(s["deck"])
+        deck += bytes([_LIBERAL]) * s["discarded_liberals"]
+        deck += bytes([_FASCIST]) * s["discarded_fascists"]
+        rng.shuffle(deck)
+        s["deck"] = bytes(deck)
+        s["discarded_liberals"] = s["discarded_fascists"] = 0
+
+
+def _discard(s: dict, policy: int, depth: int):
+    deck = s["deck"]
+    i = deck.index(policy, len(deck) - depth)
+    s["deck"] = deck[:i] + deck[i + 1 :]
+    if policy == _LIBERAL:
+        s["discarded_liberals"] += 1
+    else:
+        s["discarded_fascists"] += 1
+
+
+def _enact_outcome(s: dict, policy: int):
+    if policy == _LIBERAL:
+        s["liberal_policies"] += 1
+        if s["liberal_policies"] == 5:
+            s["winner"] = _LIBERAL
+            s["stage"] = _LOBBY
+            return
+    else:
+        s["fascist_policies"] += 1
+        if s["fascist_policies"] == 6:
+            s["winner"] = _FASCIST
+            s["stage"] = _LOBBY
+            return
+        executive_action = ExecutiveAction.get(
+            len(s["roles"]), s["fascist_policies"]
+        )
+        if executive_action is not None:
+            s["stage"] = _ACTION_STAGES[executive_action]
+            return
+    _next_president(s)
+
+
+def _advance_election_tracker(s: dict, rng):
+    s["failed_votes"] += 1
+    if s["failed_votes"] < 3:
+        _next_president(s)
+        return
+    # Chaos. As in State, the enacted policy also goes to the discard pile.
+    s["failed_votes"] = 0
+    _ensure_valid_policy_deck(s, rng)
+    policy = s["deck"][-1]
+    s["deck"] = s["deck"][:-1]
+    if policy == _LIBERAL:
+        s["discarded_liberals"] += 1
+    else:
+        s["discarded_fascists"] += 1
+    _enact_outcome(s, policy)
+
+
+def _apply_nominate(s: dict, seat: int, rng):
+    s["chancellor"] = seat
+    s["stage"] = _ELECTION
+
+
+def _apply_vote(s: dict, yes: int, rng):
+    waiting = s["alive"] & ~s["voted"]
+    _record_vote(s, waiting & -waiting, yes, rng)
+
+
+def _record_vote(s: dict, voter: int, yes: int, rng):
+    alive = s["alive"]
+    s["voted"] |= voter
+    if yes:
+        s["yes"] |= voter
+    count = _popcount(alive)
+    yes_count = _popcount(s["yes"])
+    no_count = _popcount(s["voted"]) - yes_count
+    # Closed as soon as decided, see State.is_election_decided.
+    if not (2 * yes_count > count or 2 * no_count >= count):
+        return
+    s["voted"] = s["yes"] = 0
+    if 2 * yes_count <= count:
+        _advance_election_tracker(s, rng)
+        return
+    s["failed_votes"] = 0
+    _ensure_valid_policy_deck(s, rng)
+    if s["fascist_policies"] >= 3 and s["roles"][s["chancellor"]] == _HITLER:
+        s["winner"] = _FASCIST
+        s["stage"] = _LOBBY
+        return
+    s["stage"] = _LEGISLATE
+
+
+def _apply_president_discard(s: dict, policy: int, rng):
+    _discard(s, policy, game.PRESIDENT_HAND)
+    s["stage"] = _ENACT
+    s["veto"] = NO_VETO
+
+
+def _apply_chancellor_discard(s: dict, policy: int, rng):
+    _discard(s, policy, game.CHANCELLOR_HAND)
+    enacted = s["deck"][-1]
+    s["deck"] = s["deck"][:-1]
+    s["veto"] = NO_VETO
+    _enact_outcome(s, enacted)
+
+
+def _apply_veto(s: dict, arg: int, rng):
+    s["veto"] = VETO_REQUESTED
+    s["stage"] = _CONFIRM_VETO
+
+
+def _apply_answer_veto(s: dict, accept: int, rng):
+    if not accept:
+        s["veto"] = VETO_DENIED
+        s["stage"] = _ENACT
+        return
+    s["veto"] = NO_VETO
+    _advance_election_tracker(s, rng)
+
+
+def _apply_peek(s: dict, arg: int, rng):
+    _next_president(s)
+
+
+def _apply_investigate(s: dict, seat: int, rng):
+    _next_president(s)
+
+
+def _apply_kill(s: dict, seat: int, rng):
+    s["alive"] &= ~(1 << seat)
+    # As in State._build_player_cycle().
+    s["cycle_president"] = s["president"]
+    _next_president(s)
+
+
+def _apply_special_elect(s: dict, seat: int, rng):
+    _next_president(s, specially_elected=seat)
+
+
+_APPLY = {
+    ActionKind.nominate: _apply_nominate,
+    ActionKind.vote: _apply_vote,
+    ActionKind.president_discard: _apply_president_discard,
+    ActionKind.chancellor_discard: _apply_chancellor_discard,
+    ActionKind.veto: _apply_veto,
+    ActionKind.answer_veto: _apply_answer_veto,
+    ActionKind.peek: _apply_peek,
+    ActionKind.investigate: _apply_investigate,
+    ActionKind.kill: _apply_kill,
+    ActionKind.special_elect: _apply_special_elect,
+}
+
+
+def play(state: game.State, action: Action, seat: Optional[int] = None) -> bool:
+    """
+    Plays action on state, which must be at the decision point the snapshot
+    of state describes. Votes are cast by seat, if given. True if the stage
+    is over and state must advance.
+    """
+    players = seats(state)
+    kind, arg = action
+    if kind is ActionKind.vote:
+        if seat is None:
+            seat = Snapshot.from_state(state).to_move
+        state.record_vote(players[seat], bool(arg))
+        return state.is_election_decided
+    elif kind is ActionKind.nominate:
+        state.nominate_chancellor(players[arg])
+    elif kind is ActionKind.president_discard:
+        state.president_discards(Policy(arg))
+    elif kind is ActionKind.chancellor_discard:
+        state.chancellor_discards(Policy(arg))
+    elif kind is ActionKind.veto:
+        state.chancellor_vetoes()
+    elif kind is ActionKind.answer_veto:
+        state.president_answers_to_veto(bool(arg))
+    elif kind is ActionKind.peek:
+        state.president_peeks()
+    elif kind is ActionKind.investigate:
+        state.president_investigates(players[arg])
+    elif kind is ActionKind.kill:
+        state.president_kills(players[arg])
+    elif kind is ActionKind.special_elect:
+        state.president_chooses_next_president(players[arg])
+    return True
+
+
+def perform(state: game.State, action: Action) -> List[game.Event]:
+    """Plays action on state, advancing it when the snapshot would move on."""
+    if not play(state, action):
+        return []
+    return state.advance()[0]
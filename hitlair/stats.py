@@ -0,0 +1,120 @@
+"""
+Win-rate statistics per player count, computed from simulated games spread
+over a process pool:
+
+    python -m hitlair.stats --games 1000000 --seed 42
+
+Work is split in fixed-size chunks, each seeded from the master seed, the
+player count and the chunk index. Results therefore only depend on the master
+seed, not on the number of workers nor on the order chunks complete in.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import os
+import random
+import time
+from typing import Counter, Dict, Iterable, NamedTuple, Optional
+
+from hitlair import game, sim
+
+CHUNK_SIZE = 5000
+
+
+class Chunk(NamedTuple):
+    player_count: int
+    games: int
+    seed: str
+
+
+def chunks(
+    master_seed: int, games: int, player_counts: Iterable[int], chunk_size: int
+) -> Iterable[Chunk]:
+    for player_count in player_counts:
+        for index, start in enumerate(range(0, games, chunk_size)):
+            seed = f"{master_seed}/{player_count}/{index}"
+            yield Chunk(player_count, min(chunk_size, games - start), seed)
+
+
+def simulate(chunk: Chunk, strategy_name: str) -> Counter[str]:
+    """Plays a chunk of games. Runs in worker processes."""
+    rng = random.Random(chunk.seed)
+    strategy = sim.STRATEGIES[strategy_name](rng)
+    return sim.tally(
+        sim.play_game(chunk.player_count, strategy, rng) for _ in range(chunk.games)
+    )
+
+
+def run(
+    master_seed: int,
+    games: int,
+    player_counts: Iterable[int] = tuple(game.PLAYER_COUNT_TO_LIBERAL_COUNT),
+    strategy_name: str = "random",
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[int, Counter[str]]:
+    """Simulates games for each player count, merging counts per player count."""
+    totals = collections.defaultdict(collections.Counter)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(simulate, chunk, strategy_name): chunk.player_count
+            for chunk in chunks(master_seed, games, player_counts, chunk_size)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            totals[futures[future]].update(future.result())
+    return dict(totals)
+
+
+def format_report(totals: Dict[int, Counter[str]]) -> str:
+    lines = [
+        "players      games  liberal  fascist  hitler-c  chaos-games  chaos/game"
+    ]
+    for player_count, counts in sorted(totals.items()):
+        games = counts["games"] or 1
+        lines.append(
+            f"{player_count:7d} {counts['games']:10d}"
+            f" {counts['liberal_wins'] / games:8.2%}"
+            f" {counts['fascist_wins'] / games:8.2%}"
+            f" {counts['hitler_chancellor_wins'] / games:9.2%}"
+            f" {counts['games_with_chaos'] / games:12.2%}"
+            f" {counts['chaos'] / games:11.3f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--games", type=int, default=100000, help="per player count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--players",
+        type=int,
+        nargs="+",
+        default=sorted(game.PLAYER_COUNT_TO_LIBERAL_COUNT),
+        choices=sorted(game.PLAYER_COUNT_TO_LIBERAL_COUNT),
+    )
+    parser.add_argument(
+        "--strategy", choices=sorted(sim.STRATEGIES), default="heuristic"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    totals = run(
+        args.seed,
+        args.games,
+        args.players,
+        args.strategy,
+        args.workers,
+        args.chunk_size,
+    )
+    elapsed = time.perf_counter() - start
+    print(format_report(totals))
+    games = sum(counts["games"] for counts in totals.values())
+    print(f"{games / elapsed:.0f} games/s on {args.workers} workers ({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
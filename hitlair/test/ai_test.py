@@ -0,0 +1,119 @@
+import random
+
+import pytest
+
+from hitlair import ai, game, sim
+from hitlair.game import Policy, Role, Stage
+from hitlair.snapshot import Action, ActionKind, Snapshot, play, seats
+
+CONFIG = ai.SearchConfig(time_budget=5, max_iterations=300)
+
+
+def enact_stage(state, players, chancellor, policies, board):
+    state._skip_lobby_for_testing(players, players[0])
+    state._skip_chancellor_election_for_testing(chancellor)
+    state._set_policy_board_for_testing(*board)
+    state._set_next_policies_for_testing(policies)
+    state._enter_stage(Stage.enact)
+    return Snapshot.from_state(state)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_determinize_keeps_what_seat_knows(seed):
+    rng = random.Random(seed)
+    state = sim.new_game(7, random.Random(seed))
+    state.advance(Stage.lobby)
+    snapshot = Snapshot.from_state(state)
+    for seat, player in enumerate(seats(state)):
+        sample = ai.determinize(snapshot, seat, rng)
+        assert sample.roles[seat] == snapshot.roles[seat]
+        assert sorted(sample.roles) == sorted(snapshot.roles)
+        if player.role is Role.fascist:
+            assert sample.roles == snapshot.roles
+        assert sorted(sample.deck) == sorted(snapshot.deck)
+        assert sample._replace(roles=snapshot.roles, deck=snapshot.deck) == snapshot
+
+
+def test_determinize_keeps_hand(state, example_players):
+    chancellor = example_players[1]
+    enact_stage(
+        state, example_players, chancellor, [Policy.liberal, Policy.fascist], (0, 0)
+    )
+    state.discard_pile.extend([Policy.liberal] * 3)
+    snapshot = Snapshot.from_state(state)
+    seat = seats(state).index(chancellor)
+    rng = random.Random(0)
+    samples = [ai.determinize(snapshot, seat, rng) for _ in range(20)]
+    assert all(s.deck[-2:] == snapshot.deck[-2:] for s in samples)
+    assert all(
+        s.discarded_liberals + s.deck.count(Policy.liberal.value)
+        == 3 + snapshot.deck.count(Policy.liberal.value)
+        for s in samples
+    )
+    # The policies under the hand are shuffled with the discard pile.
+    assert len({s.deck for s in samples}) > 1
+
+
+def test_liberal_enacts_winning_policy(state, example_players):
+    chancellor = example_players[1]
+    assert chancellor.role is Role.liberal
+    snapshot = enact_stage(
+        state, example_players, chancellor, [Policy.liberal, Policy.fascist], (4, 2)
+    )
+    seat = seats(state).index(chancellor)
+    action = ai.decide(snapshot, seat, CONFIG, seed=1)
+    assert action == Action(ActionKind.chancellor_discard, Policy.fascist.value)
+    assert play(state, action)
+    events, _ = state.advance()
+    assert any(isinstance(e, game.LiberalsWin) for e in events)
+
+
+def test_fascist_enacts_winning_policy(state, example_players):
+    chancellor = example_players[3]
+    assert chancellor.role is Role.fascist
+    snapshot = enact_stage(
+        state, example_players, chancellor, [Policy.liberal, Policy.fascist], (0, 5)
+    )
+    seat = seats(state).index(chancellor)
+    action = ai.decide(snapshot, seat, CONFIG, seed=1)
+    assert action == Action(ActionKind.chancellor_discard, Policy.liberal.value)
+
+
+def test_decide_votes_for_any_waiting_seat(state, example_players):
+    state._skip_lobby_for_testing(example_players, example_players[0])
+    state.nominate_chancellor(example_players[4])
+    state.advance()
+    snapshot = Snapshot.from_state(state)
+    assert snapshot.to_move == 0
+
+    action = ai.decide(snapshot, 3, CONFIG, seed=1)
+    assert action.kind is ActionKind.vote
+    play(state, action, 3)
+    assert example_players[3] in state.votes
+
+    with pytest.raises(game.IllegalState):
+        ai.decide(Snapshot.from_state(state), 3, CONFIG)
+
+
+def test_decide_waits_for_its_turn(state, example_players):
+    state._skip_lobby_for_testing(example_players, example_players[0])
+    with pytest.raises(game.IllegalState):
+        ai.decide(Snapshot.from_state(state), 1, CONFIG)
+
+
+def test_waiting_seats(state, example_players):
+    assert ai.waiting_seats(state) == []
+    state._skip_lobby_for_testing(example_players, example_players[2])
+    assert ai.waiting_seats(state) == [2]
+    state.nominate_chancellor(example_players[0])
+    state.advance()
+    state.record_vote(example_players[1], True)
+    assert ai.waiting_seats(state) == [0, 2, 3, 4]
+
+
+def test_bots_play_complete_games():
+    wins, finished = ai.run(
+        2, 5, 2, ai.SearchConfig(time_budget=1, max_iterations=20), random.Random(0)
+    )
+    assert len(wins) == 2
+    assert all(0 <= count <= finished <= 2 for count in wins)
@@ -1,3 +1,5 @@
+import sys
+
 import pytest
 
 from hitlair.game import Player, Role
@@ -26,3 +28,18 @@ def state():
     from hitlair import game
 
     return game.State()
+
+
+@pytest.fixture
+def restore_modules():
+    """Undoes importlib.reload() of hitlair modules once the test is over."""
+    saved = {
+        name: dict(module.__dict__)
+        for name, module in sys.modules.items()
+        if name.startswith("hitlair.")
+    }
+    yield
+    for name, namespace in saved.items():
+        module = sys.modules[name]
+        module.__dict__.clear()
+        module.__dict__.update(namespace)
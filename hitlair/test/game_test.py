@@ -1,8 +1,10 @@
+import importlib
+import random
 from typing import Type
 
 import pytest
 
-from hitlair import game
+from hitlair import game, journal, sim
 from hitlair.game import Stage, IllegalState, Player, InvalidAction, Policy
 
 
@@ -98,6 +100,48 @@ def test_chancellor_nomination_vote_succeeds(state: game.State, example_players)
     assert game.NominateVoteSucceeds(3, 2, chancellor) in events
 
 
+def test_chancellor_nomination_vote_resolves_early(state, example_players):
+    president, chancellor, *_ = example_players
+    state._skip_lobby_for_testing(example_players, president)
+    state.nominate_chancellor(chancellor)
+    state.advance()
+
+    state.record_vote(example_players[0], True)
+    state.record_vote(example_players[1], True)
+    state.record_vote(example_players[2], False)
+    assert not state.is_election_decided
+    with pytest.raises(IllegalState):
+        state.advance()
+
+    # Changing one's vote updates the tallies.
+    state.record_vote(example_players[2], True)
+    assert (state.yes_votes, state.no_votes) == (3, 0)
+    assert state.is_election_decided
+    assert not state.is_election_complete
+
+    events, stage = state.advance()
+    assert stage is Stage.legislate
+    assert game.NominateVoteSucceeds(3, 0, chancellor) in events
+    assert (state.yes_votes, state.no_votes) == (0, 0)
+
+
+def test_chancellor_nomination_tie_is_decided_failure(
+    state, example_players, more_example_players
+):
+    players = example_players + more_example_players[:1]
+    president, chancellor, *_ = players
+    state._skip_lobby_for_testing(players, president)
+    state.nominate_chancellor(chancellor)
+    state.advance()
+
+    for voter in players[:3]:
+        state.record_vote(voter, False)
+    assert state.is_election_decided
+    events, stage = state.advance()
+    assert stage is Stage.nominate_chancellor
+    assert game.NominateVoteFails(0, 3) in events
+
+
 def test_legislate_and_enact(state, example_players):
     president, chancellor, *_ = example_players
     state._skip_lobby_for_testing(example_players, president)
@@ -134,6 +178,77 @@ def test_legislate_and_enact(state, example_players):
     assert game.PresidentChanges(president, example_players[1]) in events
 
 
+def test_president_discards_once(state, example_players):
+    president, chancellor, *_ = example_players
+    state._skip_lobby_for_testing(example_players, president)
+    state._skip_chancellor_election_for_testing(chancellor)
+    # Earlier discards are not the president's.
+    state.discard_pile.append(Policy.liberal)
+    with pytest.raises(IllegalState):
+        state.advance()
+
+    state._set_next_policies_for_testing(
+        [Policy.liberal, Policy.liberal, Policy.fascist]
+    )
+    state.president_discards(Policy.fascist)
+    with pytest.raises(InvalidAction):
+        state.president_discards(Policy.liberal)
+    events, stage = state.advance()
+    assert stage is Stage.enact
+    assert game.PresidentDiscards(president, Policy.fascist) in events
+
+
+def test_veto_denied_then_enact(state, example_players):
+    president, chancellor, *_ = example_players
+    state._skip_lobby_for_testing(example_players, president)
+    state._skip_chancellor_election_for_testing(chancellor)
+    state._set_policy_board_for_testing(0, 5)
+    state._set_next_enacted_policy_for_testing(Policy.liberal)
+
+    state.chancellor_vetoes()
+    with pytest.raises(InvalidAction):
+        state.chancellor_discards(Policy.liberal)
+    events, stage = state.advance()
+    assert stage is Stage.confirm_veto
+    assert game.ChancellorVetoes(president, chancellor) in events
+
+    state.president_answers_to_veto(False)
+    events, stage = state.advance()
+    assert stage is Stage.enact
+    assert game.PresidentDeniesVeto(president, chancellor) in events
+
+    # No second veto, the chancellor has to enact.
+    with pytest.raises(InvalidAction):
+        state.chancellor_vetoes()
+    state._set_next_policies_for_testing([Policy.fascist, Policy.liberal])
+    state.chancellor_discards(Policy.fascist)
+    events, stage = state.advance()
+    assert game.ChancellorEnacts(chancellor, Policy.liberal) in events
+    assert state.context is None
+
+
+def test_every_stage_has_an_exit_handler():
+    assert set(game._EXIT_HANDLERS) == set(Stage)
+    for stage, handler in game._EXIT_HANDLERS.items():
+        assert handler.__name__ == f"exit_{stage.name}"
+
+
+def test_stage_context_is_dropped_with_stage(state, example_players):
+    assert state.context is None
+    president, chancellor, *_ = example_players
+    state._skip_lobby_for_testing(example_players, president)
+    assert state.context is None
+    state.nominate_chancellor(chancellor)
+    state.advance()
+    assert isinstance(state.context, game.ElectionContext)
+    assert not hasattr(state.context, "__dict__")
+    for voter in example_players:
+        state.record_vote(voter, True)
+    state.advance()
+    assert isinstance(state.context, game.LegislateContext)
+    assert state.votes == {}
+
+
 def test_liberals_win_by_policies(state, example_players):
     president, chancellor, *_ = example_players
     state._skip_lobby_for_testing(example_players, president)
@@ -306,3 +421,255 @@ def test_executive_action_special_election(
     # Chancellor is president again, this time thanks to the natural player
     # order.
     assert state.president == chancellor
+
+
+def start_seeded_game(state: game.State, names):
+    for name in names:
+        state.add_player(Player(name))
+    state.advance()
+    return (
+        [(p.name, p.role) for p in state.players],
+        state.president,
+        list(state.policy_deck),
+    )
+
+
+def test_seeded_games_are_reproducible(example_players):
+    names = [p.name for p in example_players]
+    one = start_seeded_game(game.State(random.Random(42)), names)
+    two = start_seeded_game(game.State(random.Random(42)), names)
+    assert one == two
+
+
+def test_rng_state_restores(example_players):
+    names = [p.name for p in example_players]
+    state = game.State(random.Random(42))
+    rng_state = state.rng_state
+    one = start_seeded_game(state, names)
+
+    state = game.State()
+    state.rng_state = rng_state
+    assert start_seeded_game(state, names) == one
+
+
+def test_policy_deck():
+    deck = game.PolicyDeck([Policy.fascist, Policy.liberal, Policy.fascist])
+    assert len(deck) == 3
+    assert deck == [Policy.fascist, Policy.liberal, Policy.fascist]
+    assert deck[-1] is Policy.fascist
+    assert deck.peek(2) == [Policy.liberal, Policy.fascist]
+
+    # Only the top two policies are considered.
+    with pytest.raises(ValueError):
+        deck.remove(Policy.liberal, depth=1)
+    deck.remove(Policy.fascist, depth=2)
+    assert deck == [Policy.fascist, Policy.liberal]
+
+    assert deck.draw() is Policy.liberal
+    discard_pile = game.PolicyDeck([Policy.liberal])
+    deck.extend(discard_pile)
+    assert deck == [Policy.fascist, Policy.liberal]
+
+    deck.shuffle(random.Random(0))
+    assert sorted(deck, key=lambda p: p.value) == [Policy.liberal, Policy.fascist]
+
+
+def test_players_are_interned(state, example_players):
+    president, chancellor, *_ = example_players
+    state._skip_lobby_for_testing(example_players, president)
+
+    assert state.get_player("delroth") is chancellor
+    assert state.get_player("stranger") not in state.players
+
+    with pytest.raises(InvalidAction):
+        state.nominate_chancellor(Player("stranger"))
+
+
+def test_dead_players_can_be_investigated_not_killed(state, example_players):
+    president, chancellor, *_ = example_players
+    state._skip_lobby_for_testing(example_players, president)
+    state._skip_chancellor_election_for_testing(chancellor)
+    state._set_policy_board_for_testing(1, 3)
+    state._set_next_enacted_policy_for_testing(Policy.fascist)
+    state.advance()
+    state.president_kills(chancellor)
+    state.advance()
+
+    assert not state.is_registered_player(chancellor)
+    assert state.get_player(chancellor.name) is chancellor
+    state._enter_stage(Stage.action_kill)
+    with pytest.raises(InvalidAction):
+        state.president_kills(chancellor)
+    state._enter_stage(Stage.action_investigate)
+    assert state.president_investigates(chancellor) is chancellor.role
+
+
+def test_replace_player(state, example_players):
+    president, chancellor, *_ = example_players
+    with pytest.raises(IllegalState):
+        state.replace_player(chancellor, Player("newcomer"))
+
+    state._skip_lobby_for_testing(example_players, president)
+    state.nominate_chancellor(chancellor)
+    state.advance()
+    state.record_vote(chancellor, True)
+    with pytest.raises(InvalidAction):
+        state.replace_player(chancellor, Player("sophie"))
+    with pytest.raises(InvalidAction):
+        state.replace_player(Player("nobody"), Player("newcomer"))
+
+    event = state.replace_player(chancellor, Player("newcomer"))
+    newcomer = event.new_player
+    assert event == game.PlayerReplaces(chancellor, newcomer)
+    assert newcomer.role is chancellor.role
+    assert list(state.journal)[-1] == event
+    assert state.players[1] is newcomer
+    assert state.get_player("newcomer") is newcomer
+    assert chancellor not in state.alive_players
+    assert state.chancellor is newcomer
+    assert state.votes == {newcomer: True}
+
+    # The turn order goes through the seat.
+    state._force_failed_election()
+    state.advance()
+    assert state.president is newcomer
+
+
+def test_names_must_fit_in_journal(state, example_players):
+    with pytest.raises(InvalidAction):
+        state.add_player(Player("é" * 128))
+    state.add_player(Player("é" * 127))
+    assert state.players_by_name.keys() == {"é" * 127}
+
+    state.reset()
+    state._skip_lobby_for_testing(example_players, example_players[0])
+    with pytest.raises(InvalidAction):
+        state.replace_player(example_players[1], Player("x" * 256))
+
+
+def test_journal_rejects_values_out_of_range(example_players):
+    log = journal.Journal()
+    log.append(game.PresidentChanges(None, example_players[0]))
+    before = log.to_bytes()
+    with pytest.raises(ValueError):
+        log.append(game.NominateVoteSucceeds(300, 0, example_players[1]))
+    assert (log.to_bytes(), len(log)) == (before, 1)
+
+    log.append(game.NominateVoteSucceeds(3, 2, example_players[1]))
+    assert list(journal.Journal.from_bytes(log.to_bytes()))[-1] == (
+        game.NominateVoteSucceeds(3, 2, example_players[1])
+    )
+
+
+def replayable_view(state: game.State):
+    return (
+        state.stage,
+        [(p.name, p.role) for p in state.players],
+        [p.name for p in state.dead_players],
+        list(state.policy_deck),
+        list(state.discard_pile),
+        state.president,
+        state.chancellor,
+        state.former_president,
+        state.former_chancellor,
+        state.failed_votes,
+        state.liberal_policies,
+        state.fascist_policies,
+        state.cycle_president,
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_replay_rebuilds_state_at_every_step(seed):
+    rng = random.Random(seed)
+    state = sim.new_game(5 + seed % 6, rng)
+    strategy = sim.HeuristicStrategy(rng)
+    for _ in sim.play_until(state, strategy, lambda s: False):
+        log = journal.Journal.from_bytes(state.journal.to_bytes())
+        assert len(log) == len(state.journal)
+        replayed = game.State.replay(log)
+        assert replayable_view(replayed) == replayable_view(state)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_replay_follows_replacements(seed):
+    rng = random.Random(seed)
+    state = sim.new_game(5 + seed % 6, rng)
+    strategy = sim.RandomStrategy(rng)
+    for i, _ in enumerate(sim.play_until(state, strategy, lambda s: False)):
+        if state.stage is not Stage.lobby and i % 3 == 0:
+            state.replace_player(rng.choice(state.players), Player(f"new{i}"))
+        log = journal.Journal.from_bytes(state.journal.to_bytes())
+        replayed = game.State.replay(log)
+        assert replayable_view(replayed) == replayable_view(state)
+
+
+def test_migrate_from_reloaded_module(state, example_players):
+    class ReloadedState(game.State):
+        pass
+
+    assert game.State.migrate(state) is state
+
+    for player in example_players:
+        state.add_player(Player(player.name))
+    migrated = ReloadedState.migrate(state)
+    assert migrated.stage is Stage.lobby
+    assert [p.name for p in migrated.players] == [p.name for p in state.players]
+
+    state.advance()
+    state.nominate_chancellor(
+        next(p for p in state.players if p != state.president)
+    )
+    state.advance()
+    state.record_vote(state.players[0], True)
+
+    migrated = ReloadedState.migrate(state)
+    assert isinstance(migrated, ReloadedState)
+    assert replayable_view(migrated) == replayable_view(state)
+    assert migrated.votes == {state.players[0]: True}
+    assert migrated.rng is state.rng
+
+
+def test_migrate_after_reload(restore_modules):
+    state = sim.new_game(5, random.Random(0))
+    state.advance()
+    state.nominate_chancellor(next(p for p in state.players if p != state.president))
+    state.advance()
+    state.record_vote(state.players[0], False)
+
+    # As reloadpls does: the journal caches codecs of the event classes.
+    importlib.reload(journal)
+    importlib.reload(game)
+    migrated = game.State.migrate(state)
+    assert type(migrated) is game.State is not type(state)
+    assert migrated.stage is game.Stage.chancellor_election
+    assert [p.role.name for p in migrated.players] == [
+        p.role.name for p in state.players
+    ]
+    assert list(migrated.policy_deck) == [
+        game.Policy[p.name] for p in state.policy_deck
+    ]
+    assert migrated.votes == {migrated.players[0]: False}
+
+
+def test_events_are_streamed_to_dispatcher(state, example_players):
+    dispatcher = game.EventDispatcher()
+    received = []
+    stages = []
+    dispatcher.on(game.PresidentChanges, lambda ctx, e: received.append((ctx, e)))
+    dispatcher.on(game.StageChanges, lambda ctx, e: stages.append(state.stage))
+    dispatcher.subscribe(lambda ctx, e: received.append(type(e)))
+
+    for player in example_players:
+        state.add_player(player)
+    events, stage = state.advance(
+        sink=lambda event: dispatcher.dispatch("#chan", event)
+    )
+
+    president_changes = get_event_of_type(events, game.PresidentChanges)
+    assert ("#chan", president_changes) in received
+    assert [t for t in received if isinstance(t, type)] == [
+        type(e) for e in events
+    ] + [game.StageChanges]
+    # The stage is entered when its StageChanges is dispatched.
+    assert stages == [Stage.nominate_chancellor]
@@ -0,0 +1,425 @@
+import asyncio
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+import irc3
+import pytest
+
+from hitlair import ai, game, irc, persistence, sim
+from hitlair.persistence import SnapshotStore
+from hitlair.registry import SetupState
+from hitlair.send_queue import SEPARATOR
+from hitlair.workers import WorkerPool
+
+NICK = "hitlair"
+SERVER = "irc.example.org"
+HOST = "test.example.org"
+PLUGIN = "hitlair.irc.SecretHitlerPlugin"
+CHANNEL = "#chan"
+NICKS = ["p0", "p1", "p2", "p3", "p4"]
+
+
+class Bot(irc3.IrcBot):
+    """A bot whose connection is a stand-in: lines sent are recorded."""
+
+    def __init__(self, **config):
+        super().__init__(**config)
+        self.sent: List[str] = []
+
+    def send(self, data: str):
+        self.sent.append(data)
+
+
+class Harness:
+    """A bot fed lines as if read from the server."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.bot = Bot(
+            loop=self.loop,
+            nick=NICK,
+            asynchronous=False,
+            includes=[
+                "irc3.plugins.core",
+                "irc3.plugins.userlist",
+                "irc3.plugins.command",
+                "hitlair.irc",
+            ],
+        )
+        sender = self.plugin.sender
+        # No flood control.
+        sender.rate = sender.burst = sender.tokens = 1e9
+
+    @property
+    def plugin(self) -> irc.SecretHitlerPlugin:
+        # A new instance after each reload.
+        return self.bot.get_plugin(PLUGIN)
+
+    @property
+    def table(self):
+        return self.plugin.registry.get(CHANNEL)
+
+    def settle(self, seconds: float = 0.01):
+        self.loop.run_until_complete(asyncio.sleep(seconds))
+
+    def dispatch(self, line: str):
+        self.bot.dispatch(line)
+        self.settle()
+
+    def messages(self) -> List[str]:
+        """Texts sent since the last call, split where they were coalesced."""
+        sent, self.bot.sent = self.bot.sent, []
+        return [
+            text
+            for line in sent
+            if line.startswith("PRIVMSG")
+            for text in line.split(" :", 1)[1].split(SEPARATOR)
+        ]
+
+    def bot_joins(self, names: str, channel: str = CHANNEL):
+        """The bot joins channel, NAMES listing names."""
+        self.bot.dispatch(f":{NICK}!{NICK}@{HOST} JOIN {channel}")
+        self.bot.dispatch(f":{SERVER} 353 {NICK} = {channel} :{names}")
+        self.settle()
+
+    def say(
+        self, nick: str, text: str, target: str = CHANNEL, user: Optional[str] = None
+    ):
+        self.dispatch(f":{nick}!{user or nick}@{HOST} PRIVMSG {target} :{text}")
+
+    def join(self, nick: str, user: Optional[str] = None):
+        self.dispatch(f":{nick}!{user or nick}@{HOST} JOIN {CHANNEL}")
+
+    def quit(self, nick: str, reason: str = "Quit: bye"):
+        self.dispatch(f":{nick}!{nick}@{HOST} QUIT :{reason}")
+
+    def open_table(self, channel: str = CHANNEL, nicks: List[str] = NICKS):
+        self.bot_joins(" ".join([f"@{NICK}", *nicks]), channel)
+        assert self.plugin.registry.get(channel).state is SetupState.ready
+
+    def start_game(self):
+        self.open_table()
+        for nick in NICKS:
+            self.say(nick, "!join")
+        self.say(NICKS[0], "!start")
+        assert self.table.game.stage is game.Stage.nominate_chancellor
+        self.messages()
+
+    def close(self):
+        self.plugin.workers.shutdown()
+        if self.plugin.store is not None:
+            self.plugin.store.close()
+        self.loop.close()
+
+
+@pytest.fixture
+def harness():
+    harness = Harness()
+    yield harness
+    harness.close()
+
+
+def test_opped_in_names(harness, monkeypatch):
+    # NAMES comes before the bot starts waiting for ops.
+    monkeypatch.setattr(irc, "OP_TIMEOUT", 0.001)
+    harness.bot_joins(f"@{NICK} p0")
+    assert harness.table.state is SetupState.ready
+    assert harness.messages() == ["WAIT FOR IT…", "MY BODY IS READY"]
+
+
+def test_opped_later(harness):
+    harness.bot_joins(f"{NICK} @p0")
+    table = harness.table
+    assert table.state is SetupState.pending_setup
+    harness.dispatch(f":p0!p0@{HOST} MODE {CHANNEL} +v-o+o p0 p0 p1")
+    assert table.state is SetupState.pending_setup
+    harness.dispatch(f":p0!p0@{HOST} MODE {CHANNEL} +vo p0 {NICK}")
+    assert table.state is SetupState.ready
+    assert harness.messages() == ["WAIT FOR IT…", "MY BODY IS READY"]
+
+
+def test_opped_in_names_with_server_prefixes(harness):
+    # STATUSMSG does not list every prefix.
+    harness.bot.server_config["PREFIX"] = "(qaohv)~&@%+"
+    harness.dispatch(f":{NICK}!{NICK}@{HOST} JOIN {CHANNEL}")
+    table = harness.table
+    assert table.state is SetupState.pending_setup
+    harness.dispatch(f":{SERVER} 353 {NICK} = {CHANNEL} :&p0 ~@{NICK} %p1")
+    assert table.state is SetupState.ready
+
+
+def test_asks_for_ops(harness, monkeypatch):
+    monkeypatch.setattr(irc, "OP_TIMEOUT", 0.01)
+    harness.bot_joins(NICK)
+    harness.settle(0.03)
+    table = harness.table
+    assert table.state is SetupState.pending_setup
+    assert harness.messages() == [
+        "WAIT FOR IT…",
+        "Il me faut les ops pour lancer des parties.",
+    ]
+    harness.dispatch(f":p0!p0@{HOST} MODE {CHANNEL} +o {NICK}")
+    assert table.state is SetupState.ready
+
+
+def test_seat_taken_back_by_same_nick(harness):
+    harness.start_game()
+    table = harness.table
+    harness.dispatch(f":p1!p1@{HOST} PART {CHANNEL}")
+    assert table.vacant == {"p1": f"p1@{HOST}"}
+    assert harness.plugin.registry.for_nick("p1") is None
+    assert harness.messages() == [
+        "p1 est parti, sa place est gardée 120 secondes. "
+        "Tapez !join pour prendre une place libre."
+    ]
+
+    harness.join("p1")
+    assert table.vacant == {}
+    assert (table, "vacant", "p1") not in harness.plugin.timers
+    assert harness.plugin.registry.for_nick("p1") is table
+    assert "p1 est de retour." in harness.messages()
+
+
+def test_seat_taken_back_by_same_host(harness, monkeypatch):
+    monkeypatch.setattr(irc, "BURST_WINDOW", 0.001)
+    harness.start_game()
+    table = harness.table
+    role = table.game.get_player("p2").role
+    harness.quit("p2")
+    harness.settle()
+    assert "p2" in table.vacant
+
+    harness.join("p2_", user="p2")
+    assert table.vacant == {}
+    assert "p2_ remplace p2." in harness.messages()
+    assert table.game.get_player("p2_").role is role
+    assert table.game.get_player("p2") not in table.game.alive_players
+    assert harness.plugin.registry.for_nick("p2_") is table
+
+
+def test_waiter_fills_seat_after_grace(harness, monkeypatch):
+    monkeypatch.setattr(irc, "REPLACEMENT_GRACE", 0.02)
+    harness.start_game()
+    table = harness.table
+    harness.join("w")
+    harness.say("w", "!join")
+    assert table.waiters == ["w"]
+    harness.dispatch(f":p3!p3@{HOST} PART {CHANNEL}")
+    assert "p3" in table.vacant
+
+    harness.settle(0.05)
+    assert table.vacant == {}
+    assert table.waiters == []
+    assert "w remplace p3." in harness.messages()
+    assert harness.plugin.registry.for_nick("w") is table
+
+    # Nobody waits for the next seat given up.
+    harness.dispatch(f":p4!p4@{HOST} PART {CHANNEL}")
+    harness.settle(0.05)
+    assert table.game.stage is game.Stage.lobby
+    assert "La partie est finie déso." in harness.messages()
+
+
+def test_netsplit_freezes_game_until_players_are_back(harness, monkeypatch):
+    monkeypatch.setattr(irc, "BURST_WINDOW", 0.02)
+    harness.start_game()
+    table = harness.table
+    timers = harness.plugin.timers
+    split = "irc.a.example.org irc.b.example.org"
+    for nick in ("p1", "p2"):
+        harness.bot.dispatch(f":{nick}!{nick}@{HOST} QUIT :{split}")
+    harness.settle(0.05)
+    assert table.paused
+    assert table.split == {"p1", "p2"}
+    assert (table, "deadline") not in timers
+    assert harness.messages() == [
+        "Netsplit ! La partie reprendra au retour de p1, p2."
+    ]
+    president = table.game.president.name
+    candidate = next(nick for nick in NICKS if nick != president)
+    harness.say(president, f"!chancellor {candidate}")
+    assert table.game.stage is game.Stage.nominate_chancellor
+
+    harness.join("p1")
+    harness.settle(0.05)
+    assert table.paused
+    assert table.split == {"p2"}
+    assert harness.messages() == ["De retour : p1."]
+
+    harness.join("p2")
+    harness.settle(0.05)
+    assert not table.paused
+    assert table.vacant == {}
+    assert (table, "deadline") in timers
+    assert harness.messages() == [
+        "De retour : p2.",
+        "Tout le monde est là, on reprend !",
+    ]
+
+
+def test_deadline_finds_nothing_to_play(harness, monkeypatch):
+    harness.start_game()
+    table = harness.table
+    monkeypatch.setattr(sim, "decide", lambda state, strategy: False)
+    harness.plugin.stage_deadline(table)
+    harness.settle()
+    assert table.game.stage is game.Stage.lobby
+    assert harness.messages() == [
+        "Trop lent ! Je décide à votre place.",
+        "Temps écoulé, et je ne trouve rien à jouer à votre place.",
+        "La partie est finie déso.",
+        "MY BODY IS READY",
+    ]
+
+
+def test_reload_keeps_games_playable(harness, restore_modules):
+    harness.start_game()
+    table = harness.table
+    old_plugin = harness.plugin
+
+    harness.say("p0", "!reloadpls")
+    plugin = harness.plugin
+    assert plugin is not old_plugin
+    assert type(table.game) is game.State
+
+    plugin.stage_deadline(table)
+    harness.settle()
+    assert table.game.stage is game.Stage.chancellor_election
+    assert len(ai.waiting_seats(table.game)) == len(NICKS)
+    assert "La partie est finie déso." not in harness.messages()
+    # A player votes, rather than the deadline deciding.
+    harness.say("p0", "!yes", target=NICK)
+    assert len(table.game.votes) == 1
+
+
+def test_join_one_table_at_a_time(harness):
+    harness.open_table()
+    harness.say("p0", "!join")
+    harness.open_table("#other", ["p0"])
+    harness.messages()
+
+    harness.say("p0", "!join", target="#other")
+    assert harness.messages() == ["p0: ASH DAS IST KEINE POßIBL"]
+    other = harness.plugin.registry.get("#other")
+    assert other.game.players == []
+    assert harness.plugin.registry.for_nick("p0") is harness.table
+
+    harness.say("p0", "!part")
+    harness.say("p0", "!join", target="#other")
+    assert [p.name for p in other.game.players] == ["p0"]
+    assert harness.plugin.registry.for_nick("p0") is other
+
+
+def start_bot_game(harness, monkeypatch, decide):
+    """Starts a game with a bot, whose searches call decide in a thread."""
+    monkeypatch.setattr(ai, "decide", decide)
+    plugin = harness.plugin
+    plugin.workers.shutdown()
+    executor = concurrent.futures.ThreadPoolExecutor(1)
+    plugin.workers = WorkerPool(harness.loop, executor=executor)
+    harness.open_table()
+    for nick in NICKS[:-1]:
+        harness.say(nick, "!join")
+    harness.say(NICKS[0], "!addbot")
+    harness.say(NICKS[0], "!start")
+    table = harness.table
+    if table.game.stage is game.Stage.nominate_chancellor:
+        # The bot was not president: it has to vote.
+        plugin.stage_deadline(table)
+        harness.settle()
+    return table
+
+
+def test_bot_search_fails(harness, monkeypatch):
+    def decide(*args):
+        raise game.IllegalState()
+
+    table = start_bot_game(harness, monkeypatch, decide)
+    assert table.game.stage is game.Stage.lobby
+    messages = harness.messages()
+    assert messages[-3:-1] == [
+        f"{ai.bot_name(1)} ne trouve rien à jouer.",
+        "La partie est finie déso.",
+    ]
+    assert not table.thinking
+
+
+def test_bot_worker_dies(harness, monkeypatch):
+    def decide(*args):
+        raise BrokenProcessPool()
+
+    table = start_bot_game(harness, monkeypatch, decide)
+    # The bot decided at random, whether it had to nominate first or not.
+    assert table.game.stage is game.Stage.chancellor_election
+    assert ai.bot_name(1) in {p.name for p in table.game.votes}
+
+
+def test_actions_are_shown(harness):
+    harness.start_game()
+    table = harness.table
+    players = table.game.players
+    hitler = next(p for p in players if p.role is game.Role.hitler)
+    president = next(p for p in players if p is not hitler)
+    for event in (
+        game.ChancellorVetoes(president, hitler),
+        game.ChancellorEnacts(hitler, game.Policy.fascist),
+        game.ChaosHappens(game.Policy.liberal),
+        game.PresidentInvestigates(president, hitler),
+        game.PresidentKills(president, hitler),
+        game.HitlerIsElectedChancellor(president, hitler),
+    ):
+        harness.plugin.dispatcher.dispatch(table, event)
+    harness.settle()
+
+    # Only the president learns what the investigation found.
+    result = f"{hitler.name} est un fascho."
+    assert f"PRIVMSG {president.name} :{result}" in harness.bot.sent
+    messages = harness.messages()
+    messages.remove(result)
+    assert messages == [
+        f"{hitler.name} demande un veto, "
+        f"{president.name} doit l'accepter ou le refuser.",
+        f"{hitler.name} adopte une loi fasciste.",
+        "Trois échecs de suite, c'est le chaos ! "
+        "La loi du dessus de la pioche est adoptée : libérale.",
+        f"{president.name} a enquêté sur {hitler.name}.",
+        f"{president.name} a exécuté {hitler.name}.",
+        f"{hitler.name} est chancelier, et c'est LITTÉRALEMENT HITLER !",
+    ]
+
+
+def test_restored_game_goes_on(tmp_path, monkeypatch):
+    path = str(tmp_path / "games")
+    state = game.State()
+    for nick in NICKS:
+        state.add_player(game.Player(nick))
+    state.advance()
+    store = SnapshotStore(path)
+    store.save(CHANNEL, state)
+    store.close()
+    monkeypatch.setattr(irc, "STATE_FILE", path)
+
+    harness = Harness()
+    try:
+        table = harness.table
+        assert table.state is SetupState.restored
+        harness.open_table()
+        assert table.game.stage is game.Stage.nominate_chancellor
+        # Players keep their voice.
+        assert not any(line.startswith("MODE") for line in harness.bot.sent)
+        assert harness.messages() == ["WAIT FOR IT…", "On reprend où on en était !"]
+    finally:
+        harness.close()
+
+
+def test_game_too_long_to_store(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(irc, "STATE_FILE", str(tmp_path / "games"))
+    monkeypatch.setattr(persistence, "JOURNAL_CAPACITY", 8)
+    harness = Harness()
+    try:
+        harness.start_game()
+        assert "Game in #chan too long to be stored" in caplog.messages
+        assert harness.plugin.store.load() == {}
+    finally:
+        harness.close()
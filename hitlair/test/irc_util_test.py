@@ -0,0 +1,134 @@
+import pytest
+
+from hitlair.irc_util import (
+    ModeBatcher,
+    encode_modes,
+    is_netsplit,
+    mode_limits,
+    mode_parser,
+    parse_modes,
+    prefix_modes,
+)
+
+
+def test_encode_modes_groups_signs():
+    assert list(encode_modes("#chan", "-m", ("-v", "a"), ("-v", "b"))) == [
+        ["-vvm", "a", "b"]
+    ]
+    assert list(encode_modes("#chan", ("+v", "a"), ("-v", "b"))) == [
+        ["+v-v", "a", "b"]
+    ]
+    assert list(encode_modes("#chan")) == []
+
+
+@pytest.mark.parametrize("max_modes", [1, 3, 4, 10])
+def test_encode_modes_respects_max_modes(max_modes):
+    nicks = [f"nick{i}" for i in range(25)]
+    lines = list(
+        encode_modes("#chan", *(("+v", n) for n in nicks), max_modes=max_modes)
+    )
+    assert all(len(line) - 1 <= max_modes for line in lines)
+    assert len(lines) == -(-len(nicks) // max_modes)
+    assert [v for line in lines for v in line[1:]] == sorted(nicks)
+
+
+def test_encode_modes_respects_line_length():
+    nicks = [f"{i:02}" + "x" * 28 for i in range(50)]
+    lines = list(encode_modes("#chan", *(("-v", n) for n in nicks), max_modes=None))
+    assert len(lines) > 1
+    for line in lines:
+        assert len(f"MODE #chan {' '.join(line)}\r\n") <= 512 - 100
+    assert [v for line in lines for v in line[1:]] == nicks
+
+
+def test_mode_limits():
+    assert mode_limits({}) == (3, 512)
+    assert mode_limits({"MODES": "6", "LINELEN": "1024"}) == (6, 1024)
+    assert mode_limits({"MODES": True}) == (None, 512)
+
+
+class FakeLoop:
+    def __init__(self):
+        self.callbacks = []
+
+    def call_soon(self, callback):
+        self.callbacks.append(callback)
+        return callback
+
+    def run_once(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+def test_mode_batcher_flushes_once_per_tick():
+    sent = []
+    loop = FakeLoop()
+    batcher = ModeBatcher(
+        lambda target, *data: sent.append((target, *data)),
+        loop,
+        lambda: {"MODES": "4"},
+    )
+    batcher.push("#a", ("+v", "x"))
+    batcher.push("#b", "-m", ("-v", "y"))
+    batcher.push("#a", ("+v", "z"))
+    batcher.push("#a", ("-v", "x"))
+    assert sent == []
+    assert len(loop.callbacks) == 1
+    loop.run_once()
+    assert sent == [("#a", "+v-v", "z", "x"), ("#b", "-vm", "y")]
+
+
+SERVER_CONFIG = {"CHANMODES": "eIbq,k,flj,CFLMPQScgimnprstz", "PREFIX": "(ov)@+"}
+
+
+def test_parse_modes():
+    assert parse_modes(SERVER_CONFIG, "+ov-m+l", ["a", "b", "10"]) == [
+        (True, "o", "a"),
+        (True, "v", "b"),
+        (False, "m", None),
+        (True, "l", "10"),
+    ]
+    # l only takes a parameter when set, k and b always do.
+    assert parse_modes(SERVER_CONFIG, "-lkb", ["key", "*!*@host"]) == [
+        (False, "l", None),
+        (False, "k", "key"),
+        (False, "b", "*!*@host"),
+    ]
+    with pytest.raises(ValueError):
+        parse_modes(SERVER_CONFIG, "m", [])
+
+
+def test_mode_parser_is_cached_per_server_config():
+    assert mode_parser(SERVER_CONFIG) is mode_parser(dict(SERVER_CONFIG))
+    changed = dict(SERVER_CONFIG, PREFIX="(qaohv)~&@%+")
+    assert mode_parser(changed) is not mode_parser(SERVER_CONFIG)
+    assert parse_modes(changed, "+h", ["a"]) == [(True, "h", "a")]
+
+
+def test_prefix_modes():
+    assert prefix_modes(SERVER_CONFIG) == {"@": "o", "+": "v"}
+    assert prefix_modes({"PREFIX": "(qaohv)~&@%+"}) == {
+        "~": "q",
+        "&": "a",
+        "@": "o",
+        "%": "h",
+        "+": "v",
+    }
+    assert prefix_modes({}) == {}
+
+
+@pytest.mark.parametrize(
+    "reason, netsplit",
+    [
+        ("*.net *.split", True),
+        ("hub.example.net leaf.example.org", True),
+        ("Quit: *.net *.split", False),
+        ("Ping timeout: 240 seconds", False),
+        ("Remote host closed the connection", False),
+        ("", False),
+        (None, False),
+    ],
+)
+def test_is_netsplit(reason, netsplit):
+    assert is_netsplit(reason) is netsplit
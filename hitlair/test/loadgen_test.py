@@ -0,0 +1,31 @@
+import cProfile
+import pstats
+import random
+
+from hitlair import loadgen
+
+COMMANDS = ("join", "start", "chancellor", "yes", "no", "deadline")
+
+
+def test_percentile():
+    values = [5, 1, 4, 2, 3]
+    assert loadgen.percentile(values, 50) == 3
+    assert loadgen.percentile(values, 99) == 5
+    assert loadgen.percentile(values, 0) == 1
+    assert loadgen.percentile([0.5], 99) == 0.5
+
+
+def test_games_complete():
+    profiler = cProfile.Profile()
+    report = loadgen.run(3, 2, 5, random.Random(0), profiler=profiler)
+    # Games may stall (see sim.decide()), not time out.
+    assert (report.games, report.timeouts) == (3, 0)
+    assert len(report.latencies["join"]) == 15
+    assert len(report.latencies["start"]) == 3
+    assert {"chancellor", "deadline"} <= set(report.latencies)
+    assert report.latencies.keys() <= set(COMMANDS)
+    assert all(min(latencies) >= 0 for latencies in report.latencies.values())
+    assert report.commands_per_second > 0
+
+    profiled = {function for _, _, function in pstats.Stats(profiler).stats}
+    assert "stage_deadline" in profiled
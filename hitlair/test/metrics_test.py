@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from hitlair.metrics import Metrics, dump, serve
+
+
+@pytest.fixture
+def metrics():
+    return Metrics("test")
+
+
+def test_counter(metrics):
+    counter = metrics.counter("events_total", "Events.", ["type"])
+    counter.inc("b")
+    counter.inc("a", amount=2)
+    counter.inc("b")
+    assert metrics.render() == (
+        "# HELP test_events_total Events.\n"
+        "# TYPE test_events_total counter\n"
+        'test_events_total{type="a"} 2\n'
+        'test_events_total{type="b"} 2\n'
+    )
+
+
+def test_histogram(metrics):
+    histogram = metrics.histogram("seconds", "Time.", ["stage"], buckets=[1, 0.1])
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, "lobby")
+    assert histogram.timed(lambda x: x * 2, "enact")(21) == 42
+    lines = metrics.render().splitlines()
+    assert lines[2:5] == [
+        'test_seconds_bucket{stage="enact",le="0.1"} 1',
+        'test_seconds_bucket{stage="enact",le="1"} 1',
+        'test_seconds_bucket{stage="enact",le="+Inf"} 1',
+    ]
+    assert lines[5].startswith('test_seconds_sum{stage="enact"} ')
+    assert lines[6] == 'test_seconds_count{stage="enact"} 1'
+    assert lines[7:] == [
+        'test_seconds_bucket{stage="lobby",le="0.1"} 2',
+        'test_seconds_bucket{stage="lobby",le="1"} 3',
+        'test_seconds_bucket{stage="lobby",le="+Inf"} 4',
+        'test_seconds_sum{stage="lobby"} 3.65',
+        'test_seconds_count{stage="lobby"} 4',
+    ]
+
+
+def test_gauge(metrics):
+    depth = [3]
+    metrics.gauge("depth", "Depth.", collect=lambda: depth[0])
+    games = metrics.gauge("games", "Games.", ["stage"])
+    games.set(2, "lobby")
+    jobs = {("a",): 1, ("b\n",): 0}
+    metrics.gauge("jobs", "Jobs.", ["pool"], collect=lambda: jobs)
+    depth[0] = 5
+    rendered = metrics.render()
+    assert "test_depth 5\n" in rendered
+    assert 'test_games{stage="lobby"} 2\n' in rendered
+    assert 'test_jobs{pool="a"} 1\ntest_jobs{pool="b\\n"} 0\n' in rendered
+
+
+def test_duplicate_names(metrics):
+    metrics.counter("x", "X.")
+    with pytest.raises(ValueError):
+        metrics.gauge("x", "X.")
+
+
+def test_dump(metrics, tmp_path):
+    metrics.counter("x", "X.").inc()
+    path = tmp_path / "metrics.prom"
+    dump(metrics, str(path))
+    assert path.read_text() == metrics.render()
+
+
+def test_serve(metrics):
+    metrics.counter("x", "X.").inc()
+
+    async def get(port, path):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.0\r\nHost: localhost\r\n\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        return response.decode()
+
+    async def main():
+        server = await serve(metrics, 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await get(port, "/metrics"), await get(port, "/")
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    found, not_found = asyncio.run(main())
+    assert found.startswith("HTTP/1.0 200 OK\r\n")
+    assert found.endswith("\r\n\r\n" + metrics.render())
+    assert not_found.startswith("HTTP/1.0 404 Not Found\r\n")
@@ -0,0 +1,113 @@
+import random
+
+import pytest
+
+from hitlair import game, persistence, sim
+from hitlair.persistence import (
+    HEADER,
+    INITIAL_RECORDS,
+    MAGIC,
+    RECORD_SIZE,
+    SnapshotStore,
+)
+
+
+def play(state: game.State, rng: random.Random, stop):
+    strategy = sim.RandomStrategy(rng)
+    for _ in sim.play_until(state, strategy, stop):
+        pass
+
+
+def test_games_survive_restart(tmp_path):
+    path = str(tmp_path / "games")
+    store = SnapshotStore(path)
+
+    states = {}
+    for i in range(3):
+        rng = random.Random(i)
+        state = states[f"#chan{i}"] = sim.new_game(7, rng)
+        play(state, rng, lambda s: s.fascist_policies + s.liberal_policies >= 2)
+        assert store.save(f"#chan{i}", state)
+    # Incremental saves.
+    play(states["#chan0"], random.Random(10), lambda s: s.stage is game.Stage.enact)
+    store.save("#chan0", states["#chan0"])
+    store.close()
+
+    loaded = SnapshotStore(path).load()
+    assert loaded.keys() == states.keys()
+    for channel, state in states.items():
+        assert list(loaded[channel].journal) == list(state.journal)
+        assert loaded[channel].stage is state.stage
+        assert loaded[channel].policy_deck == state.policy_deck
+
+
+def test_finished_games_free_their_record(tmp_path):
+    store = SnapshotStore(str(tmp_path / "games"))
+    rng = random.Random(0)
+    for i in range(INITIAL_RECORDS + 1):
+        state = sim.new_game(5, rng)
+        play(state, rng, lambda s: s.stage is game.Stage.legislate)
+        store.save(f"#chan{i}", state)
+    assert store.record_count == 2 * INITIAL_RECORDS
+
+    store.discard("#chan0")
+    state.reset()
+    store.save("#chan1", state)
+    assert set(store.load()) == {f"#chan{i}" for i in range(2, INITIAL_RECORDS + 1)}
+
+
+def save_games(store, count):
+    states = {}
+    for i in range(count):
+        rng = random.Random(i)
+        state = states[f"#chan{i}"] = sim.new_game(5, rng)
+        play(state, rng, lambda s: s.stage is game.Stage.legislate)
+        assert store.save(f"#chan{i}", state)
+    return states
+
+
+def test_corrupt_records_are_dropped(tmp_path):
+    path = str(tmp_path / "games")
+    store = SnapshotStore(path)
+    save_games(store, 3)
+    slots = dict(store.slots)
+    # Garbage events, a length past the record, an undecodable channel name.
+    start = slots["#chan0"] * RECORD_SIZE + HEADER.size
+    store.map[start : start + 8] = b"\xfe" * 8
+    for channel, name, length in (("#chan1", b"#chan1", 9999), ("#chan2", b"\xff", 0)):
+        offset = slots[channel] * RECORD_SIZE
+        HEADER.pack_into(store.map, offset, MAGIC, len(name), length, name)
+    store.close()
+
+    store = SnapshotStore(path)
+    assert store.load() == {}
+    assert store.slots == {}
+    assert store.free_slots == list(reversed(range(INITIAL_RECORDS)))
+    assert SnapshotStore(path).load() == {}
+
+
+def test_new_game_invalidates_record_before_rewrite(tmp_path, monkeypatch):
+    path = str(tmp_path / "games")
+    store = SnapshotStore(path)
+    save_games(store, 1)
+
+    class Crash(Exception):
+        pass
+
+    class CrashingHeader:
+        size = HEADER.size
+        unpack_from = HEADER.unpack_from
+
+        def pack_into(self, *args):
+            raise Crash()
+
+    # A new game, which crashes right after its journal is written.
+    monkeypatch.setattr(persistence, "HEADER", CrashingHeader())
+    state = sim.new_game(5, random.Random(10))
+    play(state, random.Random(10), lambda s: s.stage is game.Stage.legislate)
+    with pytest.raises(Crash):
+        store.save("#chan0", state)
+    monkeypatch.undo()
+    store.close()
+
+    assert SnapshotStore(path).load() == {}
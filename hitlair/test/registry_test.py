@@ -0,0 +1,69 @@
+import pytest
+
+from hitlair import game
+from hitlair.registry import Registry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_tables_by_channel():
+    registry = Registry()
+    table = registry.open("#Chan")
+    assert registry.open("#chan") is table
+    assert registry.get("#CHAN") is table
+    assert "#chan" in registry
+    assert registry.get("#other") is None
+    assert list(registry) == [table]
+
+    assert registry.close("#chan") is table
+    assert registry.close("#chan") is None
+    assert len(registry) == 0
+
+
+def test_nick_plays_at_one_table():
+    registry = Registry()
+    first, second = registry.open("#first"), registry.open("#second")
+    registry.bind("alice", first)
+    registry.bind("alice", first)
+    registry.bind("bob", second)
+    with pytest.raises(game.InvalidAction):
+        registry.bind("alice", second)
+    assert registry.for_nick("alice") is first
+    assert second.nicks == {"bob"}
+
+    registry.unbind("alice")
+    assert registry.for_nick("alice") is None
+    registry.bind("alice", second)
+
+    registry.close("#second")
+    assert registry.for_nick("alice") is None
+    assert registry.for_nick("bob") is None
+    assert first.nicks == set()
+
+
+def test_release_keeps_other_tables():
+    registry = Registry()
+    first, second = registry.open("#first"), registry.open("#second")
+    registry.bind("alice", first)
+    registry.bind("bob", second)
+    registry.release(first)
+    assert registry.for_nick("alice") is None
+    assert registry.for_nick("bob") is second
+
+
+def test_evict_idle_lobbies():
+    clock = Clock()
+    registry = Registry(clock)
+    idle, busy, touched = (registry.open(c) for c in ("#idle", "#busy", "#touched"))
+    busy.game.add_player(game.Player("alice"))
+    clock.now = 50
+    registry.touch(touched)
+    clock.now = 101
+    assert registry.evict_idle(100) == [idle]
+    assert list(registry) == [busy, touched]
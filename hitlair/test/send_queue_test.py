@@ -0,0 +1,72 @@
+from hitlair.send_queue import LINE_LIMIT, SendQueue
+
+
+class FakeLoop:
+    def __init__(self):
+        self.now = 0.0
+        self.callbacks = []
+
+    def time(self):
+        return self.now
+
+    def call_soon(self, callback):
+        return self.call_later(0, callback)
+
+    def call_later(self, delay, callback):
+        handle = (self.now + delay, callback)
+        self.callbacks.append(handle)
+        return handle
+
+    def run_until(self, when):
+        while True:
+            due = [c for c in self.callbacks if c[0] <= when]
+            if not due:
+                break
+            handle = min(due, key=lambda c: c[0])
+            self.callbacks.remove(handle)
+            self.now = max(self.now, handle[0])
+            handle[1]()
+        self.now = when
+
+
+def make_queue(**kwargs):
+    sent = []
+    loop = FakeLoop()
+    queue = SendQueue(lambda target, text: sent.append((target, text)), loop, **kwargs)
+    return queue, loop, sent
+
+
+def test_messages_of_one_tick_are_coalesced():
+    queue, loop, sent = make_queue()
+    queue.push("#chan", "a")
+    queue.push("#chan", "b")
+    queue.push("#other", "c")
+    assert sent == []
+    loop.run_until(0)
+    assert sent == [("#chan", "a | b"), ("#other", "c")]
+    assert queue.coalesced == 1
+
+
+def test_coalesced_lines_fit_the_limit():
+    queue, loop, sent = make_queue()
+    for _ in range(10):
+        queue.push("#chan", "x" * 100)
+    loop.run_until(0)
+    assert len(sent) > 1
+    assert all(len(text.encode()) < LINE_LIMIT for _, text in sent)
+    assert sum(text.count("x") for _, text in sent) == 1000
+
+
+def test_rate_limit_and_private_priority():
+    queue, loop, sent = make_queue(rate=1.0, burst=2)
+    for i in range(4):
+        queue.push(f"#chan{i}", "public")
+    loop.run_until(0)
+    assert len(sent) == 2
+    queue.push("nick", "secret", private=True)
+    loop.run_until(1)
+    assert sent[2] == ("nick", "secret")
+    loop.run_until(3)
+    assert len(sent) == 5
+    assert queue.depth == 0
+    assert queue.metrics()["latency_max"] == 3
@@ -0,0 +1,60 @@
+"""
+Throughput benchmarks, run with pytest-benchmark:
+
+    python -m pytest hitlair/test/sim_bench_test.py --benchmark-only
+"""
+
+import random
+
+import pytest
+
+from hitlair import sim
+from hitlair.game import Stage
+
+pytest.importorskip("pytest_benchmark")
+
+PLAYER_COUNT = 7
+ROUNDS = 300
+
+
+def reach(stage: Stage):
+    """Returns a benchmark setup playing a fresh random game up to stage."""
+    rng = random.Random(0)
+
+    def setup():
+        while True:
+            state = sim.new_game(PLAYER_COUNT, random.Random(rng.random()))
+            strategy = sim.RandomStrategy(random.Random(rng.random()))
+            for _ in sim.play_until(state, strategy, lambda s: s.stage is stage):
+                pass
+            if state.stage is stage and sim.decide(state, strategy):
+                return (state,), {}
+
+    return setup
+
+
+@pytest.mark.parametrize("strategy_cls", [sim.RandomStrategy, sim.HeuristicStrategy])
+def test_full_game(benchmark, strategy_cls):
+    strategy = strategy_cls(random.Random(0))
+    benchmark(sim.play_game, PLAYER_COUNT, strategy, random.Random(1))
+
+
+def test_exit_chancellor_election(benchmark):
+    benchmark.pedantic(
+        lambda state: list(state.exit_chancellor_election()),
+        setup=reach(Stage.chancellor_election),
+        rounds=ROUNDS,
+    )
+
+
+def test_exit_enact(benchmark):
+    benchmark.pedantic(
+        lambda state: list(state.exit_enact()), setup=reach(Stage.enact), rounds=ROUNDS,
+    )
+
+
+def test_enact_outcome(benchmark):
+    def enact_outcome(state):
+        return list(state._enact_outcome(state.policy_deck[-1]))
+
+    benchmark.pedantic(enact_outcome, setup=reach(Stage.enact), rounds=ROUNDS)
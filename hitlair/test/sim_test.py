@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from hitlair import game, sim, stats
+from hitlair.game import Policy, Role, Stage
+
+
+@pytest.mark.parametrize("player_count", sorted(game.PLAYER_COUNT_TO_LIBERAL_COUNT))
+@pytest.mark.parametrize("strategy_cls", [sim.RandomStrategy, sim.HeuristicStrategy])
+def test_games_complete(player_count, strategy_cls):
+    strategy = strategy_cls(random.Random(player_count))
+    for _ in range(20):
+        result = sim.play_game(player_count, strategy)
+        assert result.player_count == player_count
+        assert result.rounds > 0
+        if result.hitler_elected:
+            assert result.winner is Role.fascist
+
+
+def test_scripted_strategy_follows_script():
+    strategy = sim.ScriptedStrategy([], random.Random(0))
+    assert strategy.president_discard(None, None, [Policy.fascist]) is Policy.fascist
+
+    strategy = sim.ScriptedStrategy([Policy.liberal, True], random.Random(0))
+    assert strategy.president_discard(None, None, [Policy.fascist]) is Policy.liberal
+    assert strategy.vote(None, None) is True
+
+
+def test_play_until_stops():
+    state = sim.new_game(5)
+    strategy = sim.RandomStrategy(random.Random(0))
+    for _ in sim.play_until(state, strategy, lambda s: s.stage is Stage.legislate):
+        pass
+    assert state.stage in (Stage.legislate, Stage.lobby)
+
+
+def test_tally():
+    results = [
+        sim.GameResult(5, Role.liberal, False, 1, 4),
+        sim.GameResult(5, Role.fascist, True, 0, 6),
+        sim.GameResult(5, None, False, 0, 3),
+    ]
+    counts = sim.tally(results)
+    assert counts["games"] == 3
+    assert counts["liberal_wins"] == 1
+    assert counts["fascist_wins"] == 1
+    assert counts["hitler_chancellor_wins"] == 1
+    assert counts["games_with_chaos"] == 1
+    assert counts["stalled"] == 1
+    assert counts["rounds"] == 13
+
+
+def test_run_reports_throughput():
+    report = sim.run(10, 7, sim.RandomStrategy(random.Random(0)))
+    assert report.counts["games"] == 10
+    assert report.games_per_second > 0
+
+
+def test_stats_chunks_cover_all_games():
+    chunks = list(stats.chunks(1, 25, [5, 6], chunk_size=10))
+    assert [c.games for c in chunks] == [10, 10, 5, 10, 10, 5]
+    assert len({c.seed for c in chunks}) == len(chunks)
+
+
+def test_stats_reproducible_from_master_seed():
+    one = stats.run(7, 30, [5, 8], workers=1, chunk_size=10)
+    two = stats.run(7, 30, [5, 8], workers=2, chunk_size=10)
+    assert one == two
+    assert one[5]["games"] == one[8]["games"] == 30
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from hitlair import game, sim
+from hitlair.snapshot import NO_SEAT, ActionKind, Snapshot, perform, seats
+
+
+def named_view(snapshot: Snapshot, names):
+    def name(seat):
+        return None if seat == NO_SEAT else names[seat]
+
+    view = {
+        field: name(getattr(snapshot, field))
+        for field in (
+            "president",
+            "cycle_president",
+            "chancellor",
+            "former_president",
+            "former_chancellor",
+        )
+    }
+    view.update(
+        stage=snapshot.stage,
+        roles={names[i]: role for i, role in enumerate(snapshot.roles)},
+        alive={names[i] for i in range(len(names)) if snapshot.alive >> i & 1},
+        voted={names[i] for i in range(len(names)) if snapshot.voted >> i & 1},
+        yes={names[i] for i in range(len(names)) if snapshot.yes >> i & 1},
+        board=(
+            snapshot.failed_votes,
+            snapshot.liberal_policies,
+            snapshot.fascist_policies,
+        ),
+        veto=snapshot.veto,
+        deck=snapshot.deck,
+        discarded=(snapshot.discarded_liberals, snapshot.discarded_fascists),
+    )
+    return view
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_apply_follows_state(seed):
+    rng = random.Random(seed)
+    state = sim.new_game(rng.choice([5, 7, 9]), random.Random(seed))
+    state.advance(game.Stage.lobby)
+
+    while state.stage is not game.Stage.lobby:
+        snapshot = Snapshot.from_state(state)
+        actions = snapshot.legal_actions()
+        if not actions:
+            # Stalled game, see sim.decide().
+            break
+        action = rng.choice(actions)
+        names = [p.name for p in seats(state)]
+
+        expected = snapshot.apply(action, random.Random(0))
+        events = perform(state, action)
+
+        if any(isinstance(e, game.PolicyDeckShuffles) for e in events):
+            # The snapshot shuffled with another generator.
+            continue
+        if state.stage is game.Stage.lobby:
+            assert expected.is_over
+            winner = game.Policy(expected.winner)
+            if winner is game.Policy.liberal:
+                assert game.LiberalsWin() in events
+            else:
+                assert game.FascistsWin() in events
+            break
+        after = Snapshot.from_state(state)
+        assert named_view(expected, names) == named_view(
+            after, [p.name for p in seats(state)]
+        )
+
+
+def test_snapshots_are_hashable_values(example_players):
+    state = game.State(random.Random(1))
+    [state.add_player(p) for p in example_players]
+    state.advance()
+    snapshot = Snapshot.from_state(state)
+    assert Snapshot.from_state(state) == snapshot
+    assert len({snapshot, Snapshot.from_state(state)}) == 1
+
+    nominate = snapshot.legal_actions()[0]
+    assert nominate.kind is ActionKind.nominate
+    after = snapshot.apply(nominate)
+    assert after != snapshot
+    assert after.stage == game.Stage.chancellor_election.value
+    # The original is untouched.
+    assert snapshot.chancellor == NO_SEAT
+    with pytest.raises(AttributeError):
+        snapshot.president = 0
@@ -0,0 +1,109 @@
+import random
+
+from hitlair.timers import DeadlineScheduler
+
+
+class FakeHandle:
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeLoop:
+    def __init__(self):
+        self.now = 0.0
+        self.handles = []
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback):
+        handle = FakeHandle(when, callback)
+        self.handles.append(handle)
+        return handle
+
+    def advance(self, to):
+        while True:
+            due = [h for h in self.handles if not h.cancelled and h.when <= to]
+            if not due:
+                break
+            handle = min(due, key=lambda h: h.when)
+            self.handles.remove(handle)
+            self.now = handle.when
+            handle.callback()
+        self.now = to
+
+    @property
+    def pending(self):
+        return [h for h in self.handles if not h.cancelled]
+
+
+def test_deadlines_fire_in_order():
+    loop = FakeLoop()
+    timers = DeadlineScheduler(loop)
+    fired = []
+    timers.schedule("b", 2, fired.append, "b")
+    timers.schedule("a", 1, fired.append, "a")
+    timers.schedule("c", 3, fired.append, "c")
+    assert len(loop.pending) == 1
+    loop.advance(2)
+    assert fired == ["a", "b"]
+    assert len(timers) == 1 and "c" in timers
+    loop.advance(10)
+    assert fired == ["a", "b", "c"]
+    assert not loop.pending
+
+
+def test_reschedule_and_cancel():
+    loop = FakeLoop()
+    timers = DeadlineScheduler(loop)
+    fired = []
+    timers.schedule("a", 1, fired.append, "first")
+    timers.schedule("a", 5, fired.append, "second")
+    assert timers.when("a") == 5
+    timers.schedule("b", 2, fired.append, "b")
+    assert timers.cancel("b")
+    assert not timers.cancel("b")
+    loop.advance(4)
+    assert fired == []
+    loop.advance(5)
+    assert fired == ["second"]
+    assert len(timers) == 0
+
+
+def test_callbacks_can_reschedule_themselves():
+    loop = FakeLoop()
+    timers = DeadlineScheduler(loop)
+    fired = []
+
+    def tick():
+        fired.append(loop.time())
+        timers.schedule("tick", 1, tick)
+
+    timers.schedule("tick", 1, tick)
+    loop.advance(3)
+    assert fired == [1, 2, 3]
+
+
+def test_many_deadlines():
+    loop = FakeLoop()
+    timers = DeadlineScheduler(loop)
+    rng = random.Random(42)
+    fired = []
+    keys = range(5000)
+    for key in keys:
+        timers.schedule(key, rng.uniform(0, 100), fired.append, key)
+    for key in keys[::2]:
+        timers.schedule(key, rng.uniform(0, 100), fired.append, key)
+    for key in keys[::3]:
+        timers.cancel(key)
+    # Stale entries are compacted away.
+    assert len(timers._heap) <= 2 * len(timers) + 16
+    expected = sorted((timers.when(key), key) for key in keys if key in timers)
+    loop.advance(100)
+    assert fired == [key for _, key in expected]
+    assert len(loop.handles) < 100
@@ -0,0 +1,95 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from hitlair import ai, game, sim
+from hitlair.snapshot import ActionKind, Snapshot
+from hitlair.workers import Overloaded, WorkerPool
+
+
+def test_runs_jobs_in_processes():
+    async def main():
+        pool = WorkerPool(asyncio.get_running_loop(), workers=2)
+        try:
+            state = sim.new_game(5)
+            state.advance(game.Stage.lobby)
+            snapshot = Snapshot.from_state(state)
+            config = ai.SearchConfig(max_iterations=10)
+            results = await asyncio.gather(
+                pool.submit("a", pow, 2, 10),
+                pool.submit("b", ai.decide, snapshot, snapshot.to_move, config),
+            )
+            assert len(pool) == 0
+            return results
+        finally:
+            pool.shutdown()
+
+    power, action = asyncio.run(main())
+    assert power == 1024
+    assert action.kind is ActionKind.nominate
+
+
+def blocked_pool(loop, **kwargs):
+    release = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(1)
+    pool = WorkerPool(loop, executor=executor, **kwargs)
+    return pool, release
+
+
+def test_backpressure():
+    async def main():
+        pool, release = blocked_pool(
+            asyncio.get_running_loop(), max_running=1, max_pending=3
+        )
+        jobs = [pool.submit("a", release.wait) for _ in range(3)]
+        with pytest.raises(Overloaded):
+            pool.submit("b", release.wait)
+        await asyncio.sleep(0.01)
+        assert (pool.pending, pool.running) == (3, 1)
+        release.set()
+        await asyncio.gather(*jobs)
+        assert (pool.pending, pool.running) == (0, 0)
+        assert await pool.submit("b", pow, 3, 2) == 9
+        pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_cancel_group():
+    async def main():
+        pool, release = blocked_pool(asyncio.get_running_loop(), max_running=1)
+        running = pool.submit("a", release.wait)
+        queued = pool.submit("a", pow, 2, 2)
+        other = pool.submit("b", pow, 3, 3)
+        await asyncio.sleep(0.01)
+
+        assert pool.cancel("a") == 2
+        assert pool.cancel("a") == 0
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        with pytest.raises(asyncio.CancelledError):
+            await running
+        assert await other == 27
+        assert len(pool) == 0
+        assert pool.jobs == {}
+        pool.shutdown()
+
+    asyncio.run(main())
+
+
+def test_replaces_dead_workers():
+    async def main():
+        pool = WorkerPool(asyncio.get_running_loop(), workers=1)
+        try:
+            with pytest.raises(BrokenProcessPool):
+                await pool.submit("a", os._exit, 1)
+            assert await pool.submit("a", pow, 2, 3) == 8
+        finally:
+            pool.shutdown()
+
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+import asyncio
+import heapq
+import itertools
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class _Entry:
+    __slots__ = ("when", "seq", "key", "callback", "args")
+
+    def __init__(self, when: float, seq: int, key: Hashable, callback, args):
+        self.when = when
+        self.seq = seq
+        self.key = key
+        self.callback = callback
+        self.args = args
+
+    def __lt__(self, other: "_Entry") -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
+
+
+class DeadlineScheduler:
+    """
+    Deadlines keyed by any hashable (eg. a table), at most one per key.
+
+    Deadlines live in a heap served by a single loop timer armed for the
+    earliest one, so thousands of them cost one loop callback. Scheduling is
+    O(log n); cancelling or rescheduling marks the previous entry as stale,
+    stale entries are dropped when they reach the top of the heap or when
+    they make up most of it.
+    """
+
+    _heap: List[_Entry]
+    _entries: Dict[Hashable, _Entry]
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._heap = []
+        self._entries = {}
+        self._seq = itertools.count()
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._armed_at: Optional[float] = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def when(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        return entry.when if entry is not None else None
+
+    def schedule(
+        self, key: Hashable, delay: float, callback: Callable[..., Any], *args
+    ):
+        """Calls callback(*args) in delay seconds, replacing key's deadline."""
+        self.schedule_at(key, self.loop.time() + delay, callback, *args)
+
+    def schedule_at(
+        self, key: Hashable, when: float, callback: Callable[..., Any], *args
+    ):
+        self._drop(key)
+        entry = _Entry(when, next(self._seq), key, callback, args)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+        self._arm()
+
+    def cancel(self, key: Hashable) -> bool:
+        """Returns False if key had no deadline."""
+        if self._drop(key) is None:
+            return False
+        if len(self._heap) > 2 * len(self._entries) + 16:
+            self._heap = [entry for entry in self._heap if entry.callback is not None]
+            heapq.heapify(self._heap)
+        return True
+
+    def _drop(self, key: Hashable) -> Optional[_Entry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.callback = None
+        return entry
+
+    def _arm(self):
+        heap = self._heap
+        while heap and heap[0].callback is None:
+            heapq.heappop(heap)
+        if not heap:
+            return
+        when = heap[0].when
+        if self._armed_at is not None and self._armed_at <= when:
+            return
+        if self._handle is not None:
+            self._handle.cancel()
+        self._armed_at = when
+        self._handle = self.loop.call_at(when, self._fire)
+
+    def _fire(self):
+        self._handle = None
+        self._armed_at = None
+        heap = self._heap
+        now = self.loop.time()
+        try:
+            while heap and heap[0].when <= now:
+                entry = heapq.heappop(heap)
+                if entry.callback is None:
+                    continue
+                del self._entries[entry.key]
+                callback, entry.callback = entry.callback, None
+                callback(*entry.args)
+        finally:
+            self._arm()
@@ -0,0 +1,112 @@
+import asyncio
+import concurrent.futures
+import concurrent.futures.process
+import functools
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+
+class Overloaded(Exception):
+    """Raised by WorkerPool.submit() when too many jobs are pending."""
+
+
+class WorkerPool:
+    """
+    CPU-bound jobs run in worker processes, awaited from the event loop.
+
+    Functions and their arguments are pickled to reach the workers: they must
+    be module-level functions, and games should be passed as compact
+    snapshot.Snapshot rather than State.
+
+    At most max_running jobs are handed to the executor at a time, so that
+    jobs still queued can be cancelled for free; at most max_pending are
+    accepted at all, further submissions raise Overloaded. Jobs belong to a
+    group (eg. a table), cancel(group) drops them all.
+
+    If a worker process dies, its jobs fail with BrokenProcessPool and later
+    jobs go to new processes.
+    """
+
+    jobs: Dict[Hashable, Set[asyncio.Future]]
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        workers: int = 2,
+        max_running: Optional[int] = None,
+        max_pending: int = 64,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ):
+        self.loop = loop
+        self.workers = workers
+        self.owns_executor = executor is None
+        self.executor = (
+            executor
+            if executor is not None
+            else concurrent.futures.ProcessPoolExecutor(workers)
+        )
+        self.max_running = max_running if max_running is not None else workers
+        self.max_pending = max_pending
+        self.jobs = {}
+        self.pending = 0
+        self.running = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def __len__(self):
+        return self.pending
+
+    def submit(self, group: Hashable, fn: Callable[..., Any], *args) -> asyncio.Future:
+        """
+        Runs fn(*args) in a worker. The returned future resolves to its result,
+        cancelling it drops the job if it did not start yet.
+        """
+        if self.pending >= self.max_pending:
+            raise Overloaded()
+        self.pending += 1
+        job = self.loop.create_task(self._run(fn, args))
+        self.jobs.setdefault(group, set()).add(job)
+        job.add_done_callback(functools.partial(self._done, group))
+        return job
+
+    def cancel(self, group: Hashable) -> int:
+        """Cancels the jobs of group. Returns how many there were."""
+        jobs = self.jobs.pop(group, ())
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def shutdown(self):
+        """Cancels every job, then waits for the workers to exit."""
+        for group in list(self.jobs):
+            self.cancel(group)
+        # Not waiting leaves the executor's management thread behind, which
+        # keeps the interpreter from exiting. At most max_running jobs have
+        # reached the executor, the others were cancelled.
+        self.executor.shutdown(wait=True)
+
+    async def _run(self, fn: Callable[..., Any], args: tuple):
+        if self._slots is None:
+            # Created here to be bound to the running loop.
+            self._slots = asyncio.Semaphore(self.max_running)
+        async with self._slots:
+            self.running += 1
+            executor = self.executor
+            try:
+                return await self.loop.run_in_executor(executor, fn, *args)
+            except concurrent.futures.process.BrokenProcessPool:
+                if self.owns_executor and self.executor is executor:
+                    # Quick, its processes are gone.
+                    executor.shutdown(wait=True)
+                    self.executor = concurrent.futures.ProcessPoolExecutor(
+                        self.workers
+                    )
+                raise
+            finally:
+                self.running -= 1
+
+    def _done(self, group: Hashable, job: asyncio.Future):
+        self.pending -= 1
+        jobs = self.jobs.get(group)
+        if jobs is not None:
+            jobs.discard(job)
+            if not jobs:
+                del self.jobs[group]
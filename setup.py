@@ -1,5 +1,9 @@
 from setuptools import setup
 
 setup(
-    name="hitlair", author="zopieux", license="MIT", install_requires=["irc3"],
+    name="hitlair",
+    author="zopieux",
+    license="MIT",
+    # Hot reload relies on IrcBot.reload() and get_plugin() as of 1.1.
+    install_requires=["irc3~=1.1.10"],
 )